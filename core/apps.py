@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core.search import connect_search_signals
+        connect_search_signals()
+
+        # Registers the ALL_SYNC_ODOO cron job handler
+        import core.odoo.pipeline  # noqa: F401
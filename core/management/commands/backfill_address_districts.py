@@ -0,0 +1,98 @@
+import time
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from core.models import Address
+from shipping.models import District
+from shipping.name_matching import DEFAULT_MIN_SCORE
+
+
+class Command(BaseCommand):
+    help = (
+        "Assign a district to every address without one: by spatial join where the "
+        "address has a location, by normalized city/province name otherwise. "
+        "Resumable: only addresses without district are visited, in id order."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Addresses per batch")
+        parser.add_argument('--after-id', type=int, default=0, help="Resume after this address id")
+        parser.add_argument('--min-score', type=float, default=DEFAULT_MIN_SCORE,
+                            help="Minimum confidence for name matches")
+        parser.add_argument('--dry-run', action='store_true', help="Report matches without saving them")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = options['after_id']
+        dry_run = options['dry_run']
+        stats = {'visited': 0, 'spatial': 0, 'name': 0, 'unmatched': 0}
+        started = time.perf_counter()
+
+        pending = Address.objects.filter(district__isnull=True).order_by('id')
+        while True:
+            batch = list(
+                pending.filter(id__gt=last_id).values_list('id', 'city', 'province')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            matches = self._match_batch(batch, options['min_score'], stats)
+            if matches and not dry_run:
+                with transaction.atomic():
+                    Address.objects.bulk_update(
+                        [Address(id=address_id, district_id=district_id) for address_id, district_id in matches.items()],
+                        ['district'],
+                    )
+
+            stats['visited'] += len(batch)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"  up to id {last_id}: {stats['visited']} visited, "
+                f"{stats['spatial']} spatial, {stats['name']} by name, {stats['unmatched']} unmatched "
+                f"({stats['visited'] / elapsed:.0f} addresses/sec)"
+            )
+
+        elapsed = time.perf_counter() - started
+        prefix = "[dry run] " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Matched {stats['spatial'] + stats['name']} of {stats['visited']} addresses "
+            f"in {elapsed:.1f}s (last id {last_id})"
+        ))
+
+    @staticmethod
+    def _match_batch(batch: List[tuple], min_score: float, stats: Dict[str, int]) -> Dict[int, int]:
+        ids = [address_id for address_id, _, _ in batch]
+
+        # Set-based spatial join for the addresses that have coordinates
+        containing_district = District.objects.filter(
+            geom__contains=OuterRef('location')
+        ).order_by().values('pk')[:1]
+        matches = {
+            address_id: district_id
+            for address_id, district_id in Address.objects.filter(
+                id__in=ids,
+                location__isnull=False
+            ).annotate(
+                matched_district=Subquery(containing_district)
+            ).order_by().values_list('id', 'matched_district')
+            if district_id is not None
+        }
+        stats['spatial'] += len(matches)
+
+        # Everything else falls back to the normalized name matcher
+        remaining = [row for row in batch if row[0] not in matches and row[1]]
+        name_matches = District.objects.match_names(
+            [{'name': city, 'province': province} for _, city, province in remaining],
+            min_score=min_score,
+        )
+        for (address_id, _, _), match in zip(remaining, name_matches):
+            if match.district_id is not None:
+                matches[address_id] = match.district_id
+                stats['name'] += 1
+
+        stats['unmatched'] += len(batch) - len(matches)
+        return matches
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:17
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_userapprole_organization_place_org_and_more'),
+        ('shipping', '0005_district_name_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='district',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='addresses', to='shipping.district', verbose_name='district'),
+        ),
+        migrations.AddField(
+            model_name='address',
+            name='location',
+            field=django.contrib.gis.db.models.fields.PointField(blank=True, help_text='Delivery point coordinates', null=True, srid=4326, verbose_name='location'),
+        ),
+    ]
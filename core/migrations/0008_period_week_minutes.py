@@ -0,0 +1,42 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_address_district_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='period',
+            name='end_minute',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='end minute of week'),
+        ),
+        migrations.AddField(
+            model_name='period',
+            name='start_minute',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='start minute of week'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE core_period SET
+                    start_minute = weekday * 1440
+                        + EXTRACT(HOUR FROM open_time) * 60 + EXTRACT(MINUTE FROM open_time),
+                    end_minute = weekday * 1440
+                        + EXTRACT(HOUR FROM close_time) * 60 + EXTRACT(MINUTE FROM close_time)
+                        + CASE
+                            WHEN EXTRACT(HOUR FROM close_time) * 60 + EXTRACT(MINUTE FROM close_time)
+                                 <= EXTRACT(HOUR FROM open_time) * 60 + EXTRACT(MINUTE FROM open_time)
+                            THEN 1440 ELSE 0
+                          END
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='period',
+            index=models.Index(fields=['start_minute', 'end_minute'], name='core_period_start_m_e37bb2_idx'),
+        ),
+    ]
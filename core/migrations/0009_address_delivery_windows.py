@@ -0,0 +1,54 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:19
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_period_week_minutes'),
+        ('shipping', '0005_district_name_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='delivery_window_1',
+            field=django.contrib.postgres.fields.ranges.IntegerRangeField(blank=True, editable=False, null=True, verbose_name='delivery window 1'),
+        ),
+        migrations.AddField(
+            model_name='address',
+            name='delivery_window_2',
+            field=django.contrib.postgres.fields.ranges.IntegerRangeField(blank=True, editable=False, null=True, verbose_name='delivery window 2'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE core_address SET
+                    delivery_window_1 = CASE
+                        WHEN schedule_min_1 <= schedule_max_1 THEN int4range(
+                            (EXTRACT(HOUR FROM schedule_min_1) * 60 + EXTRACT(MINUTE FROM schedule_min_1))::int,
+                            (EXTRACT(HOUR FROM schedule_max_1) * 60 + EXTRACT(MINUTE FROM schedule_max_1))::int,
+                            '[]'
+                        )
+                    END,
+                    delivery_window_2 = CASE
+                        WHEN schedule_min_2 <= schedule_max_2 THEN int4range(
+                            (EXTRACT(HOUR FROM schedule_min_2) * 60 + EXTRACT(MINUTE FROM schedule_min_2))::int,
+                            (EXTRACT(HOUR FROM schedule_max_2) * 60 + EXTRACT(MINUTE FROM schedule_max_2))::int,
+                            '[]'
+                        )
+                    END
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['delivery_window_1'], name='core_address_window_1_gist'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['delivery_window_2'], name='core_address_window_2_gist'),
+        ),
+    ]
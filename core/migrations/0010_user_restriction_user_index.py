@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    No-op, kept so the core migrations stay numbered in sequence. It added a
+    (user, content_type, object_id) index on UserRestriction that duplicated
+    the one of its unique_together and was dropped before release.
+    """
+
+    dependencies = [
+        ('core', '0009_address_delivery_windows'),
+    ]
+
+    operations = []
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_user_restriction_user_index'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('organization', 'organization'), ('place', 'place'), ('address', 'address'), ('user', 'user')], max_length=20, verbose_name='kind')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='object ID')),
+                ('title', models.CharField(help_text='Display name of the indexed object', max_length=255, verbose_name='title')),
+                ('text', models.TextField(help_text='Accent-folded searchable text', verbose_name='text')),
+                ('vector', models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('text', config='simple'), output_field=django.contrib.postgres.search.SearchVectorField())),
+            ],
+            options={
+                'verbose_name': 'search entry',
+                'verbose_name_plural': 'search entries',
+                'ordering': ['kind', 'object_id'],
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['vector'], name='core_search_vector_gin'), django.contrib.postgres.indexes.GinIndex(fields=['text'], name='core_search_text_trgm', opclasses=['gin_trgm_ops'])],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_entry_object'),
+        ),
+    ]
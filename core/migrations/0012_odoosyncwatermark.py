@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_searchentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OdooSyncWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=50, unique=True, verbose_name='entity')),
+                ('write_date', models.DateTimeField(blank=True, help_text='Odoo write_date of the last synced record', null=True, verbose_name='write date')),
+                ('last_id', models.PositiveBigIntegerField(default=0, help_text='Odoo id of the last synced record, tiebreaker for equal write dates', verbose_name='last ID')),
+                ('last_run_at', models.DateTimeField(blank=True, null=True, verbose_name='last run at')),
+                ('last_stats', models.JSONField(blank=True, default=dict, verbose_name='last stats')),
+            ],
+            options={
+                'verbose_name': 'Odoo sync watermark',
+                'verbose_name_plural': 'Odoo sync watermarks',
+                'ordering': ['entity'],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def _window(number: int, bounds: str) -> str:
+    return f"""
+        delivery_window_{number} = CASE
+            WHEN schedule_min_{number} <= schedule_max_{number} THEN int4range(
+                (EXTRACT(HOUR FROM schedule_min_{number}) * 60 + EXTRACT(MINUTE FROM schedule_min_{number}))::int,
+                (EXTRACT(HOUR FROM schedule_max_{number}) * 60 + EXTRACT(MINUTE FROM schedule_max_{number}))::int,
+                '{bounds}'
+            )
+        END"""
+
+
+class Migration(migrations.Migration):
+    """Delivery windows become half-open [start, end) ranges, see core.models.address.schedule_range."""
+
+    dependencies = [
+        ('core', '0012_odoosyncwatermark'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f"UPDATE core_address SET {_window(1, '[)')}, {_window(2, '[)')}",
+            reverse_sql=f"UPDATE core_address SET {_window(1, '[]')}, {_window(2, '[]')}",
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:48
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_address_delivery_windows_half_open'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='period',
+            name='week_minutes',
+            field=django.contrib.postgres.fields.ranges.IntegerRangeField(editable=False, null=True, verbose_name='minutes of week'),
+        ),
+        migrations.RunSQL(
+            sql="UPDATE core_period SET week_minutes = int4range(start_minute, end_minute, '[)')",
+            reverse_sql="UPDATE core_period SET start_minute = lower(week_minutes), end_minute = upper(week_minutes)",
+        ),
+        migrations.RemoveIndex(
+            model_name='period',
+            name='core_period_start_m_e37bb2_idx',
+        ),
+        migrations.RemoveField(
+            model_name='period',
+            name='end_minute',
+        ),
+        migrations.RemoveField(
+            model_name='period',
+            name='start_minute',
+        ),
+        migrations.AddIndex(
+            model_name='period',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['week_minutes'], name='core_period_week_minutes_gist'),
+        ),
+    ]
@@ -9,6 +9,8 @@ from core.models.user_app_role import UserAppRole
 from core.models.user_app_role_permission import UserAppRolePermission
 from core.models.cronjob import CronJob
 from core.models.user_restriction import UserRestriction
+from core.models.search_entry import SearchEntry
+from core.models.odoo_sync_watermark import OdooSyncWatermark
 __all__ = [
     'Period',
     'Place',
@@ -20,5 +22,7 @@ __all__ = [
     'UserAppRolePermission',
     'OrganizationMembership',
     'CronJob',
-    'UserRestriction'
+    'UserRestriction',
+    'SearchEntry',
+    'OdooSyncWatermark'
 ]
@@ -1,10 +1,68 @@
-from django.db import models
+from datetime import date, time
+from typing import Iterable, Optional
+from django.apps import apps
+from django.contrib.gis.db import models
+from django.contrib.postgres.fields import IntegerRangeField
+from django.contrib.postgres.indexes import GistIndex
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.db.models import Exists, OuterRef, Q
 from django.core.exceptions import ValidationError  # Changed from django.forms
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 from django.urls import reverse
 
-# from shipping.models.district import District
+from core.models.period import minute_of_day
+from core.restrictions import place_restrictions
+from shipping.shipping_calendar import shipping_calendar
+
+
+def schedule_range(start: Optional[time], end: Optional[time]) -> Optional[NumericRange]:
+    """
+    Minutes-of-day [start, end) range covered by a delivery window; half-open
+    like the opening periods and the DeliveryPlanner windows.
+
+    Incomplete or inverted windows (which `Address.clean` rejects, but which
+    may come from rows saved without validation) have no range.
+    """
+    if not start or not end or start > end:
+        return None
+    return NumericRange(minute_of_day(start), minute_of_day(end), bounds='[)')
+
+
+class AddressQuerySet(models.QuerySet):
+    def deliverable_at(self, at: time) -> 'AddressQuerySet':
+        """Addresses with a delivery window covering the given time of day."""
+        minute = minute_of_day(at)
+        return self.filter(
+            Q(delivery_window_1__contains=minute) | Q(delivery_window_2__contains=minute)
+        )
+
+    def deliverable_between(self, start: time, end: time) -> 'AddressQuerySet':
+        """
+        Addresses with a single delivery window covering the whole [start, end)
+        span; an empty span (`start == end`) is treated as `deliverable_at(start)`.
+        """
+        if start > end:
+            return self.none()
+        if start == end:
+            # Every range contains the empty range
+            return self.deliverable_at(start)
+        span = schedule_range(start, end)
+        return self.filter(
+            Q(delivery_window_1__contains=span) | Q(delivery_window_2__contains=span)
+        )
+
+    def visible_to(self, user) -> 'AddressQuerySet':
+        """Addresses not used by a place the user is restricted from."""
+        return self.visible_to_many([user])
+
+    def visible_to_many(self, users: Iterable) -> 'AddressQuerySet':
+        """Addresses not used by a place any of the given users is restricted from."""
+        restricted_places = apps.get_model('core', 'Place').objects.filter(
+            Exists(place_restrictions(users).filter(object_id=OuterRef('pk'))),
+            address=OuterRef('pk'),
+        )
+        return self.filter(~Exists(restricted_places))
 
 
 class Address(models.Model):
@@ -25,13 +83,21 @@ class Address(models.Model):
         blank=True,
         verbose_name=_("province"),
     )
-    # district = models.ForeignKey(
-    #     District,
-    #     null=True,
-    #     verbose_name=_("district"),
-    #     on_delete=models.PROTECT,
-    #     related_name="addresses",  # Add related_name for reverse lookups
-    # )
+    district = models.ForeignKey(
+        'shipping.District',
+        null=True,
+        blank=True,
+        verbose_name=_("district"),
+        on_delete=models.PROTECT,
+        related_name="addresses",  # Add related_name for reverse lookups
+    )
+    location = models.PointField(
+        srid=4326,
+        null=True,
+        blank=True,
+        verbose_name=_("location"),
+        help_text=_("Delivery point coordinates"),
+    )
     address_name = models.CharField(
         max_length=200,
         verbose_name=_("address name"),
@@ -73,6 +139,21 @@ class Address(models.Model):
         blank=True,
         verbose_name=_("schedule max 2"),
     )
+    # Indexable copies of the schedule windows, kept in sync on save
+    delivery_window_1 = IntegerRangeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_("delivery window 1"),
+    )
+    delivery_window_2 = IntegerRangeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_("delivery window 2"),
+    )
+
+    objects = AddressQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("address")
@@ -80,6 +161,8 @@ class Address(models.Model):
         ordering = ('address_name',)
         indexes = [
             models.Index(fields=['address_name', 'city']),  # Composite index for common lookups
+            GistIndex(fields=['delivery_window_1'], name='core_address_window_1_gist'),
+            GistIndex(fields=['delivery_window_2'], name='core_address_window_2_gist'),
         ]
 
     def __str__(self):
@@ -95,6 +178,13 @@ class Address(models.Model):
         # Changed from reverse_lazy to reverse as it's not needed in model methods
         return reverse('panel:address_detail', args=[self.pk])
 
+    def can_ship_in_day(self, shipping_date: date) -> bool:
+        """
+        Determines if shipping to this address is possible on the given date,
+        using the shipping calendar of its district (no queries involved).
+        """
+        return shipping_calendar.get().can_ship_in_day(self.district_id, shipping_date)
+
     def clean(self):
         super().clean()  # Add super().clean() call
         errors = {}
@@ -118,7 +208,15 @@ class Address(models.Model):
             self.schedule_min_2 = None
             self.schedule_max_2 = None
 
+    def sync_delivery_windows(self):
+        self.delivery_window_1 = schedule_range(self.schedule_min_1, self.schedule_max_1)
+        self.delivery_window_2 = schedule_range(self.schedule_min_2, self.schedule_max_2)
+
     def save(self, *args, **kwargs):
         self.full_clean()  # Add validation on save
         self.discard_incomplete_schedules()
+        self.sync_delivery_windows()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'delivery_window_1', 'delivery_window_2'}
         super().save(*args, **kwargs)  # Changed return super() to super()
@@ -1,6 +1,8 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from typing import Tuple, Literal
+from typing import Callable, Dict, Literal, Tuple
+
+from core.constants import LEVEL_ERROR, LEVEL_SUCCESS
 
 # Define job types as Literal types for better type checking
 JobTypes = Literal[
@@ -25,6 +27,18 @@ CHOICES_JOB: Tuple[Tuple[JobTypes, str], ...] = (
 )
 
 
+# Job type -> callable doing the work and returning a summary message
+_job_handlers: Dict[str, Callable[[], str]] = {}
+
+
+def register_job(job_type: JobTypes) -> Callable[[Callable[[], str]], Callable[[], str]]:
+    """Decorator registering the handler run by `CronJob.run` for a job type."""
+    def decorator(handler: Callable[[], str]) -> Callable[[], str]:
+        _job_handlers[job_type] = handler
+        return handler
+    return decorator
+
+
 class CronJob(models.Model):
     description: str = models.CharField(
         max_length=100,
@@ -69,3 +83,17 @@ class CronJob(models.Model):
     def save(self, *args, **kwargs) -> None:
         """Override save to perform any necessary pre-save operations."""
         super().save(*args, **kwargs)
+
+    def run(self) -> Tuple[str, str]:
+        """
+        Execute the handler registered for this job type.
+
+        Returns:
+            Tuple[str, str]: Status level and message
+        """
+        if not self.is_active:
+            return LEVEL_ERROR, _("Cron job is not active.")
+        handler = _job_handlers.get(self.type)
+        if handler is None:
+            return LEVEL_ERROR, _("No handler registered for this cron job.")
+        return LEVEL_SUCCESS, handler()
@@ -0,0 +1,80 @@
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Dict, List
+
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+# Format of Odoo datetimes over RPC, always in UTC
+ODOO_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class OdooSyncWatermark(models.Model):
+    """
+    Position of the incremental Odoo sync for one entity.
+
+    Records are pulled ordered by (write_date, id); the watermark keeps the
+    last pair written locally, so the next run resumes right after it.
+    """
+
+    entity = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name=_("entity")
+    )
+
+    write_date = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("write date"),
+        help_text=_("Odoo write_date of the last synced record")
+    )
+
+    last_id = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name=_("last ID"),
+        help_text=_("Odoo id of the last synced record, tiebreaker for equal write dates")
+    )
+
+    last_run_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("last run at")
+    )
+
+    last_stats = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name=_("last stats")
+    )
+
+    class Meta:
+        verbose_name = _("Odoo sync watermark")
+        verbose_name_plural = _("Odoo sync watermarks")
+        ordering = ['entity']
+
+    def __str__(self) -> str:
+        return f"{self.entity} @ {self.write_date or '-'}"
+
+    def domain(self) -> List[Any]:
+        """Odoo domain for the records changed after this watermark."""
+        if self.write_date is None:
+            return []
+        write_date = self.write_date.astimezone(dt_timezone.utc).strftime(ODOO_DATETIME_FORMAT)
+        return [
+            '|',
+            ('write_date', '>', write_date),
+            '&', ('write_date', '=', write_date), ('id', '>', self.last_id),
+        ]
+
+    def advance(self, record: Dict[str, Any]) -> None:
+        """Move past an Odoo record (needs its `id` and `write_date`)."""
+        self.write_date = datetime.strptime(
+            record['write_date'], ODOO_DATETIME_FORMAT
+        ).replace(tzinfo=dt_timezone.utc)
+        self.last_id = record['id']
+
+    def finish(self, stats: Dict[str, Any]) -> None:
+        self.last_run_at = timezone.now()
+        self.last_stats = stats
+        self.save(update_fields=['last_run_at', 'last_stats'])
@@ -1,10 +1,11 @@
 from collections import defaultdict
 import logging
-from typing import List, Optional
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
 from django.core.validators import MinValueValidator
 from django.utils.functional import cached_property
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 from django.urls import reverse_lazy
@@ -23,6 +24,201 @@ from core.constants import (
 )
 
 
+def _place_restrictions():
+    """Restrictions of users over places (see UserRestriction)."""
+    return UserRestriction.objects.filter(
+        content_type=ContentType.objects.get_for_model(Place)
+    )
+
+
+# Attribute holding the active places prefetched by `with_shipping_addresses`
+ACTIVE_PLACES_ATTR = 'prefetched_active_places'
+
+
+class BlockingChanges(NamedTuple):
+    """Organizations whose blocking status changed, see `apply_due_invoices`."""
+    blocked: List[int]
+    unblocked: List[int]
+
+
+class OrganizationQuerySet(models.QuerySet):
+    def apply_due_invoices(self, due_invoices: Mapping[int, int]) -> BlockingChanges:
+        """
+        Set-based `Organization.set_blocking_status_by_due_invoices` for many
+        organizations, with two UPDATEs instead of one save per organization.
+
+        Same semantics as `block()` / `unblock()` with the PAYMENT reasons:
+        organizations with due invoices that are not blocked (temporarily
+        unblocked ones included) get blocked; organizations without due
+        invoices that are blocked or temporarily unblocked get unblocked.
+        No save signals are sent.
+
+        Args:
+            due_invoices: Number of due invoices by organization id
+
+        Returns:
+            BlockingChanges: Ids of the organizations that were blocked and unblocked
+        """
+        with_due = [org_id for org_id, due in due_invoices.items() if due > 0]
+        without_due = [org_id for org_id, due in due_invoices.items() if due <= 0]
+
+        with transaction.atomic():
+            to_block = list(self.filter(
+                id__in=with_due,
+                blocked=False
+            ).select_for_update().order_by('id').values_list('id', flat=True))
+            self.filter(id__in=to_block).update(
+                blocked=True,
+                blocking_reason=Organization.BlockReason.PAYMENT,
+                unblocking_reason=None,
+            )
+
+            to_unblock = list(self.filter(
+                Q(blocked=True) | Q(unblocking_reason=Organization.UnblockReason.TEMPORAL),
+                id__in=without_due
+            ).select_for_update().order_by('id').values_list('id', flat=True))
+            self.filter(id__in=to_unblock).update(
+                blocked=False,
+                blocking_reason=None,
+                unblocking_reason=Organization.UnblockReason.PAYMENT,
+            )
+
+        return BlockingChanges(blocked=to_block, unblocked=to_unblock)
+
+    def active_user_emails_map(
+        self,
+        org_ids: Iterable[int],
+        odoo_address_ids: Iterable[Optional[int]]
+    ) -> Dict[Tuple[int, Optional[int]], List[str]]:
+        """
+        Bulk variant of `Organization.get_active_user_emails`, for many
+        (organization, odoo address) pairs in three queries.
+
+        Args:
+            org_ids: Organization ids
+            odoo_address_ids: Odoo address id paired with every organization id, or None
+
+        Returns:
+            Dict mapping every (org_id, odoo_address_id) pair to its email list.
+        """
+        from core.models.organization_membership import OrganizationMembership
+
+        pairs = list(zip(org_ids, odoo_address_ids))
+        requested_org_ids = {org_id for org_id, _ in pairs}
+
+        members = defaultdict(list)
+        for org_id, user_id, email in OrganizationMembership.objects.filter(
+            organization_id__in=requested_org_ids,
+            user__is_active=True,
+        ).order_by(
+            'organization_id', 'user__first_name', 'user__username'
+        ).values_list('organization_id', 'user_id', 'user__email'):
+            if email and email.strip():
+                members[org_id].append((user_id, email))
+
+        valid_pairs = set(Place.objects.filter(
+            org_id__in=requested_org_ids,
+            address__odoo_id__in={odoo_id for _, odoo_id in pairs if odoo_id},
+        ).values_list('org_id', 'address__odoo_id').distinct())
+
+        # Odoo address ids of the places every user is restricted to
+        user_restrictions = defaultdict(set)
+        for user_id, odoo_id in _place_restrictions().filter(
+            user_id__in={user_id for users in members.values() for user_id, _ in users}
+        ).annotate(
+            odoo_address_id=Subquery(
+                Place.objects.filter(pk=OuterRef('object_id')).values('address__odoo_id')[:1]
+            )
+        ).values_list('user_id', 'odoo_address_id'):
+            user_restrictions[user_id].add(odoo_id)
+
+        result = {}
+        for org_id, odoo_id in pairs:
+            if not odoo_id:
+                result[(org_id, odoo_id)] = [email for _, email in members[org_id]]
+                continue
+            if (org_id, odoo_id) not in valid_pairs:
+                logging.warning(
+                    'Organization.objects.active_user_emails_map called with invalid '
+                    f'odoo_address_id={odoo_id} (org_id={org_id}). Ignoring filters.'
+                )
+                result[(org_id, odoo_id)] = [email for _, email in members[org_id]]
+                continue
+            result[(org_id, odoo_id)] = [
+                email for user_id, email in members[org_id]
+                if user_id not in user_restrictions or odoo_id in user_restrictions[user_id]
+            ]
+        return result
+
+    def allocate_ids(self, count: int) -> List[int]:
+        """
+        Reserve primary keys from the table sequence in a single round trip,
+        so rows can be built with their final id before being inserted.
+        """
+        if count <= 0:
+            return []
+        meta = self.model._meta
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                [meta.db_table, meta.pk.column, count]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def bulk_create_with_orgcodes(
+        self,
+        organizations: Iterable['Organization'],
+        batch_size: int = 1000
+    ) -> List['Organization']:
+        """
+        Insert many organizations with one INSERT per batch.
+
+        Ids are reserved up front, so autogenerated orgcodes are final when
+        the rows are written; the pre_save blocking reason rule is applied
+        here since `bulk_create` sends no signals. Search entries are
+        written alongside every batch.
+
+        Args:
+            organizations: Unsaved organizations
+            batch_size: Rows per INSERT
+
+        Returns:
+            List[Organization]: The organizations, with their ids set
+        """
+        from core.models.search_entry import SearchEntry
+        from core.search import index_objects
+
+        organizations = list(organizations)
+        pending = [org for org in organizations if org.pk is None]
+        for org, pk in zip(pending, self.allocate_ids(len(pending))):
+            org.pk = pk
+        for org in organizations:
+            org.trigger_blocking_reason()
+            org.assign_autogenerated_orgcode()
+
+        with transaction.atomic(using=self.db):
+            for start in range(0, len(organizations), batch_size):
+                batch = organizations[start:start + batch_size]
+                self.bulk_create(batch)
+                index_objects(SearchEntry.Kind.ORGANIZATION, batch)
+        return organizations
+
+    def with_shipping_addresses(self) -> 'OrganizationQuerySet':
+        """
+        Prefetch the active places of every organization with their
+        addresses, in one extra query for the whole set. `dispatch_places`,
+        `get_shipping_addresses`, `shipping_address_from_address_id` and
+        `has_address` then answer from memory.
+        """
+        return self.prefetch_related(
+            models.Prefetch(
+                'places',
+                queryset=Place.objects.filter(is_active=True).select_related('address'),
+                to_attr=ACTIVE_PLACES_ATTR
+            )
+        )
+
+
 class Organization(get_active_mixin()):
     class OrgType(models.TextChoices):
         BUSINESS = 'BUSINESS', _('org_type_business')
@@ -43,6 +239,8 @@ class Organization(get_active_mixin()):
 
     AUTOGENERATE_ORGCODE = '__autogenerate__'
 
+    objects = OrganizationQuerySet.as_manager()
+
     # Blocking related fields
     blocked = models.BooleanField(
         default=False,
@@ -272,56 +470,49 @@ class Organization(get_active_mixin()):
         Returns:
             List of email addresses for active users.
         """
-        if not for_odoo_address_id:
-            filtered_users_id = []
-        elif not Place.objects.filter(org=self, address__odoo_id=for_odoo_address_id).exists():
+        users = self.user_model.objects.filter(
+            organizations=self,
+            is_active=True
+        )
+
+        if for_odoo_address_id and not Place.objects.filter(
+            org=self,
+            address__odoo_id=for_odoo_address_id
+        ).exists():
             logging.warning(
                 'Organization.get_active_user_emails called with invalid '
                 f'for_odoo_address_id={for_odoo_address_id} (org_id={self.pk}). '
                 'Ignoring filters.'
             )
-            filtered_users_id = []
-        else:
-            try:
-                org_place_restrictions = UserRestriction.objects.filter(
-                    content_type=ContentType.objects.get_for_model(Place),
-                    user__organizations=self
-                )
-
-                user_place_restrictions_map = defaultdict(list)
-                for restriction in org_place_restrictions:
-                    odoo_address_id = Place.objects.filter(
-                        id=restriction.object_id
-                    ).values_list('address__odoo_id', flat=True).first()
-                    user_place_restrictions_map[restriction.user_id].append(odoo_address_id)
-
-                filtered_users_id = [
-                    user_id for user_id in user_place_restrictions_map
-                    if for_odoo_address_id not in user_place_restrictions_map[user_id]
-                ]
-            except Exception as e:
-                logging.exception(
-                    f'Organization.get_active_user_emails failed to retrieve user '
-                    f'restrictions for org_id={self.pk}. Ignoring filters.'
-                )
-                filtered_users_id = []
+        elif for_odoo_address_id:
+            # Users restricted to a set of places only get the emails of those
+            # places: keep users without place restrictions (anti-join) and
+            # users restricted to a place at this odoo address.
+            user_restrictions = _place_restrictions().filter(user=OuterRef('pk'))
+            users = users.filter(
+                ~Exists(user_restrictions) | Exists(user_restrictions.filter(
+                    object_id__in=Place.objects.filter(
+                        address__odoo_id=for_odoo_address_id
+                    ).values('id')
+                ))
+            )
 
-        emails = list(
-            self.user_model.objects.filter(
-                organizationmembership__organization=self,
-                is_active=True
-            ).exclude(
-                id__in=filtered_users_id
-            ).values_list('email', flat=True)
-        )
+        emails = list(users.values_list('email', flat=True))
         return [email for email in emails if email and email.strip()]
 
-    def dispatch_places(self):
-        """Get all active dispatch places for this organization."""
-        return self.place_set.select_related('address').filter(
+    def dispatch_places(self) -> List[Place]:
+        """
+        Get all active dispatch places for this organization.
+
+        Answered from memory when loaded with
+        `Organization.objects.with_shipping_addresses()`.
+        """
+        if hasattr(self, ACTIVE_PLACES_ATTR):
+            return [p for p in getattr(self, ACTIVE_PLACES_ATTR) if p.dispatch_address]
+        return list(self.places.select_related('address').filter(
             is_active=True,
             dispatch_address=True
-        ).all()
+        ))
 
     def get_shipping_addresses(self) -> List[Address]:
         """Get all shipping addresses from dispatch places."""
@@ -334,16 +525,24 @@ class Organization(get_active_mixin()):
         Raises:
             AttributeError: If no matching active dispatch place is found
         """
-        place = self.place_set.select_related('address').filter(
-            address_id=address_id,
-            dispatch_address=True,
-            is_active=True
-        ).first()
+        if hasattr(self, ACTIVE_PLACES_ATTR):
+            place = next(
+                (p for p in self.dispatch_places() if p.address_id == address_id),
+                None
+            )
+        else:
+            place = self.places.select_related('address').filter(
+                address_id=address_id,
+                dispatch_address=True,
+                is_active=True
+            ).first()
         return place.address  # Raises AttributeError if place is None
 
     def has_address(self, address: Address) -> bool:
         """Check if organization has an active place with given address."""
-        return self.place_set.filter(
+        if hasattr(self, ACTIVE_PLACES_ATTR):
+            return any(p.address_id == address.pk for p in getattr(self, ACTIVE_PLACES_ATTR))
+        return self.places.filter(
             address=address,
             is_active=True
         ).exists()
@@ -371,12 +570,28 @@ class Organization(get_active_mixin()):
             return True
         return False
 
+    def assign_autogenerated_orgcode(self) -> None:
+        """Replace the placeholder orgcode with one derived from the id, once known."""
+        if self.orgcode == self.AUTOGENERATE_ORGCODE and self.pk is not None:
+            self.orgcode = f'organization_{self.pk}'
+
     def check_autogenerate_orgcode(self) -> None:
         """Generate orgcode if using placeholder value."""
         if self.orgcode == self.AUTOGENERATE_ORGCODE:
-            self.orgcode = f'organization_{self.pk}'
+            self.assign_autogenerated_orgcode()
             self.save(update_fields=['orgcode'])
 
+    def save(self, *args, **kwargs) -> None:
+        # Reserving the id first lets the orgcode be written by the INSERT
+        # itself instead of a second UPDATE from post_save
+        if self._state.adding and self.pk is None and self.orgcode == self.AUTOGENERATE_ORGCODE:
+            self.pk = type(self).objects.using(
+                kwargs.get('using') or router.db_for_write(type(self), instance=self)
+            ).allocate_ids(1)[0]
+            self.assign_autogenerated_orgcode()
+            kwargs['force_insert'] = True
+        super().save(*args, **kwargs)
+
     @cached_property
     def user_model(self):
         """Get the user model configured for the project."""
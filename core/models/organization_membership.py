@@ -1,10 +1,18 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse_lazy
 from typing import Optional
 
 from core.models.organization import Organization
 from core.models.user_app_role import UserAppRole
+from core.versioned_cache import bump_version
+
+
+def membership_version_namespace(user_id: int) -> str:
+    """Versioned cache namespace of everything derived from a user's memberships."""
+    return f'core.memberships.{user_id}'
 
 
 class OrganizationMembership(models.Model):
@@ -51,3 +59,14 @@ class OrganizationMembership(models.Model):
 
     def __str__(self) -> str:
         return f"{self.user} - {self.organization}"
+
+
+@receiver(post_save, sender=OrganizationMembership)
+@receiver(post_delete, sender=OrganizationMembership)
+def invalidate_membership_caches(
+        sender: models.Model,
+        instance: OrganizationMembership,
+        **kwargs
+) -> None:
+    """Drop the cached logged organization of the member."""
+    bump_version(membership_version_namespace(instance.user_id))
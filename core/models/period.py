@@ -1,8 +1,51 @@
+from datetime import datetime, time
+from django.contrib.postgres.fields import IntegerRangeField
+from django.contrib.postgres.indexes import GistIndex
 from django.db import models
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from django.db.models.fields.related import ForeignKey
-from typing import Any
+from typing import Any, List, Tuple
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def minute_of_day(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+
+def minute_of_week(value: datetime) -> int:
+    return value.weekday() * MINUTES_PER_DAY + minute_of_day(value)
+
+
+def week_range(weekday: int, open_time: time, close_time: time) -> Tuple[int, int]:
+    """
+    Minute-of-week [start, end) range covered by an opening period.
+
+    Periods closing at or before their opening time run overnight into the
+    next day (e.g. bars open 20:00-02:00), so `end` goes past
+    MINUTES_PER_WEEK for Sunday nights that wrap to Monday.
+    """
+    start = weekday * MINUTES_PER_DAY + minute_of_day(open_time)
+    end = weekday * MINUTES_PER_DAY + minute_of_day(close_time)
+    if end <= start:
+        end += MINUTES_PER_DAY
+    return start, end
+
+
+def week_intervals(weekday: int, open_time: time, close_time: time) -> List[Tuple[int, int]]:
+    """
+    Minute-of-week [start, end) intervals covered by an opening period, with
+    Sunday nights split at the end of the week.
+    """
+    start, end = week_range(weekday, open_time, close_time)
+    if end <= MINUTES_PER_WEEK:
+        return [(start, end)]
+    return [(start, MINUTES_PER_WEEK), (0, end - MINUTES_PER_WEEK)]
 
 
 class Period(models.Model):
@@ -40,12 +83,21 @@ class Period(models.Model):
         help_text=_("Time when the place closes")
     )
 
+    # Minute-of-week [start, end) range derived from weekday/open_time/close_time
+    # on save; it ends past MINUTES_PER_WEEK for periods wrapping into Monday.
+    week_minutes = IntegerRangeField(
+        null=True,
+        editable=False,
+        verbose_name=_("minutes of week")
+    )
+
     class Meta:
         ordering = ['weekday', 'open_time']
         verbose_name = _("period")
         verbose_name_plural = _("periods")
         indexes = [
             models.Index(fields=['weekday', 'open_time']),
+            GistIndex(fields=['week_minutes'], name='core_period_week_minutes_gist'),
         ]
 
     def __str__(self) -> str:
@@ -53,3 +105,26 @@ class Period(models.Model):
 
     def get_absolute_url(self) -> str:
         return self.place.get_absolute_url()  # Changed from parent to place
+
+    def week_intervals(self) -> List[Tuple[int, int]]:
+        """Minute-of-week intervals covered by this period, see `week_intervals`."""
+        return week_intervals(self.weekday, self.open_time, self.close_time)
+
+    def save(self, *args, **kwargs):
+        self.week_minutes = NumericRange(*week_range(self.weekday, self.open_time, self.close_time), bounds='[)')
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'week_minutes'}
+        super().save(*args, **kwargs)
+
+
+@receiver(post_save, sender=Period)
+@receiver(post_delete, sender=Period)
+def invalidate_opening_hours(
+        sender: models.Model,
+        instance: Period,
+        **kwargs
+) -> None:
+    """Rebuild the per-worker opening hours index on next use."""
+    from core.opening_hours import opening_hours_index
+    opening_hours_index.invalidate()
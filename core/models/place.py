@@ -1,17 +1,51 @@
+from datetime import datetime
 from django.db import models
+from django.db.models import Exists, OuterRef, Q
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.urls import reverse_lazy
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from typing import Tuple, Literal, Optional
+from typing import Iterable, Tuple, Literal, Optional
 
 from core.models.mixins import get_active_mixin
+from core.models.period import MINUTES_PER_WEEK, Period, minute_of_week
+from core.opening_hours import opening_hours_index
+from core.restrictions import invalidate_restricted_places, place_restrictions
 from core.constants import (
     PLACE_BAR, PLACE_DISCO, PLACE_RESTAURANT, PLACE_STORE,
     PLACE_GENERAL, PLACE_WAREHOUSE,
 )
 
 
+class PlaceQuerySet(models.QuerySet):
+    def open_at(self, when: datetime) -> 'PlaceQuerySet':
+        """
+        Active places with an opening period covering the given (aware)
+        datetime, overnight periods included.
+
+        For bulk in-memory checks see `core.opening_hours.opening_hours_index`.
+        """
+        minute = minute_of_week(timezone.localtime(when))
+        # Sunday-night periods are stored past the end of the week, so Monday
+        # morning minutes are also checked one week later.
+        covering = Q(week_minutes__contains=minute) | Q(week_minutes__contains=minute + MINUTES_PER_WEEK)
+        return self.filter(
+            Exists(Period.objects.filter(covering, place=OuterRef('pk'))),
+            is_active=True,
+        )
+
+    def visible_to(self, user) -> 'PlaceQuerySet':
+        """Places the user is not restricted from (see UserRestriction)."""
+        return self.visible_to_many([user])
+
+    def visible_to_many(self, users: Iterable) -> 'PlaceQuerySet':
+        """Places none of the given users is restricted from."""
+        return self.filter(
+            ~Exists(place_restrictions(users).filter(object_id=OuterRef('pk')))
+        )
+
+
 class Place(get_active_mixin()):
     class PlaceType(models.TextChoices):
         BAR = PLACE_BAR, _("bar")
@@ -88,6 +122,8 @@ class Place(get_active_mixin()):
         help_text=_("Indicates if this place can be used for dispatching")
     )
 
+    objects = PlaceQuerySet.as_manager()
+
     class Meta:
         ordering = ['id']
         verbose_name = _("place")
@@ -136,6 +172,13 @@ def post_save_place(
     if created:
         instance.setup()
 
+    # Places leaving or joining the active set change the opening hours index
+    opening_hours_index.invalidate()
+
+    update_fields = kwargs.get('update_fields')
+    if not created and (update_fields is None or 'address' in update_fields):
+        invalidate_restricted_places()
+
 
 @receiver(post_delete, sender=Place)
 def post_delete_place(
@@ -146,6 +189,7 @@ def post_delete_place(
     """
     Post-delete signal handler that ensures the associated address is deleted.
     """
+    invalidate_restricted_places()
     if hasattr(instance, 'address') and instance.address is not None:
         try:
             instance.address.delete()
@@ -0,0 +1,67 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class SearchEntry(models.Model):
+    """
+    Denormalized search document of an organization, place, address or user.
+
+    `text` holds the accent-folded searchable fields (see `core.text`),
+    indexed both as a tsvector and with trigrams. Entries are kept up to
+    date by signals and rebuilt by the REBUILD_INDEX cron job, see `core.search`.
+    """
+
+    class Kind(models.TextChoices):
+        ORGANIZATION = 'organization', _("organization")
+        PLACE = 'place', _("place")
+        ADDRESS = 'address', _("address")
+        USER = 'user', _("user")
+
+    kind = models.CharField(
+        max_length=20,
+        choices=Kind.choices,
+        verbose_name=_("kind")
+    )
+
+    object_id = models.PositiveBigIntegerField(
+        verbose_name=_("object ID")
+    )
+
+    title = models.CharField(
+        max_length=255,
+        verbose_name=_("title"),
+        help_text=_("Display name of the indexed object")
+    )
+
+    text = models.TextField(
+        verbose_name=_("text"),
+        help_text=_("Accent-folded searchable text")
+    )
+
+    # Computed by the database from `text`; the text is folded already,
+    # so the 'simple' configuration (no stemming) is used
+    vector = models.GeneratedField(
+        expression=SearchVector('text', config='simple'),
+        output_field=SearchVectorField(),
+        db_persist=True
+    )
+
+    class Meta:
+        verbose_name = _("search entry")
+        verbose_name_plural = _("search entries")
+        ordering = ['kind', 'object_id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'object_id'],
+                name='unique_search_entry_object'
+            )
+        ]
+        indexes = [
+            GinIndex(fields=['vector'], name='core_search_vector_gin'),
+            GinIndex(fields=['text'], name='core_search_text_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()}: {self.title}"
@@ -1,7 +1,7 @@
 from typing import Optional, List, Tuple, Any
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.contrib.auth.tokens import default_token_generator
-from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 from django.db.models.signals import post_save
@@ -15,26 +15,52 @@ from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 
 from core.models.organization import Organization
-from core.models.organization_membership import OrganizationMembership
-from core.models.place import Place
-from core.models.user_restriction import UserRestriction
+from core.models.organization_membership import OrganizationMembership, membership_version_namespace
+from core.restrictions import RestrictionSnapshot
 from core.constants import (
     GENDER_FEMALE, GENDER_MALE, GENDER_OTHER, LEVEL_ERROR, LEVEL_SUCCESS,
     SHOW_ONBOARDING_MODAL_TRUE, SHOW_ONBOARDING_MODAL_FALSE,
 )
+from core.threadpool_service import ThreadPoolService
+from core.versioned_cache import bump_version, get_version
 
+# Seconds the id of a resolved logged organization is reused; membership
+# changes invalidate it right away. Only the id is cached, the row itself
+# (e.g. `blocked`) is always read fresh.
+LOGGED_ORG_CACHE_TIMEOUT = 60 * 5
 
-class CustomUserManager(UserManager):
+_MISSING = object()
+
+
+class UserQuerySet(models.QuerySet):
     """
-    Custom manager that prefetches related fields to optimize database queries.
+    Named loading profiles; each one states exactly what it selects and
+    prefetches, so callers only pay for the relations they use.
     """
 
-    def get(self, *args, **kwargs) -> 'User':
-        return super().prefetch_related(
-            'organizations',  # Used in /api/search view to filter results
-            'organizations__price_list',  # Used for price list filtering
-            'organizationmembership_set',
-        ).get(*args, **kwargs)
+    def for_auth(self) -> 'UserQuerySet':
+        """Just the user row, as needed by authentication backends (one query)."""
+        return self.select_related(None).prefetch_related(None)
+
+    def for_search(self) -> 'UserQuerySet':
+        """Users with their organizations, used by the /api/search view to filter results."""
+        return self.for_auth().prefetch_related('organizations')
+
+    def for_profile(self) -> 'UserQuerySet':
+        """Users with their logged organization and memberships (organization and role)."""
+        return self.for_auth().select_related('legacy_logged_org').prefetch_related(
+            models.Prefetch(
+                'organization_memberships',
+                queryset=OrganizationMembership.objects.select_related('organization', 'app_role')
+            )
+        )
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    """
+    User manager exposing the loading profiles of `UserQuerySet`;
+    plain lookups do not load any relation.
+    """
 
 
 class User(AbstractUser):
@@ -220,12 +246,42 @@ class User(AbstractUser):
         Returns:
             Optional[Organization]: The current organization or None
         """
+        if not self.pk:
+            return self._resolve_logged_org()
+
+        # Keyed by the membership version, so membership changes never serve
+        # a stale organization
+        key = 'core:logged_org_id:{}:{}:{}'.format(
+            self.pk,
+            self.__jwt_org_id or 0,
+            get_version(membership_version_namespace(self.pk))
+        )
+        org_id = cache.get(key, _MISSING)
+        if org_id is _MISSING:
+            org = self._resolve_logged_org()
+            cache.set(key, org.pk if org else None, LOGGED_ORG_CACHE_TIMEOUT)
+            return org
+        if org_id is None:
+            return None
+        if org_id == self.legacy_logged_org_id:
+            # Already loaded with `for_profile()`
+            return self.legacy_logged_org
+        return Organization.objects.filter(pk=org_id).first()
+
+    def _resolve_logged_org(self) -> Optional[Organization]:
+        """
+        Resolve the logged organization from the database.
+
+        Falling back to another organization stores it as `legacy_logged_org`;
+        that write is done in the background to keep it off the request path.
+        """
+        fallback = False
         if self.__jwt_org_id:
             org_to_return = Organization.objects.get(id=self.__jwt_org_id)
         else:
             if not self.legacy_logged_org:
                 self.legacy_logged_org = self.first_available_organization()
-                self.save(update_fields=['legacy_logged_org'])
+                fallback = True
             org_to_return = self.legacy_logged_org
 
         # Validate user membership
@@ -236,15 +292,33 @@ class User(AbstractUser):
 
         if not is_valid_member:
             org_to_return = self.first_available_organization()
-            self.save(update_fields=['legacy_logged_org'])
+            self.legacy_logged_org = org_to_return
+            fallback = True
+
+        if fallback and self.pk:
+            ThreadPoolService().submit_background_write(
+                User.objects.filter(pk=self.pk).update,
+                legacy_logged_org=self.legacy_logged_org
+            )
 
         return org_to_return
 
     def get_app_role_for_logged_org(self):
         """Get user's role in the currently logged organization."""
+        org = self.logged_org
+        if org is None:
+            return None
+
+        prefetched = getattr(self, '_prefetched_objects_cache', {}).get('organization_memberships')
+        if prefetched is not None:
+            return next(
+                (membership.app_role for membership in prefetched if membership.organization_id == org.pk),
+                None
+            )
+
         try:
-            return self.organizationmembership_set.get(
-                organization=self.logged_org
+            return self.organization_memberships.select_related('app_role').get(
+                organization=org
             ).app_role
         except ObjectDoesNotExist:
             return None
@@ -334,26 +408,22 @@ class User(AbstractUser):
         self.save(update_fields=['token', 'date_token'])
         return LEVEL_SUCCESS, _("Token set successfully.")
 
+    @cached_property
+    def restriction_snapshot(self) -> RestrictionSnapshot:
+        """Restricted places, addresses and Odoo address ids, loaded once per instance."""
+        return RestrictionSnapshot.for_user(self.pk)
+
     def get_restricted_places_ids(self) -> List[int]:
-        """Get IDs of places this user is restricted from accessing."""
-        return list(UserRestriction.objects.filter(
-            user=self,
-            content_type=ContentType.objects.get_for_model(Place)
-        ).values_list('object_id', flat=True))
+        """Get IDs of places this user is restricted from accessing, in ascending order."""
+        return sorted(self.restriction_snapshot.place_ids)
 
     def get_restricted_addresses_ids(self) -> List[int]:
-        """Get IDs of addresses this user is restricted from accessing."""
-        restricted_places = self.get_restricted_places_ids()
-        return list(Place.objects.filter(
-            id__in=restricted_places
-        ).values_list('address', flat=True))
+        """Get IDs of addresses this user is restricted from accessing, in ascending order."""
+        return sorted(self.restriction_snapshot.address_ids)
 
     def get_restricted_odoo_addresses_ids(self) -> List[int]:
-        """Get Odoo IDs of addresses this user is restricted from accessing."""
-        restricted_places = self.get_restricted_places_ids()
-        return list(Place.objects.filter(
-            id__in=restricted_places
-        ).values_list('address__odoo_id', flat=True))
+        """Get Odoo IDs of addresses this user is restricted from accessing, in ascending order."""
+        return sorted(self.restriction_snapshot.odoo_address_ids)
 
 
 @receiver(post_save, sender=User)
@@ -367,4 +437,9 @@ def post_save_user(
     Send activation email when a new inactive user is created.
     """
     if created and not instance.is_active:
-        instance.send_activation_email()
\ No newline at end of file
+        instance.send_activation_email()
+
+    update_fields = kwargs.get('update_fields')
+    if not created and (update_fields is None or 'legacy_logged_org' in update_fields):
+        # Switching organizations must not be answered from the cache
+        bump_version(membership_version_namespace(instance.pk))
\ No newline at end of file
@@ -1,9 +1,12 @@
 from django.db import models
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
 from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
-from typing import Tuple
+from typing import FrozenSet, Tuple
 
 from core.models.user_app_role_permission import UserAppRolePermission
+from core.role_permissions import role_permissions
 
 
 class UserAppRole(models.Model):
@@ -53,6 +56,14 @@ class UserAppRole(models.Model):
         """
         return reverse_lazy('panel:userapprole_detail', args=[self.pk])
 
+    @property
+    def permission_names(self) -> FrozenSet[str]:
+        """
+        Names of the permissions of this role, read from the compiled
+        role permissions shared by every worker (no queries once built).
+        """
+        return role_permissions.get().for_role(self.pk)
+
     def has_permission(self, permission_name: str) -> bool:
         """
         Check if this role has a specific permission.
@@ -63,4 +74,13 @@ class UserAppRole(models.Model):
         Returns:
             bool: True if the role has the permission, False otherwise
         """
-        return self.permissions.filter(name=permission_name).exists()
+        return permission_name in self.permission_names
+
+
+@receiver(m2m_changed, sender=UserAppRole.permissions.through)
+@receiver(post_delete, sender=UserAppRole)
+def invalidate_role_permissions(sender, **kwargs) -> None:
+    """Recompile role permissions when roles or their assignments change."""
+    action = kwargs.get('action')
+    if action is None or action.startswith('post_'):
+        role_permissions.invalidate()
@@ -1,8 +1,12 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
 from typing import Tuple
 
+from core.role_permissions import role_permissions
+
 
 class UserAppRolePermission(models.Model):
     """
@@ -53,3 +57,10 @@ class UserAppRolePermission(models.Model):
             QuerySet of UserAppRole instances with this permission.
         """
         return self.app_roles.all()
+
+
+@receiver(post_save, sender=UserAppRolePermission)
+@receiver(post_delete, sender=UserAppRolePermission)
+def invalidate_role_permissions_on_permission_change(sender, **kwargs) -> None:
+    """Renamed or deleted permissions change the compiled role permissions."""
+    role_permissions.invalidate()
@@ -1,10 +1,14 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from typing import Tuple, Any
 
+from core.restrictions import invalidate_user_restrictions
+
 
 class UserRestriction(models.Model):
     """
@@ -45,6 +49,7 @@ class UserRestriction(models.Model):
             models.Index(fields=['content_type', 'user']),
             models.Index(fields=['object_id']),
         ]
+        # Its index also serves the NOT EXISTS probes of `visible_to`
         unique_together = ('content_type', 'user', 'object_id')
         ordering = ['user', 'content_type', 'object_id']
 
@@ -104,3 +109,14 @@ class UserRestriction(models.Model):
             content_type=content_type,
             object_id=obj.pk
         )
+
+
+@receiver(post_save, sender=UserRestriction)
+@receiver(post_delete, sender=UserRestriction)
+def post_change_user_restriction(
+        sender: models.Model,
+        instance: UserRestriction,
+        **kwargs
+) -> None:
+    """Drop the cached restriction snapshot of the user."""
+    invalidate_user_restrictions(instance.user_id)
@@ -0,0 +1,14 @@
+from core.odoo.client import CircuitBreaker, OdooClient, OdooError, OdooUnavailable
+from core.odoo.pipeline import Stage, SyncPipeline
+from core.odoo.sync import OdooSync, SyncStats
+
+__all__ = [
+    'CircuitBreaker',
+    'OdooClient',
+    'OdooError',
+    'OdooSync',
+    'OdooUnavailable',
+    'Stage',
+    'SyncPipeline',
+    'SyncStats',
+]
@@ -0,0 +1,377 @@
+import http.client
+import logging
+import queue
+import random
+import threading
+import time
+import xmlrpc.client
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Odoo domains are lists of (field, operator, value) leaves and '&', '|', '!'
+Domain = List[Any]
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_MAX_CONNECTIONS = 4
+DEFAULT_MAX_RETRIES = 3
+
+
+class OdooError(Exception):
+    pass
+
+
+class OdooUnavailable(OdooError):
+    """Odoo could not be reached, or the circuit breaker is open."""
+
+
+# Network-level failures worth retrying; Faults are answers and are not retried
+TRANSIENT_ERRORS = (OSError, http.client.HTTPException, xmlrpc.client.ProtocolError)
+
+# Methods without side effects. A timed out `create` or `write` may still have
+# been applied by Odoo, so only these are retried unless a call opts in
+READ_METHODS = frozenset({'read', 'search', 'search_read', 'search_count', 'fields_get', 'name_search'})
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.seconds / self.calls if self.calls else 0.0
+
+
+@dataclass
+class ClientStats:
+    """Call counts and latencies by (model, method), plus retries and rejections."""
+    calls: Dict[Tuple[str, str], CallStats] = field(default_factory=lambda: defaultdict(CallStats))
+    retries: int = 0
+    rejected: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, key: Tuple[str, str], seconds: float, failed: bool) -> None:
+        with self._lock:
+            stats = self.calls[key]
+            stats.calls += 1
+            stats.errors += failed
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(stats.calls for stats in self.calls.values())
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': {
+                f'{model}.{method}': {
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'mean_ms': round(stats.mean_seconds * 1000, 1),
+                    'max_ms': round(stats.max_seconds * 1000, 1),
+                }
+                for (model, method), stats in self.calls.items()
+            },
+            'retries': self.retries,
+            'rejected': self.rejected,
+        }
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds; then lets one trial call through and closes
+    again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._trial_thread: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_running = True
+            self._trial_thread = threading.get_ident()
+            return True
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def failed(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End the current thread's trial call, if any, without counting it either way."""
+        with self._lock:
+            if self._trial_running and self._trial_thread == threading.get_ident():
+                self._trial_running = False
+
+
+class _Transport(xmlrpc.client.SafeTransport):
+    """HTTP(S) transport with a timeout; keeps its connection alive between calls."""
+
+    def __init__(self, timeout: float, https: bool):
+        super().__init__()
+        self.timeout = timeout
+        self.https = https
+
+    def make_connection(self, host):
+        if self.https:
+            connection = super().make_connection(host)
+        else:
+            connection = xmlrpc.client.Transport.make_connection(self, host)
+        connection.timeout = self.timeout
+        return connection
+
+
+class OdooClient:
+    """
+    Shared Odoo XML-RPC client (the external API at /xmlrpc/2).
+
+    - Keep-alive connections are pooled; at most `max_connections` calls
+      are in flight, callers beyond that wait for a free connection.
+    - `read` and `search_read_ids` split large id lists in chunks of
+      `batch_size` and fetch them concurrently.
+    - Network failures of read methods (`READ_METHODS`) are retried with
+      jittered exponential backoff, and a circuit breaker stops calling an
+      Odoo that keeps failing.
+    - Call counts and latencies are kept in `stats`.
+
+    The client is thread safe and meant to be reused.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        db: str,
+        username: str,
+        password: str,
+        timeout: float = 30,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff: float = 0.5,
+        max_backoff: float = 10,
+        circuit_breaker: Optional[CircuitBreaker] = None
+    ):
+        self.url = url.rstrip('/')
+        self.db = db
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = circuit_breaker or CircuitBreaker()
+        self.stats = ClientStats()
+        self._pool: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._pool_lock = threading.Lock()
+        self._uid: Optional[int] = None
+        self._uid_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, **kwargs) -> 'OdooClient':
+        if not settings.ODOO_URL:
+            raise OdooError("ODOO_URL is not configured")
+        return cls(settings.ODOO_URL, settings.ODOO_DB, settings.ODOO_USERNAME, settings.ODOO_PASSWORD, **kwargs)
+
+    # Connections
+
+    @contextmanager
+    def _transport(self) -> Iterator[_Transport]:
+        transport = None
+        try:
+            transport = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                if self._created < self.max_connections:
+                    self._created += 1
+                    transport = _Transport(self.timeout, https=self.url.startswith('https'))
+            if transport is None:
+                transport = self._pool.get()
+        try:
+            yield transport
+        except xmlrpc.client.Fault:
+            raise
+        except BaseException:
+            # The connection may be half-way through a response
+            transport.close()
+            raise
+        finally:
+            self._pool.put(transport)
+
+    def close(self) -> None:
+        """Close the pooled connections; the client can still be used afterwards."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._pool_lock:
+            self._created = 0
+
+    # Calls
+
+    def _call(self, service: str, method: str, args: Sequence[Any], key: Tuple[str, str], retry: bool) -> Any:
+        attempts = self.max_retries + 1 if retry else 1
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                self.stats.count('rejected')
+                raise OdooUnavailable(f"Circuit open, not calling Odoo {key[0]}.{key[1]}")
+
+            started = time.perf_counter()
+            try:
+                with self._transport() as transport:
+                    proxy = xmlrpc.client.ServerProxy(
+                        f'{self.url}/xmlrpc/2/{service}', transport=transport, allow_none=True
+                    )
+                    result = getattr(proxy, method)(*args)
+            except xmlrpc.client.Fault as e:
+                # Odoo answered: the service is healthy
+                self.stats.record(key, time.perf_counter() - started, failed=True)
+                self.breaker.succeeded()
+                raise OdooError(f"{key[0]}.{key[1]}: {e.faultString}") from e
+            except TRANSIENT_ERRORS as e:
+                self.stats.record(key, time.perf_counter() - started, failed=True)
+                self.breaker.failed()
+                if attempt == attempts - 1:
+                    raise OdooUnavailable(f"{key[0]}.{key[1]} failed: {e}") from e
+                self.stats.count('retries')
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                logger.warning("Odoo %s.%s failed (%s), retrying in %.2fs", key[0], key[1], e, delay)
+                time.sleep(delay)
+            except BaseException:
+                self.stats.record(key, time.perf_counter() - started, failed=True)
+                raise
+            else:
+                self.stats.record(key, time.perf_counter() - started, failed=False)
+                self.breaker.succeeded()
+                return result
+            finally:
+                # Neither an answer nor a network failure: free the trial slot
+                self.breaker.release()
+
+    @property
+    def uid(self) -> int:
+        if self._uid is None:
+            with self._uid_lock:
+                if self._uid is None:
+                    uid = self._call(
+                        'common', 'authenticate',
+                        (self.db, self.username, self.password, {}),
+                        ('common', 'authenticate'),
+                        retry=True
+                    )
+                    if not uid:
+                        raise OdooError(f"Odoo authentication failed for {self.username}")
+                    self._uid = uid
+        return self._uid
+
+    def execute_kw(
+        self,
+        model: str,
+        method: str,
+        args: Sequence[Any],
+        kwargs: Optional[Dict[str, Any]] = None,
+        retry: Optional[bool] = None
+    ) -> Any:
+        """
+        Call `model.method` on Odoo.
+
+        Args:
+            retry: Retry network failures; by default only `READ_METHODS` are
+                retried, pass True for idempotent writes
+        """
+        return self._call(
+            'object', 'execute_kw',
+            (self.db, self.uid, self.password, model, method, list(args), kwargs or {}),
+            (model, method),
+            retry=method in READ_METHODS if retry is None else retry
+        )
+
+    def search_read(
+        self,
+        model: str,
+        domain: Domain,
+        fields: Sequence[str],
+        offset: int = 0,
+        limit: Optional[int] = None,
+        order: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        kwargs: Dict[str, Any] = {'fields': list(fields), 'offset': offset}
+        if limit:
+            kwargs['limit'] = limit
+        if order:
+            kwargs['order'] = order
+        return self.execute_kw(model, 'search_read', [domain], kwargs)
+
+    # Batched calls
+
+    def _chunked(self, ids: Sequence[int], fetch: Callable[[List[int]], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        ids = list(dict.fromkeys(ids))
+        chunks = [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+        if len(chunks) <= 1:
+            return fetch(chunks[0]) if chunks else []
+        with ThreadPoolExecutor(max_workers=min(self.max_connections, len(chunks))) as executor:
+            results = list(executor.map(fetch, chunks))
+        return [record for chunk in results for record in chunk]
+
+    def read(self, model: str, ids: Sequence[int], fields: Sequence[str]) -> List[Dict[str, Any]]:
+        """Records by id, in chunks of `batch_size` read concurrently; missing ids are left out."""
+        by_id = {
+            record['id']: record
+            for record in self._chunked(
+                ids, lambda chunk: self.execute_kw(model, 'read', [chunk], {'fields': list(fields)})
+            )
+        }
+        return [by_id[record_id] for record_id in dict.fromkeys(ids) if record_id in by_id]
+
+    def search_read_ids(
+        self,
+        model: str,
+        ids: Sequence[int],
+        fields: Sequence[str],
+        domain: Optional[Domain] = None
+    ) -> List[Dict[str, Any]]:
+        """Records among `ids` that also match `domain`, fetched in concurrent chunks."""
+        return self._chunked(
+            ids,
+            lambda chunk: self.search_read(model, [('id', 'in', chunk), *(domain or [])], fields)
+        )
@@ -0,0 +1,228 @@
+"""
+Parallel Odoo sync: entities are stages of a dependency graph.
+
+Every stage has a fetcher, which pages through Odoo from the stage's
+watermark and buffers up to `prefetch_pages` pages, and a writer, which
+waits for the stages it depends on and then writes the buffered pages in
+order, moving the watermark after each one. Fetchers start right away, so
+downstream stages read Odoo while upstream ones are still writing, and
+stages that do not depend on each other write concurrently.
+
+Pages are streamed from a stage's fetcher to its writer, not from one stage
+to the next: a page may reference rows from any page of an upstream stage
+(the address of the first place can come in the last address page), so a
+stage only writes once its upstream stages are done.
+
+Fetchers and writers run on two bounded pools and are submitted in
+dependency order: a task only ever waits on tasks submitted before it,
+which already hold a worker, so small pools cannot deadlock.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from django.core.cache import cache
+from django.db import connection
+
+from core.constants import CRONJOB_SYNC_ODOO_FLAG
+from core.models import OdooSyncWatermark
+from core.models.cronjob import ALL_SYNC_ODOO, register_job
+from core.odoo.client import OdooClient
+from core.odoo.sync import DEFAULT_PAGE_SIZE, ENTITIES, EntitySync, OdooSync, SyncStats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 3
+DEFAULT_PREFETCH_PAGES = 4
+
+# Longest expected sync; the lock expires on its own if a worker dies
+SYNC_LOCK_TIMEOUT = 60 * 60 * 3
+
+# How often a fetcher with a full buffer checks whether its writer gave up
+_POLL_SECONDS = 0.5
+
+# Marks the end of a stage's pages in its buffer
+_END = object()
+
+# Stages each entity (by name) has to wait for
+DEPENDENCIES: Dict[str, Sequence[str]] = {
+    'addresses': ['districts'],
+    'organizations': ['addresses'],
+    'places': ['addresses', 'organizations'],
+    'memberships': ['organizations'],
+}
+
+
+class StageSkipped(Exception):
+    """A stage was not written because a stage it depends on failed."""
+
+
+@dataclass(frozen=True)
+class Stage:
+    entity: EntitySync
+    depends_on: Sequence[str] = ()
+
+    @property
+    def name(self) -> str:
+        return self.entity.name
+
+
+STAGES: List[Stage] = [Stage(entity, DEPENDENCIES.get(entity.name, ())) for entity in ENTITIES]
+
+
+def dependency_order(stages: Iterable[Stage]) -> List[Stage]:
+    """
+    Stages sorted so that every stage comes after its dependencies; the
+    given order is kept otherwise.
+
+    Raises:
+        ValueError: If a dependency is unknown or the dependencies form a cycle
+    """
+    stages = list(stages)
+    names = {stage.name for stage in stages}
+    for stage in stages:
+        unknown = set(stage.depends_on) - names
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages: {', '.join(sorted(unknown))}")
+
+    ordered: List[Stage] = []
+    done = set()
+    pending = stages
+    while pending:
+        ready = [stage for stage in pending if set(stage.depends_on) <= done]
+        if not ready:
+            raise ValueError(f"Stage dependencies form a cycle: {', '.join(stage.name for stage in pending)}")
+        ordered.extend(ready)
+        done.update(stage.name for stage in ready)
+        pending = [stage for stage in pending if stage.name not in done]
+    return ordered
+
+
+class SyncPipeline(OdooSync):
+    """
+    Runs the incremental sync of `OdooSync` as a dependency graph of stages
+    (see the module docstring). Stats are reported per stage; `seconds`
+    excludes the time spent waiting for upstream stages, kept in `waited`.
+
+    If a stage fails, the stages depending on it are skipped, the others
+    still run, and the first error is raised once all are finished.
+    """
+
+    def __init__(
+        self,
+        client: OdooClient,
+        stages: Optional[Iterable[Stage]] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        prefetch_pages: int = DEFAULT_PREFETCH_PAGES
+    ):
+        self.stages = dependency_order(stages if stages is not None else STAGES)
+        super().__init__(client, [stage.entity for stage in self.stages], page_size)
+        self.max_workers = max_workers
+        self.prefetch_pages = prefetch_pages
+
+    @staticmethod
+    def _put(buffer: queue.Queue, item: Any, abandoned: threading.Event) -> bool:
+        while not abandoned.is_set():
+            try:
+                buffer.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch(self, stage: Stage, cursor: OdooSyncWatermark, buffer: queue.Queue, abandoned: threading.Event) -> None:
+        """Buffer the stage's pages, moving an in-memory copy of its watermark."""
+        try:
+            for records in self.pages(stage.entity, cursor):
+                cursor.advance(records[-1])
+                if not self._put(buffer, records, abandoned):
+                    return
+            item = _END
+        except Exception as e:
+            item = e
+        self._put(buffer, item, abandoned)
+
+    def write(
+        self,
+        stage: Stage,
+        watermark: OdooSyncWatermark,
+        buffer: queue.Queue,
+        upstream: List[Future],
+        abandoned: threading.Event
+    ) -> SyncStats:
+        """Wait for the upstream stages, then write the buffered pages in order."""
+        stats = SyncStats()
+        started = time.perf_counter()
+        try:
+            for future in upstream:
+                if future.exception() is not None:
+                    raise StageSkipped(f"{stage.name}: an upstream stage failed")
+            stats.waited = time.perf_counter() - started
+
+            while (item := buffer.get()) is not _END:
+                if isinstance(item, Exception):
+                    raise item
+                self.write_page(stage.entity, watermark, item, stats)
+
+            stats.seconds = time.perf_counter() - started - stats.waited
+            watermark.finish(stats.as_dict())
+            logger.info("Odoo sync %s: %s", stage.name, stats.as_dict())
+            return stats
+        finally:
+            abandoned.set()
+            connection.close()
+
+    def run(self) -> Dict[str, SyncStats]:
+        watermarks = {
+            stage.name: OdooSyncWatermark.objects.get_or_create(entity=stage.name)[0]
+            for stage in self.stages
+        }
+        writes: Dict[str, Future] = {}
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix='odoo-fetch') as fetchers, \
+                ThreadPoolExecutor(self.max_workers, thread_name_prefix='odoo-write') as writers:
+            for stage in self.stages:
+                watermark = watermarks[stage.name]
+                # Each run starts over at the watermark second (see OdooSync.sync_entity)
+                watermark.last_id = 0
+                cursor = OdooSyncWatermark(entity=stage.name, write_date=watermark.write_date)
+                buffer: queue.Queue = queue.Queue(maxsize=self.prefetch_pages)
+                abandoned = threading.Event()
+                fetchers.submit(self.fetch, stage, cursor, buffer, abandoned)
+                writes[stage.name] = writers.submit(
+                    self.write, stage, watermark, buffer, [writes[name] for name in stage.depends_on], abandoned
+                )
+
+        results: Dict[str, SyncStats] = {}
+        errors: List[BaseException] = []
+        for name, future in writes.items():
+            error = future.exception()
+            if error is None:
+                results[name] = future.result()
+            elif isinstance(error, StageSkipped):
+                logger.warning("Odoo sync %s skipped", name)
+            else:
+                logger.error("Odoo sync %s failed", name, exc_info=error)
+                errors.append(error)
+        if errors:
+            raise errors[0]
+        return results
+
+
+@register_job(ALL_SYNC_ODOO)
+def sync_all_from_odoo() -> str:
+    """Incremental sync of every entity; only one sync runs at a time."""
+    if not cache.add(CRONJOB_SYNC_ODOO_FLAG, True, SYNC_LOCK_TIMEOUT):
+        return "Odoo sync already running."
+    try:
+        results = SyncPipeline(OdooClient.from_settings()).run()
+    finally:
+        cache.delete(CRONJOB_SYNC_ODOO_FLAG)
+    return "Odoo sync: " + ", ".join(
+        f"{name} {stats.fetched} fetched ({stats.created} created, {stats.updated} updated, {stats.rate:.0f}/s)"
+        for name, stats in results.items()
+    )
@@ -0,0 +1,477 @@
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from django.db import models, transaction
+from django.db.models.functions import Lower
+
+from core.constants import DOCUMENT_DNI_LENGTH
+from core.models import (
+    Address, Organization, OrganizationMembership, OdooSyncWatermark, Place, SearchEntry, User,
+)
+from core.models.organization_membership import membership_version_namespace
+from core.odoo.client import OdooClient
+from core.opening_hours import opening_hours_index
+from core.search import SOURCES, index_objects
+from core.versioned_cache import bump_version
+from shipping.models import District
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 500
+
+OdooRecord = Dict[str, Any]
+
+
+def many2one_id(value: Any) -> Optional[int]:
+    """Id of an Odoo many2one value ([id, display name] or False)."""
+    return value[0] if value else None
+
+
+def many2one_name(value: Any) -> Optional[str]:
+    return value[1] if value else None
+
+
+def text(value: Any, max_length: Optional[int] = None) -> Optional[str]:
+    """Odoo sends False for empty fields."""
+    if not value:
+        return None
+    value = str(value).strip()
+    return value[:max_length] if max_length else value
+
+
+@dataclass
+class SyncStats:
+    fetched: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    pages: int = 0
+    seconds: float = 0.0
+    # Time spent waiting for upstream stages (see SyncPipeline), not in `seconds`
+    waited: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Records processed per second."""
+        return self.fetched / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            **asdict(self),
+            'seconds': round(self.seconds, 3),
+            'waited': round(self.waited, 3),
+            'rate': round(self.rate, 1),
+        }
+
+
+class EntitySync:
+    """
+    Mirrors one Odoo model into a local model.
+
+    Records are matched on `lookup_field` (by default the local column
+    holding the Odoo id); every page is split into rows to create and rows
+    to update, and written with one bulk statement each. Rows whose values
+    did not change are not written.
+    """
+    name: str
+    odoo_model: str
+    odoo_fields: Sequence[str]
+    domain: List[Any] = []
+    model: type
+    lookup_field: str = 'odoo_id'
+    update_fields: Sequence[str]
+    can_create: bool = True
+
+    def lookup_value(self, record: OdooRecord, context: Dict[str, Any]) -> Any:
+        return record['id']
+
+    def prepare(self, records: List[OdooRecord]) -> Dict[str, Any]:
+        """Batch lookups shared by `build` for a page of records."""
+        return {}
+
+    def build(self, record: OdooRecord, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Local field values of a record, or None to skip it."""
+        raise NotImplementedError
+
+    def find_existing(self, values: Dict[Any, Dict[str, Any]]) -> Dict[Any, models.Model]:
+        """Local rows matching the given lookup values."""
+        return {
+            getattr(obj, self.lookup_field): obj
+            for obj in self.model.objects.filter(**{f'{self.lookup_field}__in': list(values)})
+        }
+
+    def conflicts(self, values: Dict[Any, Dict[str, Any]], existing: Dict[Any, models.Model]) -> List[Any]:
+        """Lookup values of rows that cannot be written without breaking a unique constraint."""
+        return []
+
+    def create(self, objects: List[models.Model]) -> None:
+        self.model.objects.bulk_create(objects)
+
+    def after_write(self, created: List[models.Model], updated: List[models.Model]) -> None:
+        pass
+
+    def upsert(self, records: List[OdooRecord], stats: SyncStats) -> None:
+        context = self.prepare(records)
+        values = {}
+        for record in records:
+            row = self.build(record, context)
+            if row is None:
+                stats.skipped += 1
+            else:
+                values[self.lookup_value(record, context)] = row
+
+        existing = self.find_existing(values)
+        # A failing write would roll back the page and block the watermark on it
+        for key in self.conflicts(values, existing):
+            del values[key]
+            stats.skipped += 1
+
+        to_create, to_update = [], []
+        for key, row in values.items():
+            obj = existing.get(key)
+            if obj is None:
+                if self.can_create:
+                    to_create.append(self.model(**{self.lookup_field: key}, **row))
+                else:
+                    stats.skipped += 1
+                continue
+            if all(getattr(obj, field) == value for field, value in row.items()):
+                stats.unchanged += 1
+                continue
+            for field, value in row.items():
+                setattr(obj, field, value)
+            to_update.append(obj)
+
+        if to_update:
+            self.model.objects.bulk_update(to_update, list(self.update_fields), batch_size=DEFAULT_PAGE_SIZE)
+        if to_create:
+            self.create(to_create)
+        self.after_write(to_create, to_update)
+        stats.created += len(to_create)
+        stats.updated += len(to_update)
+
+
+class DistrictSync(EntitySync):
+    """
+    Links districts to their Odoo record by ubigeo. Districts need their
+    boundary, so unknown ubigeos are skipped (see `load_districts`).
+    """
+    name = 'districts'
+    odoo_model = 'l10n_pe.res.city.district'
+    odoo_fields = ['code', 'name']
+    model = District
+    lookup_field = 'ubigeo'
+    update_fields = ['odoo_id']
+    can_create = False
+
+    def lookup_value(self, record: OdooRecord, context: Dict[str, Any]) -> Any:
+        return text(record['code'])
+
+    def build(self, record: OdooRecord, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not text(record['code']):
+            return None
+        return {'odoo_id': record['id']}
+
+
+class AddressSync(EntitySync):
+    """Partner addresses (companies and their delivery contacts) with a street."""
+    name = 'addresses'
+    odoo_model = 'res.partner'
+    odoo_fields = ['street', 'street2', 'city', 'state_id', 'country_code', 'l10n_pe_district']
+    domain = [('street', '!=', False)]
+    model = Address
+    update_fields = ['address_name', 'detail', 'city', 'province', 'country', 'district']
+
+    def prepare(self, records: List[OdooRecord]) -> Dict[str, Any]:
+        district_ids = {many2one_id(record['l10n_pe_district']) for record in records} - {None}
+        return {
+            'districts': dict(District.objects.filter(odoo_id__in=district_ids).values_list('odoo_id', 'pk'))
+        }
+
+    def build(self, record: OdooRecord, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return {
+            'address_name': text(record['street'], 200),
+            'detail': text(record['street2'], 200),
+            'city': text(record['city'], 100),
+            'province': text(many2one_name(record['state_id']), 100),
+            'country': text(record['country_code']) or 'PE',
+            'district_id': context['districts'].get(many2one_id(record['l10n_pe_district'])),
+        }
+
+    def create(self, objects: List[Address]) -> None:
+        for address in objects:
+            address.sync_delivery_windows()
+        Address.objects.bulk_create(objects)
+
+    def after_write(self, created: List[Address], updated: List[Address]) -> None:
+        index_objects(SearchEntry.Kind.ADDRESS, [*created, *updated])
+        if updated:
+            # Places show their address in their own entry
+            places = SOURCES[SearchEntry.Kind.PLACE]
+            index_objects(places.kind, places.queryset().filter(address__in=updated))
+
+
+class OrganizationSync(EntitySync):
+    """Commercial partners (no parent) with a document number."""
+    name = 'organizations'
+    odoo_model = 'res.partner'
+    odoo_fields = ['name', 'vat', 'is_company', 'country_code', 'street']
+    domain = [('parent_id', '=', False), ('vat', '!=', False)]
+    model = Organization
+    lookup_field = 'odoo_partner_id'
+    update_fields = [
+        'odoo_partner_id', 'legal_name', 'type', 'document_type', 'document_number', 'country', 'fiscal_address',
+    ]
+
+    def prepare(self, records: List[OdooRecord]) -> Dict[str, Any]:
+        # A partner's own address is synced as the Address with its id
+        partner_ids = [record['id'] for record in records if record['street']]
+        return {
+            'addresses': dict(Address.objects.filter(odoo_id__in=partner_ids).values_list('odoo_id', 'pk'))
+        }
+
+    def build(self, record: OdooRecord, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        document_number = text(record['vat'], 20)
+        if not document_number:
+            return None
+        return {
+            'legal_name': text(record['name'], 100) or '',
+            'type': Organization.OrgType.BUSINESS if record['is_company'] else Organization.OrgType.PERSON,
+            'document_type': (
+                Organization.DocumentType.DNI if len(document_number) == DOCUMENT_DNI_LENGTH
+                else Organization.DocumentType.RUC
+            ),
+            'document_number': document_number,
+            'country': text(record['country_code']) or 'PE',
+            'fiscal_address_id': context['addresses'].get(record['id']),
+        }
+
+    def find_existing(self, values: Dict[Any, Dict[str, Any]]) -> Dict[Any, Organization]:
+        existing = super().find_existing(values)
+        # Organizations created before being linked to Odoo are matched by document
+        unlinked = {
+            row['document_number']: partner_id
+            for partner_id, row in values.items() if partner_id not in existing
+        }
+        if unlinked:
+            for organization in Organization.objects.filter(
+                odoo_partner_id__isnull=True,
+                document_number__in=list(unlinked)
+            ):
+                partner_id = unlinked[organization.document_number]
+                values[partner_id]['odoo_partner_id'] = partner_id
+                existing[partner_id] = organization
+        return existing
+
+    def conflicts(self, values: Dict[Any, Dict[str, Any]], existing: Dict[Any, Organization]) -> List[Any]:
+        """
+        Partners whose document number is taken, by an earlier partner of
+        the page or by an organization linked to another partner.
+        """
+        owners = dict(Organization.objects.filter(
+            document_number__in={row['document_number'] for row in values.values()}
+        ).values_list('document_number', 'pk'))
+        seen, conflicts = set(), []
+        for partner_id, row in values.items():
+            document_number = row['document_number']
+            organization = existing.get(partner_id)
+            owner = owners.get(document_number)
+            if document_number in seen or (
+                owner is not None and (organization is None or owner != organization.pk)
+            ):
+                logger.warning(
+                    "Odoo sync %s: skipped partner %s, document number %s is already in use",
+                    self.name, partner_id, document_number
+                )
+                conflicts.append(partner_id)
+            else:
+                seen.add(document_number)
+        return conflicts
+
+    def create(self, objects: List[Organization]) -> None:
+        for organization in objects:
+            organization.orgcode = Organization.AUTOGENERATE_ORGCODE
+        Organization.objects.bulk_create_with_orgcodes(objects)
+
+    def after_write(self, created: List[Organization], updated: List[Organization]) -> None:
+        # Created ones are indexed by bulk_create_with_orgcodes
+        index_objects(SearchEntry.Kind.ORGANIZATION, updated)
+
+
+class PlaceSync(EntitySync):
+    """
+    Delivery contacts of commercial partners, as dispatch places of their
+    organization. A place is matched through its address (the Address
+    synced from the same partner).
+    """
+    name = 'places'
+    odoo_model = 'res.partner'
+    odoo_fields = ['name', 'phone', 'commercial_partner_id']
+    domain = [('parent_id', '!=', False), ('type', '=', 'delivery'), ('street', '!=', False)]
+    model = Place
+    lookup_field = 'address_id'
+    update_fields = ['name', 'org', 'phone', 'dispatch_address']
+
+    def prepare(self, records: List[OdooRecord]) -> Dict[str, Any]:
+        partner_ids = {many2one_id(record['commercial_partner_id']) for record in records} - {None}
+        return {
+            'addresses': dict(
+                Address.objects.filter(odoo_id__in=[record['id'] for record in records]).values_list('odoo_id', 'pk')
+            ),
+            'organizations': dict(
+                Organization.objects.filter(odoo_partner_id__in=partner_ids).values_list('odoo_partner_id', 'pk')
+            ),
+        }
+
+    def lookup_value(self, record: OdooRecord, context: Dict[str, Any]) -> Any:
+        return context['addresses'][record['id']]
+
+    def build(self, record: OdooRecord, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        org_id = context['organizations'].get(many2one_id(record['commercial_partner_id']))
+        name = text(record['name'], 120)
+        if record['id'] not in context['addresses'] or org_id is None or not name:
+            return None
+        return {
+            'name': name,
+            'org_id': org_id,
+            'phone': text(record['phone'], 30),
+            'dispatch_address': True,
+        }
+
+    def after_write(self, created: List[Place], updated: List[Place]) -> None:
+        if created:
+            # bulk_create skips post_save_place
+            opening_hours_index.invalidate()
+        source = SOURCES[SearchEntry.Kind.PLACE]
+        index_objects(source.kind, source.queryset().filter(pk__in=[place.pk for place in [*created, *updated]]))
+
+
+class MembershipSync(EntitySync):
+    """
+    Contacts of commercial partners whose email belongs to a user become
+    memberships of that user in the partner's organization. Memberships
+    are only added; roles are managed locally.
+    """
+    name = 'memberships'
+    odoo_model = 'res.partner'
+    odoo_fields = ['email', 'commercial_partner_id']
+    domain = [('parent_id', '!=', False), ('type', '=', 'contact'), ('email', '!=', False)]
+    model = OrganizationMembership
+    update_fields = []
+
+    def upsert(self, records: List[OdooRecord], stats: SyncStats) -> None:
+        emails = {text(record['email']).lower() for record in records if text(record['email'])}
+        users = dict(
+            User.objects.annotate(email_lower=Lower('email'))
+            .filter(email_lower__in=emails)
+            .values_list('email_lower', 'pk')
+        )
+        organizations = dict(
+            Organization.objects.filter(
+                odoo_partner_id__in={many2one_id(record['commercial_partner_id']) for record in records} - {None}
+            ).values_list('odoo_partner_id', 'pk')
+        )
+
+        pairs = set()
+        for record in records:
+            user_id = users.get((text(record['email']) or '').lower())
+            organization_id = organizations.get(many2one_id(record['commercial_partner_id']))
+            if user_id is None or organization_id is None:
+                stats.skipped += 1
+            elif (organization_id, user_id) in pairs:
+                stats.unchanged += 1
+            else:
+                pairs.add((organization_id, user_id))
+
+        existing = set(OrganizationMembership.objects.filter(
+            organization_id__in={organization_id for organization_id, _ in pairs},
+            user_id__in={user_id for _, user_id in pairs},
+        ).values_list('organization_id', 'user_id'))
+        missing = pairs - existing
+        OrganizationMembership.objects.bulk_create(
+            [OrganizationMembership(organization_id=org_id, user_id=user_id) for org_id, user_id in missing],
+            ignore_conflicts=True,
+        )
+        # bulk_create skips invalidate_membership_caches
+        for user_id in {user_id for _, user_id in missing}:
+            bump_version(membership_version_namespace(user_id))
+        stats.created += len(missing)
+        stats.unchanged += len(pairs & existing)
+
+
+# In dependency order: addresses reference districts, organizations
+# addresses, places and memberships organizations
+ENTITIES: List[EntitySync] = [DistrictSync(), AddressSync(), OrganizationSync(), PlaceSync(), MembershipSync()]
+
+
+class OdooSync:
+    """
+    Incremental Odoo sync: every entity pulls only the records written
+    since its watermark, page by page, and moves the watermark after each
+    page is committed, so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(
+        self,
+        client: OdooClient,
+        entities: Optional[Iterable[EntitySync]] = None,
+        page_size: int = DEFAULT_PAGE_SIZE
+    ):
+        self.client = client
+        self.entities = list(entities if entities is not None else ENTITIES)
+        self.page_size = page_size
+
+    def pages(self, entity: EntitySync, watermark: OdooSyncWatermark) -> Iterator[List[OdooRecord]]:
+        """
+        Pages of records changed after the watermark, ordered by (write_date, id).
+        The watermark has to be advanced before asking for the next page.
+        """
+        fields = [*entity.odoo_fields, 'write_date']
+        while True:
+            records = self.client.search_read(
+                entity.odoo_model,
+                [*entity.domain, *watermark.domain()],
+                fields,
+                limit=self.page_size,
+                order='write_date asc, id asc',
+            )
+            if records:
+                yield records
+            if len(records) < self.page_size:
+                return
+
+    def write_page(
+        self,
+        entity: EntitySync,
+        watermark: OdooSyncWatermark,
+        records: List[OdooRecord],
+        stats: SyncStats
+    ) -> None:
+        """Upsert a page and move the watermark past it, atomically."""
+        with transaction.atomic():
+            entity.upsert(records, stats)
+            watermark.advance(records[-1])
+            watermark.save(update_fields=['write_date', 'last_id'])
+        stats.fetched += len(records)
+        stats.pages += 1
+
+    def sync_entity(self, entity: EntitySync) -> SyncStats:
+        stats = SyncStats()
+        started = time.perf_counter()
+        watermark, _ = OdooSyncWatermark.objects.get_or_create(entity=entity.name)
+        # Odoo write dates have second precision: records written later in
+        # that same second may have lower ids, so each run starts over at the
+        # beginning of it. Re-read records are detected as unchanged.
+        watermark.last_id = 0
+        for records in self.pages(entity, watermark):
+            self.write_page(entity, watermark, records, stats)
+        stats.seconds = time.perf_counter() - started
+        watermark.finish(stats.as_dict())
+        logger.info("Odoo sync %s: %s", entity.name, stats.as_dict())
+        return stats
+
+    def run(self) -> Dict[str, SyncStats]:
+        return {entity.name: self.sync_entity(entity) for entity in self.entities}
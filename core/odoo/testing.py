@@ -0,0 +1,229 @@
+"""
+In-process stand-in for the Odoo external API, for tests and local runs.
+
+It serves /xmlrpc/2/common and /xmlrpc/2/object over HTTP/1.1 (keep-alive)
+from a threaded server and answers `search_read`, `read`, `search` and
+`search_count` from in-memory records, evaluating the usual domain
+operators. Every `execute_kw` call is recorded in `calls`, opened
+connections are counted in `connections`, and `fail_next` makes the next
+requests fail with an HTTP error to exercise retries.
+"""
+import itertools
+import socketserver
+import threading
+import xmlrpc.client
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from xmlrpc.server import MultiPathXMLRPCServer, SimpleXMLRPCDispatcher, SimpleXMLRPCRequestHandler
+
+from core.models.odoo_sync_watermark import ODOO_DATETIME_FORMAT
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime(ODOO_DATETIME_FORMAT)
+
+
+def _value(record: Dict[str, Any], field: str) -> Any:
+    value = record.get(field, False)
+    # Many2one values compare by id
+    if isinstance(value, (list, tuple)) and len(value) == 2 and isinstance(value[0], int):
+        return value[0]
+    return value
+
+
+def _leaf(record: Dict[str, Any], leaf) -> bool:
+    field, operator, expected = leaf
+    value = _value(record, field)
+    if operator == '=':
+        return value == expected
+    if operator == '!=':
+        return value != expected
+    if operator == 'in':
+        return value in expected
+    if operator == 'not in':
+        return value not in expected
+    if operator == 'ilike':
+        return bool(value) and str(expected).lower() in str(value).lower()
+    if value is False or value is None:
+        return False
+    if operator == '>':
+        return value > expected
+    if operator == '>=':
+        return value >= expected
+    if operator == '<':
+        return value < expected
+    if operator == '<=':
+        return value <= expected
+    raise ValueError(f"Unsupported operator {operator!r}")
+
+
+def matches(record: Dict[str, Any], domain: List[Any]) -> bool:
+    """Evaluate an Odoo domain (prefix notation, implicit '&') against a record."""
+    stack: List[bool] = []
+    for item in reversed(domain):
+        if item == '|':
+            stack.append(stack.pop() | stack.pop())
+        elif item == '&':
+            stack.append(stack.pop() & stack.pop())
+        elif item == '!':
+            stack.append(not stack.pop())
+        else:
+            stack.append(_leaf(record, item))
+    return all(stack)
+
+
+class _RequestHandler(SimpleXMLRPCRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    rpc_paths = ('/xmlrpc/2/common', '/xmlrpc/2/object')
+
+    def setup(self):
+        super().setup()
+        self.server.odoo.connection_opened()
+
+    def do_POST(self):
+        status = self.server.odoo.take_failure()
+        if status:
+            self.send_error(status)
+            return
+        super().do_POST()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(socketserver.ThreadingMixIn, MultiPathXMLRPCServer):
+    daemon_threads = True
+
+
+class FakeOdooServer:
+    """
+    Usage:
+        with FakeOdooServer() as odoo:
+            partner_id = odoo.add('res.partner', name='Bar', vat='20100000001')
+            client = OdooClient(odoo.url, odoo.db, odoo.username, odoo.password)
+    """
+
+    def __init__(self, db: str = 'test', username: str = 'admin', password: str = 'admin'):
+        self.db = db
+        self.username = username
+        self.password = password
+        self.records: Dict[str, Dict[int, Dict[str, Any]]] = defaultdict(dict)
+        self.calls: List[Tuple[str, str]] = []
+        self.connections = 0
+        self._failures: List[int] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server: Optional[_Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # Data
+
+    def add(self, model: str, **values) -> int:
+        with self._lock:
+            record_id = next(self._ids)
+            self.records[model][record_id] = {'write_date': _now(), **values, 'id': record_id}
+        return record_id
+
+    def write(self, model: str, record_id: int, **values) -> None:
+        with self._lock:
+            self.records[model][record_id].update({'write_date': _now(), **values})
+
+    def reset(self) -> None:
+        with self._lock:
+            self.records.clear()
+            self.calls.clear()
+            self.connections = 0
+            self._failures.clear()
+
+    def fail_next(self, count: int = 1, status: int = 503) -> None:
+        """Answer the next `count` requests with an HTTP error status."""
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def take_failure(self) -> Optional[int]:
+        with self._lock:
+            return self._failures.pop(0) if self._failures else None
+
+    def connection_opened(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    # Server
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'FakeOdooServer':
+        self._server = _Server(('127.0.0.1', 0), requestHandler=_RequestHandler, logRequests=False)
+        self._server.odoo = self
+        common = SimpleXMLRPCDispatcher(allow_none=True)
+        common.register_function(self._authenticate, 'authenticate')
+        common.register_function(lambda: {'server_version': 'fake'}, 'version')
+        obj = SimpleXMLRPCDispatcher(allow_none=True)
+        obj.register_function(self._execute_kw, 'execute_kw')
+        self._server.add_dispatcher('/xmlrpc/2/common', common)
+        self._server.add_dispatcher('/xmlrpc/2/object', obj)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> 'FakeOdooServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # RPC
+
+    def _authenticate(self, db, username, password, user_agent_env) -> Any:
+        if (db, username, password) == (self.db, self.username, self.password):
+            return 1
+        return False
+
+    def _execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        if (db, uid, password) != (self.db, 1, self.password):
+            raise xmlrpc.client.Fault(3, 'Access Denied')
+        with self._lock:
+            self.calls.append((model, method))
+        kwargs = kwargs or {}
+        handler = getattr(self, f'_rpc_{method}', None)
+        if handler is None:
+            raise xmlrpc.client.Fault(2, f'Method {method} not implemented')
+        return handler(model, *args, **kwargs)
+
+    def _search(self, model, domain, offset=0, limit=None, order=None) -> List[Dict[str, Any]]:
+        with self._lock:
+            records = [dict(record) for record in self.records[model].values() if matches(record, domain)]
+        for part in reversed((order or 'id asc').split(',')):
+            field, _, direction = part.strip().partition(' ')
+            records.sort(key=lambda record: _value(record, field), reverse=direction.lower() == 'desc')
+        return records[offset:offset + limit if limit else None]
+
+    @staticmethod
+    def _fields(record: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+        if not fields:
+            return record
+        return {'id': record['id'], **{field: record.get(field, False) for field in fields}}
+
+    def _rpc_search_read(self, model, domain=(), fields=None, offset=0, limit=None, order=None):
+        return [self._fields(r, fields) for r in self._search(model, list(domain), offset, limit, order)]
+
+    def _rpc_search(self, model, domain=(), offset=0, limit=None, order=None):
+        return [r['id'] for r in self._search(model, list(domain), offset, limit, order)]
+
+    def _rpc_search_count(self, model, domain=()):
+        return len(self._search(model, list(domain)))
+
+    def _rpc_read(self, model, ids, fields=None):
+        with self._lock:
+            records = [dict(self.records[model][i]) for i in ids if i in self.records[model]]
+        return [self._fields(record, fields) for record in records]
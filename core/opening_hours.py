@@ -0,0 +1,107 @@
+from datetime import datetime
+from typing import Dict, Generic, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
+
+from django.apps import apps
+from django.utils import timezone
+
+from core.models.period import MINUTES_PER_WEEK, minute_of_week
+from core.versioned_cache import VersionedValue
+
+T = TypeVar('T')
+
+
+class IntervalTree(Generic[T]):
+    """
+    Static centered interval tree over [start, end) intervals carrying a payload.
+    """
+
+    def __init__(self, intervals: List[Tuple[int, int, T]]):
+        self._center = 0
+        self._by_start: List[Tuple[int, int, T]] = []
+        self._by_end: List[Tuple[int, int, T]] = []
+        self._left: Optional[IntervalTree[T]] = None
+        self._right: Optional[IntervalTree[T]] = None
+        if not intervals:
+            return
+
+        # Centering on the median start guarantees the interval starting there
+        # stays in this node, so recursion always shrinks.
+        starts = sorted(start for start, _, _ in intervals)
+        self._center = starts[len(starts) // 2]
+
+        left, right, overlapping = [], [], []
+        for interval in intervals:
+            start, end, _ = interval
+            if end <= self._center:
+                left.append(interval)
+            elif start > self._center:
+                right.append(interval)
+            else:
+                overlapping.append(interval)
+
+        self._by_start = sorted(overlapping, key=lambda interval: interval[0])
+        self._by_end = sorted(overlapping, key=lambda interval: interval[1], reverse=True)
+        if left:
+            self._left = IntervalTree(left)
+        if right:
+            self._right = IntervalTree(right)
+
+    def stab(self, point: int) -> Iterator[T]:
+        """Yield the payload of every interval containing `point`."""
+        node = self
+        while node is not None:
+            if point < node._center:
+                for start, _, payload in node._by_start:
+                    if start > point:
+                        break
+                    yield payload
+                node = node._left
+            else:
+                for _, end, payload in node._by_end:
+                    if end <= point:
+                        break
+                    yield payload
+                node = node._right
+
+
+class OpeningHoursIndex:
+    """
+    In-memory "which places are open" resolver for bulk checks, answering the
+    same question as `Place.objects.open_at` without queries: only active
+    places are indexed.
+    """
+
+    def __init__(self, periods: Iterable[Tuple[int, int, int]]):
+        intervals = []
+        for place_id, start, end in periods:
+            intervals.append((start, end, place_id))
+            if end > MINUTES_PER_WEEK:
+                # The part of Sunday-night periods running into Monday morning
+                intervals.append((start - MINUTES_PER_WEEK, end - MINUTES_PER_WEEK, place_id))
+        self._tree: IntervalTree[int] = IntervalTree(intervals)
+
+    def open_at(self, when: datetime) -> Set[int]:
+        """Ids of the places open at the given (aware) datetime."""
+        return set(self._tree.stab(minute_of_week(timezone.localtime(when))))
+
+    def is_open(self, place_ids: Iterable[int], when: datetime) -> Dict[int, bool]:
+        open_places = self.open_at(when)
+        return {place_id: place_id in open_places for place_id in place_ids}
+
+
+def _build_opening_hours_index() -> OpeningHoursIndex:
+    Period = apps.get_model('core', 'Period')
+    return OpeningHoursIndex(
+        (place_id, minutes.lower, minutes.upper)
+        for place_id, minutes in Period.objects.filter(
+            place__is_active=True,
+            week_minutes__isnull=False,
+        ).order_by().values_list('place_id', 'week_minutes').iterator()
+    )
+
+
+# Built once per worker; invalidated on Period and Place changes
+opening_hours_index: VersionedValue[OpeningHoursIndex] = VersionedValue(
+    'core.opening_hours',
+    _build_opening_hours_index
+)
@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import OuterRef, QuerySet, Subquery
+
+from core.versioned_cache import bump_version, get_version
+
+# Bumped when any place changes its address; restrictions point at places,
+# so every snapshot depends on it.
+PLACES_VERSION_NAMESPACE = 'core.restricted_places'
+
+# Bounds staleness for changes no signal reports (e.g. an address odoo_id)
+SNAPSHOT_CACHE_TIMEOUT = 60 * 10
+
+
+def place_restrictions(users: Iterable) -> QuerySet:
+    """
+    Place restrictions of the given users (instances or ids), to be
+    correlated on `object_id` from a NOT EXISTS subquery.
+    """
+    Place = apps.get_model('core', 'Place')
+    UserRestriction = apps.get_model('core', 'UserRestriction')
+    user_ids = [getattr(user, 'pk', user) for user in users]
+    # Served by the (content_type, user, object_id) index of unique_together
+    return UserRestriction.objects.filter(
+        user_id__in=user_ids,
+        content_type=ContentType.objects.get_for_model(Place)
+    ).order_by()
+
+
+def user_restrictions_namespace(user_id: int) -> str:
+    return f'core.restrictions.{user_id}'
+
+
+@dataclass(frozen=True)
+class RestrictionSnapshot:
+    """Places a user is restricted from, with their addresses and Odoo address ids."""
+    place_ids: FrozenSet[int]
+    address_ids: FrozenSet[int]
+    odoo_address_ids: FrozenSet[int]
+
+    @classmethod
+    def load(cls, user_id: int) -> 'RestrictionSnapshot':
+        """Read the restrictions of a user from the database in a single query."""
+        Place = apps.get_model('core', 'Place')
+        UserRestriction = apps.get_model('core', 'UserRestriction')
+        place = Place.objects.filter(pk=OuterRef('object_id'))
+        rows = UserRestriction.objects.filter(
+            user_id=user_id,
+            content_type=ContentType.objects.get_for_model(Place)
+        ).annotate(
+            address_id=Subquery(place.values('address_id')[:1]),
+            odoo_address_id=Subquery(place.values('address__odoo_id')[:1]),
+        ).order_by().values_list('object_id', 'address_id', 'odoo_address_id')
+
+        place_ids, address_ids, odoo_address_ids = set(), set(), set()
+        for place_id, address_id, odoo_address_id in rows:
+            place_ids.add(place_id)
+            if address_id is not None:
+                address_ids.add(address_id)
+            if odoo_address_id is not None:
+                odoo_address_ids.add(odoo_address_id)
+        return cls(frozenset(place_ids), frozenset(address_ids), frozenset(odoo_address_ids))
+
+    @classmethod
+    def for_user(cls, user_id: int) -> 'RestrictionSnapshot':
+        """Cached snapshot of a user, rebuilt when their restrictions or any place change."""
+        key = 'core:restriction_snapshot:{}:{}:{}'.format(
+            user_id,
+            get_version(user_restrictions_namespace(user_id)),
+            get_version(PLACES_VERSION_NAMESPACE)
+        )
+        snapshot = cache.get(key)
+        if snapshot is None:
+            snapshot = cls.load(user_id)
+            cache.set(key, snapshot, SNAPSHOT_CACHE_TIMEOUT)
+        return snapshot
+
+
+def invalidate_user_restrictions(user_id: int) -> None:
+    bump_version(user_restrictions_namespace(user_id))
+
+
+def invalidate_restricted_places() -> None:
+    bump_version(PLACES_VERSION_NAMESPACE)
@@ -0,0 +1,91 @@
+from collections import defaultdict
+from typing import Dict, FrozenSet, Optional
+
+from django.apps import apps
+from django.core.cache import cache
+
+from core.versioned_cache import VersionedValue, get_version
+
+ROLE_PERMISSIONS_NAMESPACE = 'core.role_permissions'
+
+# Seconds the compiled map is kept, in the shared cache and in every worker;
+# bounds how long permissions can be stale if an invalidation is ever missed
+ROLE_PERMISSIONS_TIMEOUT = 60 * 10
+
+EMPTY_PERMISSIONS: FrozenSet[str] = frozenset()
+
+
+class RolePermissions:
+    """Permission names of every application role, compiled into frozensets."""
+
+    def __init__(self, permissions: Dict[int, FrozenSet[str]]):
+        self._permissions = permissions
+
+    def for_role(self, role_id: Optional[int]) -> FrozenSet[str]:
+        return self._permissions.get(role_id, EMPTY_PERMISSIONS)
+
+    def has_permission(self, role_id: Optional[int], permission_name: str) -> bool:
+        return permission_name in self.for_role(role_id)
+
+
+def _load_role_permissions() -> Dict[int, FrozenSet[str]]:
+    UserAppRole = apps.get_model('core', 'UserAppRole')
+    permissions = defaultdict(set)
+    rows = UserAppRole.permissions.through.objects.values_list(
+        'userapprole_id', 'userapprolepermission__permission'
+    )
+    for role_id, permission in rows:
+        permissions[role_id].add(permission)
+    return {role_id: frozenset(names) for role_id, names in permissions.items()}
+
+
+def _build_role_permissions() -> RolePermissions:
+    # Workers share the compiled map through the cache, so a bump costs
+    # one query overall instead of one per worker.
+    key = f'{ROLE_PERMISSIONS_NAMESPACE}:{get_version(ROLE_PERMISSIONS_NAMESPACE)}'
+    permissions = cache.get(key)
+    if permissions is None:
+        permissions = _load_role_permissions()
+        cache.set(key, permissions, timeout=ROLE_PERMISSIONS_TIMEOUT)
+    return RolePermissions(permissions)
+
+
+# Invalidated by changes to roles, permissions and their assignments
+role_permissions: VersionedValue[RolePermissions] = VersionedValue(
+    ROLE_PERMISSIONS_NAMESPACE,
+    _build_role_permissions,
+    max_age=ROLE_PERMISSIONS_TIMEOUT
+)
+
+
+def permissions_for(user, organization) -> FrozenSet[str]:
+    """
+    Permission names of a user within an organization, resolved through the
+    role of their membership. Users that are not members get no permissions.
+
+    Args:
+        user: User instance or id
+        organization: Organization instance or id
+
+    Returns:
+        FrozenSet[str]: Permission names
+    """
+    user_id = getattr(user, 'pk', user)
+    organization_id = getattr(organization, 'pk', organization)
+    if not user_id or not organization_id:
+        return EMPTY_PERMISSIONS
+
+    prefetched = getattr(user, '_prefetched_objects_cache', {}).get('organization_memberships')
+    if prefetched is not None:
+        role_id = next(
+            (m.app_role_id for m in prefetched if m.organization_id == organization_id),
+            None
+        )
+    else:
+        OrganizationMembership = apps.get_model('core', 'OrganizationMembership')
+        role_id = OrganizationMembership.objects.filter(
+            user_id=user_id,
+            organization_id=organization_id
+        ).values_list('app_role_id', flat=True).first()
+
+    return role_permissions.get().for_role(role_id)
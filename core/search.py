@@ -0,0 +1,239 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.apps import apps
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.signals import post_delete, post_save
+
+from core.constants import CRONJOB_REBUILD_INDEX_FLAG
+from core.models.cronjob import REBUILD_INDEX, register_job
+from core.models.search_entry import SearchEntry
+from core.pagination import KeysetPaginator
+from core.text import normalize_text
+
+DEFAULT_LIMIT = 20
+
+# Objects read and upserted per statement when rebuilding
+REBUILD_BATCH_SIZE = 1000
+
+# Longest expected rebuild; the lock expires on its own if a worker dies
+REBUILD_LOCK_TIMEOUT = 60 * 60
+
+_TERM = re.compile(r'\w+')
+
+
+@dataclass(frozen=True)
+class SearchSource:
+    """How objects of a model are turned into search entries."""
+    kind: str
+    model: str
+    # Model fields feeding the document; saves touching none of them are ignored
+    fields: frozenset
+    document: Callable[[models.Model], Tuple[str, Sequence[Optional[str]]]]
+    select_related: Tuple[str, ...] = ()
+
+    def get_model(self):
+        return apps.get_model(self.model)
+
+    def queryset(self) -> models.QuerySet:
+        return self.get_model().objects.select_related(*self.select_related)
+
+
+def _place_document(place) -> Tuple[str, Sequence[Optional[str]]]:
+    address = place.address
+    return place.name, (
+        place.name,
+        address.address_name if address else None,
+        address.city if address else None,
+    )
+
+
+SOURCES: Dict[str, SearchSource] = {
+    source.kind: source for source in (
+        SearchSource(
+            kind=SearchEntry.Kind.ORGANIZATION,
+            model='core.Organization',
+            fields=frozenset({
+                'legal_name', 'commercial_name', 'first_name', 'last_name',
+                'document_number', 'orgcode', 'type',
+            }),
+            document=lambda org: (str(org), (
+                org.legal_name, org.commercial_name, org.first_name, org.last_name,
+                org.document_number, org.orgcode,
+            )),
+        ),
+        SearchSource(
+            kind=SearchEntry.Kind.PLACE,
+            model='core.Place',
+            fields=frozenset({'name', 'address'}),
+            document=_place_document,
+            select_related=('address',),
+        ),
+        SearchSource(
+            kind=SearchEntry.Kind.ADDRESS,
+            model='core.Address',
+            fields=frozenset({'address_name', 'detail', 'city', 'province', 'country'}),
+            document=lambda address: (str(address), (
+                address.address_name, address.detail, address.city, address.province,
+            )),
+        ),
+        SearchSource(
+            kind=SearchEntry.Kind.USER,
+            model='core.User',
+            fields=frozenset({'first_name', 'last_name', 'username', 'email'}),
+            document=lambda user: (str(user), (
+                user.first_name, user.last_name, user.username, user.email,
+            )),
+        ),
+    )
+}
+
+
+def index_objects(kind: str, objects: Iterable[models.Model]) -> int:
+    """
+    Create or refresh the search entries of the given objects.
+
+    Args:
+        kind: One of `SearchEntry.Kind`
+        objects: Instances of the model indexed under `kind`
+
+    Returns:
+        int: Number of entries written
+    """
+    source = SOURCES[kind]
+    entries = {}
+    for obj in objects:
+        title, parts = source.document(obj)
+        entries[obj.pk] = SearchEntry(
+            kind=kind,
+            object_id=obj.pk,
+            title=(title or '')[:255],
+            text=normalize_text(' '.join(part for part in parts if part)),
+        )
+    if entries:
+        SearchEntry.objects.bulk_create(
+            entries.values(),
+            update_conflicts=True,
+            unique_fields=['kind', 'object_id'],
+            update_fields=['title', 'text'],
+        )
+    return len(entries)
+
+
+def remove_objects(kind: str, object_ids: Iterable[int]) -> int:
+    deleted, _ = SearchEntry.objects.filter(kind=kind, object_id__in=list(object_ids)).delete()
+    return deleted
+
+
+def _rebuild_kind(source: SearchSource, batch_size: int) -> int:
+    total = 0
+    last_pk = 0
+    queryset = source.queryset().order_by('pk')
+    while batch := list(queryset.filter(pk__gt=last_pk)[:batch_size]):
+        with transaction.atomic():
+            total += index_objects(source.kind, batch)
+        last_pk = batch[-1].pk
+
+    # Entries whose object no longer exists
+    SearchEntry.objects.filter(kind=source.kind).filter(
+        ~Exists(source.get_model().objects.filter(pk=OuterRef('object_id')))
+    ).delete()
+    return total
+
+
+@register_job(REBUILD_INDEX)
+def rebuild_search_index(batch_size: int = REBUILD_BATCH_SIZE) -> str:
+    """
+    Rebuild every search entry in keyset batches. Only one rebuild runs at
+    a time, guarded by the CRONJOB_REBUILD_INDEX_FLAG cache flag.
+    """
+    if not cache.add(CRONJOB_REBUILD_INDEX_FLAG, True, REBUILD_LOCK_TIMEOUT):
+        return "Search index rebuild already running."
+    try:
+        counts = {kind: _rebuild_kind(source, batch_size) for kind, source in SOURCES.items()}
+    finally:
+        cache.delete(CRONJOB_REBUILD_INDEX_FLAG)
+    return "Search index rebuilt: " + ", ".join(f"{count} {kind}" for kind, count in counts.items())
+
+
+@dataclass(frozen=True)
+class SearchPage:
+    entries: List[SearchEntry]
+    next_cursor: Optional[str]
+
+
+def search(
+    query: str,
+    kinds: Optional[Iterable[str]] = None,
+    limit: int = DEFAULT_LIMIT,
+    cursor: Optional[str] = None
+) -> SearchPage:
+    """
+    Ranked search over organizations, places, addresses and users.
+
+    Every word of the query is matched as a prefix in the full-text vector;
+    entries that only match by trigram word similarity (typos, partial
+    document numbers) are returned too, ranked lower.
+
+    Args:
+        query: Free text, accents and case are ignored
+        kinds: Restrict results to these `SearchEntry.Kind` values
+        limit: Page size
+        cursor: `next_cursor` of the previous page
+
+    Returns:
+        SearchPage: Entries, best first, and the cursor of the next page
+
+    Raises:
+        InvalidCursor: If the cursor is not a `next_cursor` from this function
+    """
+    key = normalize_text(query)
+    terms = _TERM.findall(key)
+    if not terms:
+        return SearchPage([], None)
+
+    tsquery = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='simple')
+    entries = SearchEntry.objects.filter(
+        Q(vector=tsquery) | Q(text__trigram_word_similar=key)
+    ).annotate(
+        rank=SearchRank(F('vector'), tsquery) + TrigramWordSimilarity(key, 'text')
+    )
+    if kinds is not None:
+        entries = entries.filter(kind__in=list(kinds))
+
+    page = KeysetPaginator(entries, per_page=limit, ordering=['-rank', '-pk']).page(cursor)
+    return SearchPage(page.object_list, page.next_cursor)
+
+
+def _post_save_indexed(sender, instance, created=False, update_fields=None, raw=False, **kwargs) -> None:
+    if raw:
+        return
+    for source in SOURCES.values():
+        if source.get_model() is not sender:
+            continue
+        if update_fields is not None and not set(update_fields) & source.fields:
+            return
+        index_objects(source.kind, [instance])
+
+    # Places show their address in their own entry
+    if sender is apps.get_model('core', 'Address') and not created:
+        places = SOURCES[SearchEntry.Kind.PLACE]
+        index_objects(places.kind, places.queryset().filter(address=instance))
+
+
+def _post_delete_indexed(sender, instance, **kwargs) -> None:
+    for source in SOURCES.values():
+        if source.get_model() is sender:
+            remove_objects(source.kind, [instance.pk])
+
+
+def connect_search_signals() -> None:
+    """Keep search entries in sync with objects saved or deleted one by one."""
+    for source in SOURCES.values():
+        model = source.get_model()
+        post_save.connect(_post_save_indexed, sender=model, dispatch_uid=f'search_index_{source.kind}')
+        post_delete.connect(_post_delete_indexed, sender=model, dispatch_uid=f'search_index_{source.kind}')
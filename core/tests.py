@@ -1,3 +1,1276 @@
-from django.test import TestCase
+import random
+import time as time_module
+from datetime import datetime, time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import (
+    Address, CronJob, OdooSyncWatermark, Organization, OrganizationMembership, Place, SearchEntry, User, UserAppRole,
+    UserAppRolePermission, UserRestriction,
+)
+from core.models.cronjob import REBUILD_INDEX
+from core.models.period import week_range
+from core.odoo import CircuitBreaker, OdooClient, OdooError, OdooSync, OdooUnavailable, Stage, SyncPipeline
+from core.odoo.pipeline import STAGES
+from core.odoo.sync import EntitySync
+from core.odoo.testing import FakeOdooServer
+from core.opening_hours import IntervalTree, OpeningHoursIndex
+from core.pagination import InvalidCursor, KeysetPaginator, decode_cursor, encode_cursor
+from core.restrictions import RestrictionSnapshot
+from core.role_permissions import (
+    ROLE_PERMISSIONS_NAMESPACE, ROLE_PERMISSIONS_TIMEOUT, permissions_for, role_permissions,
+)
+from core.search import rebuild_search_index, search
+from core.threadpool_service import ThreadPoolService
+from core.versioned_cache import VersionedValue, get_version
+from shipping.models import District
+
+
+class UserLoadingProfilesTests(TestCase):
+    """Query budgets of the `User.objects` loading profiles."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = UserAppRole.objects.create(name='admin')
+        cls.user = User.objects.create_user(
+            username='buyer',
+            password='secret',
+            email='buyer@example.com',
+            is_active=True,
+        )
+        cls.organizations = [
+            Organization.objects.create(
+                type=Organization.OrgType.BUSINESS,
+                orgcode=f'org-{number}',
+                legal_name=f'Organization {number}',
+                country='PE',
+                document_type=Organization.DocumentType.RUC,
+                document_number=f'2010000000{number}',
+            )
+            for number in range(3)
+        ]
+        for organization in cls.organizations:
+            OrganizationMembership.objects.create(
+                organization=organization,
+                user=cls.user,
+                app_role=cls.role,
+            )
+        cls.user.legacy_logged_org = cls.organizations[0]
+        cls.user.save(update_fields=['legacy_logged_org'])
+
+    def test_plain_get_loads_no_relations(self):
+        with self.assertNumQueries(1):
+            User.objects.get(pk=self.user.pk)
+
+    def test_login_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            User.objects.get_by_natural_key('buyer')
+        self.assertEqual(authenticate(username='buyer', password='secret'), self.user)
+
+    def test_for_auth(self):
+        with self.assertNumQueries(1):
+            user = User.objects.for_auth().get(pk=self.user.pk)
+        self.assertEqual(user, self.user)
+
+    def test_for_search(self):
+        with self.assertNumQueries(2):
+            user = User.objects.for_search().get(pk=self.user.pk)
+            organizations = list(user.organizations.all())
+        self.assertCountEqual(organizations, self.organizations)
+
+    def test_for_profile(self):
+        with self.assertNumQueries(2):
+            user = User.objects.for_profile().get(pk=self.user.pk)
+            self.assertEqual(user.legacy_logged_org, self.organizations[0])
+            for membership in user.organization_memberships.all():
+                self.assertEqual(membership.app_role, self.role)
+                str(membership.organization)
+
+    def test_for_profile_resolves_role_from_prefetch(self):
+        user = User.objects.for_profile().get(pk=self.user.pk)
+        user.logged_org  # Resolved (and cached) separately from the profile
+        with self.assertNumQueries(0):
+            self.assertEqual(user.get_app_role_for_logged_org(), self.role)
+
+
+class RolePermissionsTests(TestCase):
+    """
+    Compiled role permissions, their invalidation and `permissions_for`.
+
+    Invalidations happen on commit, so changes run under
+    `captureOnCommitCallbacks`.
+    """
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            role_permissions.invalidate()
+            self.view, self.order = (
+                UserAppRolePermission.objects.create(permission=name) for name in ('view_orders', 'create_orders')
+            )
+            self.role = UserAppRole.objects.create(name='buyer')
+            self.role.permissions.add(self.view)
+        self.user = User.objects.create_user(username='buyer', password='secret', is_active=True)
+        self.organization = Organization.objects.create(
+            type=Organization.OrgType.BUSINESS,
+            orgcode='org-roles',
+            legal_name='Organization',
+            country='PE',
+            document_type=Organization.DocumentType.RUC,
+            document_number='20100000099',
+        )
+        OrganizationMembership.objects.create(organization=self.organization, user=self.user, app_role=self.role)
+
+    def test_has_permission(self):
+        self.assertTrue(self.role.has_permission('view_orders'))
+        self.assertFalse(self.role.has_permission('create_orders'))
+        self.assertFalse(UserAppRole.objects.create(name='empty').has_permission('view_orders'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.role.permission_names, {'view_orders'})
+
+    def test_m2m_changes_invalidate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.permissions.add(self.order)
+        self.assertTrue(self.role.has_permission('create_orders'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.permissions.remove(self.view)
+        self.assertFalse(self.role.has_permission('view_orders'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.app_roles.clear()
+        self.assertEqual(self.role.permission_names, frozenset())
+
+    def test_permission_changes_invalidate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.view.permission = 'list_orders'
+            self.view.save()
+        self.assertEqual(self.role.permission_names, {'list_orders'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.view.delete()
+        self.assertEqual(self.role.permission_names, frozenset())
+
+    def test_invalidation_waits_for_commit(self):
+        role_permissions.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.role.permissions.add(self.order)
+            # Not committed yet: other workers must not rebuild from the old rows under a new version
+            self.assertFalse(self.role.has_permission('create_orders'))
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(self.role.has_permission('create_orders'))
+
+    def test_missed_invalidation_expires(self):
+        role_permissions.get()
+        # The bump is lost (never runs) but the map still expires
+        with self.captureOnCommitCallbacks():
+            self.role.permissions.add(self.order)
+        self.assertFalse(self.role.has_permission('create_orders'))
+        # The shared copy expired too
+        cache.delete(f'{ROLE_PERMISSIONS_NAMESPACE}:{get_version(ROLE_PERMISSIONS_NAMESPACE)}')
+        later = time_module.monotonic() + ROLE_PERMISSIONS_TIMEOUT
+        with mock.patch('core.versioned_cache.time.monotonic', return_value=later):
+            self.assertTrue(self.role.has_permission('create_orders'))
+
+    def test_permissions_for(self):
+        self.assertEqual(permissions_for(self.user, self.organization), {'view_orders'})
+        self.assertEqual(permissions_for(self.user.pk, self.organization.pk), {'view_orders'})
+        outsider = User.objects.create_user(username='outsider', password='secret', is_active=True)
+        self.assertEqual(permissions_for(outsider, self.organization), frozenset())
+        self.assertEqual(permissions_for(None, self.organization), frozenset())
+
+    def test_permissions_for_uses_prefetched_memberships(self):
+        user = User.objects.for_profile().get(pk=self.user.pk)
+        role_permissions.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(permissions_for(user, self.organization), {'view_orders'})
+
+
+class DueInvoicesBlockingTests(TestCase):
+    """`Organization.objects.apply_due_invoices` against the per-object `set_blocking_status_by_due_invoices`."""
+
+    STATES = [
+        # (blocked, blocking_reason, unblocking_reason)
+        (False, None, None),
+        (True, Organization.BlockReason.GENERAL, None),
+        (True, Organization.BlockReason.PAYMENT, None),
+        (False, None, Organization.UnblockReason.TEMPORAL),
+        (False, None, Organization.UnblockReason.PAYMENT),
+    ]
+
+    def create_organizations(self, prefix):
+        organizations = {}
+        for number, (state, due) in enumerate((state, due) for state in self.STATES for due in (0, 2)):
+            blocked, blocking_reason, unblocking_reason = state
+            organizations[(state, due)] = Organization.objects.create(
+                type=Organization.OrgType.BUSINESS,
+                orgcode=f'{prefix}-{number}',
+                legal_name=f'{prefix} {number}',
+                country='PE',
+                document_type=Organization.DocumentType.RUC,
+                document_number=f'{prefix}{number:03}',
+                blocked=blocked,
+                blocking_reason=blocking_reason,
+                unblocking_reason=unblocking_reason,
+            )
+        return organizations
+
+    @staticmethod
+    def status(organization):
+        organization.refresh_from_db()
+        return organization.blocked, organization.blocking_reason, organization.unblocking_reason
+
+    def test_same_result_as_one_by_one(self):
+        one_by_one = self.create_organizations('201')
+        set_based = self.create_organizations('202')
+
+        changed = {
+            key: organization.set_blocking_status_by_due_invoices(key[1])
+            for key, organization in one_by_one.items()
+        }
+        changes = Organization.objects.apply_due_invoices({
+            organization.pk: due for (_, due), organization in set_based.items()
+        })
+
+        for key, organization in set_based.items():
+            self.assertEqual(self.status(organization), self.status(one_by_one[key]), key)
+            self.assertEqual(
+                (organization.pk in changes.blocked, organization.pk in changes.unblocked),
+                (changed[key] and key[1] > 0, changed[key] and key[1] == 0),
+                key
+            )
+
+    def test_temporal_unblock(self):
+        organizations = self.create_organizations('203')
+        temporal = (False, None, Organization.UnblockReason.TEMPORAL)
+        with_due, without_due = organizations[(temporal, 2)], organizations[(temporal, 0)]
+
+        changes = Organization.objects.apply_due_invoices({with_due.pk: 2, without_due.pk: 0})
+
+        self.assertEqual(changes.blocked, [with_due.pk])
+        self.assertEqual(changes.unblocked, [without_due.pk])
+        self.assertEqual(self.status(with_due), (True, Organization.BlockReason.PAYMENT, None))
+        self.assertEqual(self.status(without_due), (False, None, Organization.UnblockReason.PAYMENT))
+
+    def test_organizations_left_out_are_untouched(self):
+        organizations = self.create_organizations('204')
+        blocked = organizations[((True, Organization.BlockReason.GENERAL, None), 0)]
+        self.assertEqual(Organization.objects.apply_due_invoices({}), ([], []))
+        self.assertEqual(self.status(blocked), (True, Organization.BlockReason.GENERAL, None))
+
+
+class OpeningHoursTests(SimpleTestCase):
+    """In-memory opening hours: interval tree, overnight and Sunday-night periods."""
+
+    def test_stab_matches_brute_force(self):
+        rng = random.Random(7)
+        intervals = []
+        for payload in range(300):
+            start = rng.randrange(0, 1000)
+            intervals.append((start, start + rng.randrange(1, 120), payload))
+        tree = IntervalTree(intervals)
+        for point in range(-5, 1130):
+            expected = {payload for start, end, payload in intervals if start <= point < end}
+            self.assertEqual(set(tree.stab(point)), expected, point)
+
+    def test_stab_empty_tree(self):
+        self.assertEqual(list(IntervalTree([]).stab(10)), [])
+
+    def test_overnight_period(self):
+        # Friday 20:00-02:00; 2024-01-05 is a Friday
+        index = OpeningHoursIndex([(1, *week_range(4, time(20), time(2)))])
+        self.assertEqual(index.open_at(self.at(5, 23, 30)), {1})
+        self.assertEqual(index.open_at(self.at(6, 1, 59)), {1})
+        self.assertEqual(index.open_at(self.at(6, 2)), set())
+        self.assertEqual(index.open_at(self.at(5, 19, 59)), set())
+
+    def test_sunday_night_wraps_to_monday(self):
+        # Sunday 22:00-03:00; 2024-01-07 is a Sunday
+        index = OpeningHoursIndex([(1, *week_range(6, time(22), time(3))), (2, *week_range(0, time(1), time(4)))])
+        self.assertEqual(index.open_at(self.at(7, 23)), {1})
+        self.assertEqual(index.open_at(self.at(8, 2)), {1, 2})
+        self.assertEqual(index.open_at(self.at(8, 3)), {2})
+        self.assertEqual(index.is_open([1, 2, 3], self.at(1, 0, 30)), {1: True, 2: False, 3: False})
+
+    @staticmethod
+    def at(day, hour, minute=0):
+        return timezone.make_aware(datetime(2024, 1, day, hour, minute))
+
+
+class KeysetCursorTests(SimpleTestCase):
+    """Cursor encoding and ordering resolution of `KeysetPaginator`."""
+
+    def test_cursor_round_trip(self):
+        values = ['Ñandú & Co', 3, None, '2024-01-01T10:00:00']
+        self.assertEqual(decode_cursor(encode_cursor(values), 4), values)
+
+    def test_invalid_cursors(self):
+        for cursor in ['%%%', 'bm90IGpzb24', encode_cursor([1, 2]), encode_cursor({'id': 1})[:-1]]:
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor, 3)
+
+    def test_foreign_keys_are_ordered_by_their_column(self):
+        paginator = KeysetPaginator(OrganizationMembership.objects.all())
+        self.assertEqual(paginator.ordering, [
+            ('organization_id', 'organization_id', False),
+            ('user_id', 'user_id', False),
+            ('id', 'id', False),
+        ])
+        sql = str(paginator.get_queryset(encode_cursor([1, 2, 3])).query)
+        self.assertIn('ORDER BY "core_organizationmembership"."organization_id" ASC', sql)
+        self.assertNotIn('JOIN', sql)
+
+    def test_rejects_nullable_and_multivalued_fields(self):
+        for ordering in [['fiscal_address'], ['memberships'], [F('legal_name').asc()]]:
+            with self.subTest(ordering=ordering), self.assertRaises(ImproperlyConfigured):
+                KeysetPaginator(Organization.objects.all(), ordering=ordering)
+
+    def test_pk_follows_the_last_direction(self):
+        paginator = KeysetPaginator(Organization.objects.all(), ordering=['legal_name', '-first_name'])
+        self.assertEqual(paginator.ordering[-1], ('id', 'id', True))
+
+
+class KeysetPaginatorTests(TestCase):
+    """Paging through every row with `KeysetPaginator` matches a plain ordered query."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Repeated names so the tiebreakers matter
+        for number in range(11):
+            Organization.objects.create(
+                type=Organization.OrgType.BUSINESS,
+                orgcode=f'P-{number}',
+                legal_name=f'Company {number % 3}',
+                first_name=f'Branch {number % 2}',
+                country='PE',
+                document_type=Organization.DocumentType.RUC,
+                document_number=f'P{number:03}',
+            )
+
+    def collect(self, ordering, per_page=3):
+        paginator = KeysetPaginator(Organization.objects.all(), per_page=per_page, ordering=ordering)
+        ids, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            self.assertLessEqual(len(page.object_list), per_page)
+            ids.extend(organization.pk for organization in page.object_list)
+            if not page.has_next:
+                return ids
+            cursor = page.next_cursor
+
+    def test_pages_match_the_full_ordering(self):
+        for ordering in [['legal_name', 'first_name'], ['-legal_name', '-first_name'], ['-legal_name', 'first_name']]:
+            with self.subTest(ordering=ordering):
+                pk = '-pk' if ordering[-1].startswith('-') else 'pk'
+                expected = list(Organization.objects.order_by(*ordering, pk).values_list('pk', flat=True))
+                self.assertEqual(self.collect(ordering), expected)
+
+    def test_single_page(self):
+        page = KeysetPaginator(Organization.objects.all(), per_page=20).page()
+        self.assertEqual(len(page.object_list), 11)
+        self.assertFalse(page.has_next)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(Organization.objects.all()).page('garbage')
+
+
+class FakeOdooMixin:
+    """A fake Odoo server with a company, its delivery address and a contact."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.odoo = FakeOdooServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.odoo.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.odoo.reset()
+        self.client = OdooClient(self.odoo.url, self.odoo.db, self.odoo.username, self.odoo.password)
+        self.district = District.objects.create(
+            ubigeo='150122',
+            name='Miraflores',
+            capital='Miraflores',
+            department='Lima',
+            province='Lima',
+            geom=MultiPolygon(Polygon(((-77.05, -12.13), (-77.01, -12.13), (-77.01, -12.10), (-77.05, -12.13)))),
+        )
+        self.odoo_district = self.odoo.add(
+            'l10n_pe.res.city.district', code='150122', name='Miraflores',
+            write_date='2024-01-01 08:00:00',
+        )
+        self.partner = self.odoo.add(
+            'res.partner', name='Bar Central', vat='20100000001', is_company=True, parent_id=False,
+            street='Av. Larco 123', street2=False, city='Lima', state_id=[15, 'Lima'], country_code='PE',
+            l10n_pe_district=[self.odoo_district, 'Miraflores'], write_date='2024-01-01 09:00:00',
+        )
+        self.delivery = self.odoo.add(
+            'res.partner', name='Bar Central, Almacén', vat=False, is_company=False, parent_id=[self.partner, 'Bar'],
+            commercial_partner_id=[self.partner, 'Bar'], type='delivery', phone='014440000',
+            street='Calle Schell 456', street2='Piso 2', city='Lima', state_id=[15, 'Lima'], country_code='PE',
+            l10n_pe_district=[self.odoo_district, 'Miraflores'], write_date='2024-01-01 09:30:00',
+        )
+        self.user = User.objects.create_user(
+            username='buyer', password='secret', email='buyer@example.com', is_active=True,
+        )
+        self.contact = self.odoo.add(
+            'res.partner', name='Ana', vat=False, is_company=False, parent_id=[self.partner, 'Bar'],
+            commercial_partner_id=[self.partner, 'Bar'], type='contact', email='Buyer@Example.com', street=False,
+            write_date='2024-01-01 09:45:00',
+        )
+
+
+class OdooSyncTests(FakeOdooMixin, TestCase):
+    """Incremental sync against the in-process fake Odoo server."""
+
+    def sync(self):
+        return OdooSync(self.client, page_size=1).run()
+
+    def test_first_run_mirrors_every_entity(self):
+        stats = self.sync()
+
+        self.assertEqual(stats['districts'].updated, 1)
+        self.assertEqual(stats['addresses'].created, 2)
+        self.assertEqual(stats['organizations'].created, 1)
+        self.assertEqual(stats['addresses'].pages, 2)
+
+        self.district.refresh_from_db()
+        self.assertEqual(self.district.odoo_id, self.odoo_district)
+        delivery = Address.objects.get(odoo_id=self.delivery)
+        self.assertEqual((delivery.address_name, delivery.detail), ('Calle Schell 456', 'Piso 2'))
+        self.assertEqual(delivery.district_id, self.district.pk)
+
+        organization = Organization.objects.get(odoo_partner_id=self.partner)
+        self.assertEqual(organization.orgcode, f'organization_{organization.pk}')
+        self.assertEqual(organization.document_type, Organization.DocumentType.RUC)
+        self.assertEqual(organization.fiscal_address.odoo_id, self.partner)
+
+        place = Place.objects.get(address=delivery)
+        self.assertEqual((place.name, place.org_id, place.phone), ('Bar Central, Almacén', organization.pk, '014440000'))
+        self.assertTrue(place.dispatch_address)
+        self.assertTrue(OrganizationMembership.objects.filter(organization=organization, user=self.user).exists())
+
+        watermark = OdooSyncWatermark.objects.get(entity='addresses')
+        self.assertEqual(watermark.last_id, self.delivery)
+        self.assertEqual(watermark.last_stats['created'], 2)
+
+    def test_next_runs_only_pull_changes(self):
+        self.sync()
+        self.odoo.calls.clear()
+
+        stats = self.sync()
+        self.assertEqual(sum(s.created + s.updated for s in stats.values()), 0)
+
+        self.odoo.write('res.partner', self.partner, name='Bar Central SAC', write_date='2024-02-01 10:00:00')
+        stats = self.sync()
+        self.assertEqual(stats['organizations'].fetched, 1)
+        self.assertEqual(stats['organizations'].updated, 1)
+        self.assertEqual(stats['addresses'].updated, 0)
+        self.assertEqual(
+            Organization.objects.get(odoo_partner_id=self.partner).legal_name,
+            'Bar Central SAC'
+        )
+
+    def test_links_existing_organization_by_document(self):
+        existing = Organization.objects.create(
+            type=Organization.OrgType.BUSINESS,
+            orgcode='bar-central',
+            legal_name='Bar',
+            country='PE',
+            document_type=Organization.DocumentType.RUC,
+            document_number='20100000001',
+        )
+        stats = self.sync()
+
+        self.assertEqual(stats['organizations'].created, 0)
+        existing.refresh_from_db()
+        self.assertEqual(existing.odoo_partner_id, self.partner)
+        self.assertEqual(existing.orgcode, 'bar-central')
+
+    def add_twin(self, write_date):
+        """Another commercial partner with the VAT of `self.partner`."""
+        return self.odoo.add(
+            'res.partner', name='Bar Central Twin', vat='20100000001', is_company=True, parent_id=False,
+            street=False, country_code='PE', write_date=write_date,
+        )
+
+    def test_duplicate_document_numbers_in_a_page(self):
+        twin = self.add_twin('2024-01-01 09:00:00')
+        with self.assertLogs('core.odoo.sync', 'WARNING'):
+            stats = OdooSync(self.client, page_size=10).run()
+
+        self.assertEqual((stats['organizations'].created, stats['organizations'].skipped), (1, 1))
+        self.assertEqual(
+            list(Organization.objects.values_list('odoo_partner_id', flat=True)), [min(self.partner, twin)]
+        )
+        watermark = OdooSyncWatermark.objects.get(entity='organizations')
+        self.assertEqual(watermark.last_id, max(self.partner, twin))
+
+    def test_document_number_of_another_partner(self):
+        self.sync()
+        twin = self.add_twin('2024-02-01 10:00:00')
+        with self.assertLogs('core.odoo.sync', 'WARNING'):
+            stats = self.sync()
+
+        self.assertEqual((stats['organizations'].created, stats['organizations'].skipped), (0, 1))
+        self.assertFalse(Organization.objects.filter(odoo_partner_id=twin).exists())
+        self.assertEqual(OdooSyncWatermark.objects.get(entity='organizations').last_id, twin)
+
+        # Nor can a linked partner take it over
+        other = self.odoo.add(
+            'res.partner', name='Otro Bar', vat='20100000002', is_company=True, parent_id=False,
+            street=False, country_code='PE', write_date='2024-02-01 11:00:00',
+        )
+        # The twin is read again, the run restarts at the second it was written
+        with self.assertLogs('core.odoo.sync', 'WARNING'):
+            self.sync()
+        self.odoo.write('res.partner', other, vat='20100000001', write_date='2024-02-01 12:00:00')
+        with self.assertLogs('core.odoo.sync', 'WARNING'):
+            stats = self.sync()
+        self.assertEqual((stats['organizations'].updated, stats['organizations'].skipped), (0, 1))
+        self.assertEqual(Organization.objects.get(odoo_partner_id=other).document_number, '20100000002')
+
+    def test_address_change_reindexes_its_place(self):
+        self.sync()
+        self.odoo.write('res.partner', self.delivery, street='Jr. Huallaga 789', write_date='2024-02-01 10:00:00')
+        self.sync()
+
+        place = Place.objects.get(address__odoo_id=self.delivery)
+        entries = search('huallaga', kinds=[SearchEntry.Kind.PLACE]).entries
+        self.assertEqual([entry.object_id for entry in entries], [place.pk])
+
+
+class FailingSync(EntitySync):
+    name = 'failing'
+    odoo_model = 'res.partner'
+    odoo_fields = ['name']
+
+    def upsert(self, records, stats):
+        raise RuntimeError("write failed")
+
+
+class SyncPipelineTests(FakeOdooMixin, TransactionTestCase):
+    """
+    The pipeline writes from worker threads, on their own connections, so
+    data has to be committed (TransactionTestCase).
+    """
+
+    @staticmethod
+    def counts(stats):
+        return {name: (s.fetched, s.created, s.updated, s.unchanged, s.skipped, s.pages) for name, s in stats.items()}
+
+    @staticmethod
+    def rows():
+        """Synced data, without the primary keys (sequences are not rolled back)."""
+        return (
+            list(District.objects.values_list('ubigeo', 'odoo_id')),
+            sorted(Address.objects.values_list('odoo_id', 'address_name', 'detail', 'district__ubigeo')),
+            list(Organization.objects.values_list(
+                'odoo_partner_id', 'legal_name', 'document_number', 'fiscal_address__odoo_id'
+            )),
+            list(Place.objects.values_list('address__odoo_id', 'org__odoo_partner_id', 'name', 'dispatch_address')),
+            list(OrganizationMembership.objects.values_list('organization__odoo_partner_id', 'user__username')),
+            sorted(OdooSyncWatermark.objects.values_list('entity', 'write_date', 'last_id')),
+        )
+
+    def test_matches_the_serial_sync(self):
+        with transaction.atomic():
+            serial_stats = OdooSync(self.client, page_size=1).run()
+            serial_rows = self.rows()
+            transaction.set_rollback(True)
+        self.assertFalse(Address.objects.exists())
+
+        stats = SyncPipeline(self.client, page_size=1, max_workers=2, prefetch_pages=1).run()
+
+        self.assertEqual(list(stats), ['districts', 'addresses', 'organizations', 'places', 'memberships'])
+        self.assertEqual(self.counts(stats), self.counts(serial_stats))
+        self.assertEqual(self.rows(), serial_rows)
+        self.assertEqual(stats['addresses'].created, 2)
+        self.assertEqual(stats['places'].created, 1)
+        self.assertEqual(stats['memberships'].created, 1)
+        organization = Organization.objects.get(odoo_partner_id=self.partner)
+        self.assertEqual(Place.objects.get(address__odoo_id=self.delivery).org, organization)
+        self.assertEqual(OdooSyncWatermark.objects.get(entity='places').last_id, self.delivery)
+
+        stats = SyncPipeline(self.client, page_size=1).run()
+        self.assertEqual(sum(s.created + s.updated for s in stats.values()), 0)
+
+    def test_runs_with_a_single_worker(self):
+        stats = SyncPipeline(self.client, page_size=1, max_workers=1, prefetch_pages=1).run()
+        self.assertEqual(stats['places'].created, 1)
+
+    def test_failed_stage_skips_its_dependents_only(self):
+        stages = [
+            Stage(STAGES[0].entity),
+            Stage(FailingSync()),
+            Stage(STAGES[1].entity, depends_on=['districts', 'failing']),
+        ]
+        with self.assertRaisesMessage(RuntimeError, 'write failed'):
+            SyncPipeline(self.client, stages).run()
+        self.district.refresh_from_db()
+        self.assertEqual(self.district.odoo_id, self.odoo_district)
+        self.assertFalse(Address.objects.exists())
+
+    def test_rejects_cycles(self):
+        with self.assertRaises(ValueError):
+            SyncPipeline(self.client, [
+                Stage(STAGES[0].entity, depends_on=['addresses']),
+                Stage(STAGES[1].entity, depends_on=['districts']),
+            ])
+
+
+class OdooClientTests(SimpleTestCase):
+    """Pooling, batching, retries and circuit breaking against the fake Odoo server."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.odoo = FakeOdooServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.odoo.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.odoo.reset()
+        self.ids = [self.odoo.add('res.partner', name=f'Partner {i}') for i in range(450)]
+
+    def make_client(self, **kwargs):
+        kwargs = {'batch_size': 200, 'backoff': 0.01, **kwargs}
+        client = OdooClient(self.odoo.url, self.odoo.db, self.odoo.username, self.odoo.password, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_read_is_batched_and_keeps_order(self):
+        ids = list(reversed(self.ids))
+        records = self.make_client().read('res.partner', ids, ['name'])
+        self.assertEqual([record['id'] for record in records], ids)
+        self.assertEqual(self.odoo.calls.count(('res.partner', 'read')), 3)
+
+    def test_search_read_ids_filters_each_batch(self):
+        records = self.make_client().search_read_ids('res.partner', self.ids, ['name'], [('name', 'ilike', 'Partner 1')])
+        self.assertEqual(len(records), 111)
+        self.assertEqual(self.odoo.calls.count(('res.partner', 'search_read')), 3)
+
+    def test_connections_are_reused(self):
+        client = self.make_client(max_connections=2)
+        for _ in range(5):
+            client.search_read('res.partner', [('id', '=', self.ids[0])], ['name'])
+        self.assertEqual(self.odoo.connections, 1)
+        client.read('res.partner', self.ids, ['name'])
+        self.assertLessEqual(self.odoo.connections, 2)
+
+    def test_transient_errors_are_retried(self):
+        client = self.make_client()
+        client.uid
+        self.odoo.fail_next(2)
+        records = client.search_read('res.partner', [('id', '=', self.ids[0])], ['name'])
+        self.assertEqual(records, [{'id': self.ids[0], 'name': 'Partner 0'}])
+        self.assertEqual(client.stats.retries, 2)
+
+    def test_faults_are_not_retried(self):
+        client = self.make_client()
+        with self.assertRaises(OdooError):
+            client.execute_kw('res.partner', 'unlink', [[self.ids[0]]])
+        self.assertEqual(client.stats.retries, 0)
+        self.assertFalse(client.breaker.is_open)
+
+    def test_writes_are_not_retried(self):
+        client = self.make_client()
+        client.uid
+        self.odoo.fail_next(1)
+        with self.assertRaises(OdooUnavailable):
+            client.execute_kw('res.partner', 'write', [[self.ids[0]], {'name': 'Renamed'}])
+        self.assertEqual(client.stats.retries, 0)
+        self.odoo.fail_next(1)
+        with self.assertRaises(OdooUnavailable):
+            client.execute_kw('res.partner', 'search_count', [[]], retry=False)
+        self.assertEqual(client.stats.retries, 0)
+        # Opted in: retried, then answered (the fake server has no `write`)
+        self.odoo.fail_next(1)
+        with self.assertRaisesMessage(OdooError, 'not implemented'):
+            client.execute_kw('res.partner', 'write', [[self.ids[0]], {'name': 'Renamed'}], retry=True)
+        self.assertEqual(client.stats.retries, 1)
+
+    def test_unexpected_error_frees_the_trial_call(self):
+        client = self.make_client(max_retries=0, circuit_breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+        client.uid
+        self.odoo.fail_next(1)
+        with self.assertRaises(OdooUnavailable):
+            client.search_read('res.partner', [], ['name'])
+        self.assertTrue(client.breaker.is_open)
+        with mock.patch.object(OdooClient, '_transport', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            client.search_read('res.partner', [], ['name'])
+        client.search_read('res.partner', [('id', '=', self.ids[0])], ['name'])
+        self.assertFalse(client.breaker.is_open)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        client = self.make_client(max_retries=0, circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        client.uid
+        self.odoo.fail_next(5)
+        for _ in range(2):
+            with self.assertRaises(OdooUnavailable):
+                client.search_read('res.partner', [], ['name'])
+        calls = len(self.odoo.calls)
+        with self.assertRaisesMessage(OdooUnavailable, 'Circuit open'):
+            client.search_read('res.partner', [], ['name'])
+        self.assertEqual(len(self.odoo.calls), calls)
+        self.assertEqual(client.stats.rejected, 1)
+
+
+class BackfillAddressDistrictsTests(TestCase):
+    """`backfill_address_districts`: spatial join, name fallback, dry run and resuming."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.miraflores = District.objects.create(
+                ubigeo='150122', name='MIRAFLORES', capital='MIRAFLORES', department='LIMA', province='LIMA',
+                geom=MultiPolygon(Polygon.from_bbox((-77.05, -12.13, -77.01, -12.10)), srid=4326),
+            )
+            self.cayma = District.objects.create(
+                ubigeo='040103', name='CAYMA', capital='CAYMA', department='AREQUIPA', province='AREQUIPA',
+                geom=MultiPolygon(Polygon.from_bbox((-71.56, -16.38, -71.52, -16.34)), srid=4326),
+            )
+        self.by_location = Address.objects.create(
+            country='PE', address_name='Av. Larco 123', city='Arequipa', location=Point(-77.03, -12.12, srid=4326),
+        )
+        self.by_name = Address.objects.create(country='PE', address_name='Calle 1', city='Cáyma', province='Arequipa')
+        self.unmatched = Address.objects.create(country='PE', address_name='Calle 2', city='Atlantis')
+        self.no_city = Address.objects.create(country='PE', address_name='Calle 3')
+
+    def backfill(self, *args):
+        out = StringIO()
+        call_command('backfill_address_districts', *args, stdout=out)
+        return out.getvalue()
+
+    def districts(self):
+        return dict(Address.objects.values_list('pk', 'district_id'))
+
+    def test_location_wins_over_name(self):
+        output = self.backfill()
+        self.assertIn('Matched 2 of 4 addresses', output)
+        self.assertEqual(self.districts(), {
+            self.by_location.pk: self.miraflores.pk,
+            self.by_name.pk: self.cayma.pk,
+            self.unmatched.pk: None,
+            self.no_city.pk: None,
+        })
+
+    def test_dry_run_saves_nothing(self):
+        output = self.backfill('--dry-run')
+        self.assertIn('[dry run] Matched 2 of 4 addresses', output)
+        self.assertEqual(set(self.districts().values()), {None})
+
+    def test_resumes(self):
+        self.backfill('--after-id', str(self.by_location.pk), '--batch-size', '1')
+        self.assertEqual(self.districts()[self.by_location.pk], None)
+        self.assertEqual(self.districts()[self.by_name.pk], self.cayma.pk)
+
+        # Addresses that already have a district are not visited again
+        output = self.backfill()
+        self.assertIn('Matched 1 of 3 addresses', output)
+        self.assertEqual(self.districts()[self.by_location.pk], self.miraflores.pk)
+
+
+class AddressDeliveryWindowTests(TestCase):
+    """`deliverable_at` / `deliverable_between` over the indexed delivery windows."""
+
+    def setUp(self):
+        self.morning = Address.objects.create(
+            country='PE', address_name='Morning', schedule_min_1=time(8), schedule_max_1=time(12),
+        )
+        self.split = Address.objects.create(
+            country='PE', address_name='Split', schedule_min_1=time(9), schedule_max_1=time(11),
+            schedule_min_2=time(15), schedule_max_2=time(18),
+        )
+        self.anytime = Address.objects.create(country='PE', address_name='No windows')
+
+    def names(self, queryset):
+        return sorted(queryset.values_list('address_name', flat=True))
+
+    def test_deliverable_at(self):
+        self.assertEqual(self.names(Address.objects.deliverable_at(time(8))), ['Morning'])
+        self.assertEqual(self.names(Address.objects.deliverable_at(time(10, 30))), ['Morning', 'Split'])
+        # Half-open: the end of a window is outside it
+        self.assertEqual(self.names(Address.objects.deliverable_at(time(12))), [])
+        self.assertEqual(self.names(Address.objects.deliverable_at(time(16))), ['Split'])
+
+    def test_deliverable_between(self):
+        self.assertEqual(self.names(Address.objects.deliverable_between(time(9), time(11))), ['Morning', 'Split'])
+        self.assertEqual(self.names(Address.objects.deliverable_between(time(10), time(12))), ['Morning'])
+        # A span across both windows of an address is not covered by a single one
+        self.assertEqual(self.names(Address.objects.deliverable_between(time(10), time(16))), [])
+        self.assertEqual(self.names(Address.objects.deliverable_between(time(12), time(10))), [])
+
+    def test_empty_span_is_a_point_in_time(self):
+        self.assertEqual(self.names(Address.objects.deliverable_between(time(16), time(16))), ['Split'])
+        self.assertEqual(self.names(Address.objects.deliverable_between(time(13), time(13))), [])
+
+    def test_inverted_windows_have_no_range(self):
+        address = Address(country='PE', address_name='Legacy', schedule_min_1=time(12), schedule_max_1=time(8))
+        address.sync_delivery_windows()
+        self.assertIsNone(address.delivery_window_1)
+        Address.objects.filter(pk=self.morning.pk).update(schedule_min_1=time(13))
+        morning = Address.objects.get(pk=self.morning.pk)
+        morning.sync_delivery_windows()
+        self.assertIsNone(morning.delivery_window_1)
+
+
+def create_organization(code: str) -> Organization:
+    return Organization.objects.create(
+        type=Organization.OrgType.BUSINESS,
+        orgcode=code,
+        legal_name=code.title(),
+        country='PE',
+        document_type=Organization.DocumentType.RUC,
+        document_number=f'DOC-{code}',
+    )
+
+
+def create_place(organization: Organization, odoo_id: int, **values) -> Place:
+    address = Address.objects.create(country='PE', address_name=f'Address {odoo_id}', odoo_id=odoo_id)
+    return Place.objects.create(org=organization, name=f'Place {odoo_id}', address=address, **values)
+
+
+def restrict(user: User, place: Place) -> UserRestriction:
+    return UserRestriction.objects.create(
+        user=user, content_type=ContentType.objects.get_for_model(Place), object_id=place.pk,
+    )
+
+
+class ActiveUserEmailsTests(TestCase):
+    """`Organization.objects.active_user_emails_map` against the per-organization `get_active_user_emails`."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first, cls.second = create_organization('first'), create_organization('second')
+        cls.places = {
+            odoo_id: create_place(organization, odoo_id)
+            for organization, odoo_id in [(cls.first, 100), (cls.first, 200), (cls.second, 300)]
+        }
+        users = {
+            'plain': ['first'],
+            'both': ['first', 'second'],
+            'inactive': ['first', 'second'],
+            'restricted_100': ['first', 'second'],
+            'restricted_200_300': ['first', 'second'],
+            'blank_email': ['first'],
+        }
+        for username, codes in users.items():
+            user = User.objects.create_user(
+                username=username,
+                email='  ' if username == 'blank_email' else f'{username}@example.com',
+                is_active=username != 'inactive',
+            )
+            for code in codes:
+                OrganizationMembership.objects.create(organization=getattr(cls, code), user=user)
+        restrict(User.objects.get(username='restricted_100'), cls.places[100])
+        restrict(User.objects.get(username='restricted_200_300'), cls.places[200])
+        restrict(User.objects.get(username='restricted_200_300'), cls.places[300])
+
+    def test_matches_get_active_user_emails(self):
+        pairs = [
+            (self.first, None), (self.first, 100), (self.first, 200), (self.first, 999),
+            (self.second, None), (self.second, 300), (self.second, 100),
+        ]
+        with self.assertNumQueries(3):
+            emails = Organization.objects.active_user_emails_map(
+                [organization.pk for organization, _ in pairs], [odoo_id for _, odoo_id in pairs]
+            )
+        for organization, odoo_id in pairs:
+            with self.subTest(organization=organization.orgcode, odoo_id=odoo_id):
+                self.assertEqual(
+                    emails[(organization.pk, odoo_id)],
+                    organization.get_active_user_emails(odoo_id)
+                )
+
+    def test_restrictions(self):
+        emails = Organization.objects.active_user_emails_map([self.first.pk, self.second.pk], [100, 300])
+        self.assertEqual(emails[(self.first.pk, 100)], [
+            'both@example.com', 'plain@example.com', 'restricted_100@example.com',
+        ])
+        self.assertEqual(emails[(self.second.pk, 300)], ['both@example.com', 'restricted_200_300@example.com'])
+
+
+def _run_inline(service, fn, *args, **kwargs):
+    """Stand-in for `ThreadPoolService.submit_background_write` inside test transactions."""
+    return fn(*args, **kwargs)
+
+
+class LoggedOrgTests(TestCase):
+    """The logged organization: cached by id, invalidated by membership changes."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first, self.second = create_organization('logged-first'), create_organization('logged-second')
+            self.user = User.objects.create_user(username='member', is_active=True)
+            for organization in (self.first, self.second):
+                OrganizationMembership.objects.create(organization=organization, user=self.user)
+            self.user.legacy_logged_org = self.first
+            self.user.save(update_fields=['legacy_logged_org'])
+
+    def load(self, jwt_org_id=None):
+        user = User.objects.for_profile().get(pk=self.user.pk)
+        user.jwt_org_id = jwt_org_id
+        return user
+
+    def test_cache_hit(self):
+        self.assertEqual(self.load().logged_org, self.first)
+        user = self.load()
+        with self.assertNumQueries(0):
+            self.assertEqual(user.logged_org, self.first)
+
+        self.assertEqual(self.load(self.second.pk).logged_org, self.second)
+        user = self.load(self.second.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.logged_org, self.second)
+
+    def test_organization_changes_are_seen_right_away(self):
+        self.load().logged_org
+        # Like apply_due_invoices: a bulk update, no signals
+        Organization.objects.filter(pk=self.first.pk).update(blocked=True)
+        self.assertTrue(self.load().logged_org.blocked)
+
+    def test_membership_changes_invalidate(self):
+        self.assertEqual(self.load().logged_org, self.first)
+        with self.captureOnCommitCallbacks(execute=True):
+            OrganizationMembership.objects.get(organization=self.first, user=self.user).delete()
+        with mock.patch.object(ThreadPoolService, 'submit_background_write', _run_inline):
+            self.assertEqual(self.load().logged_org, self.second)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.legacy_logged_org, self.second)
+
+    def test_no_organizations(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            OrganizationMembership.objects.filter(user=self.user).delete()
+        with mock.patch.object(ThreadPoolService, 'submit_background_write', _run_inline):
+            self.assertIsNone(self.load().logged_org)
+        user = self.load()
+        with self.assertNumQueries(0):
+            self.assertIsNone(user.logged_org)
+
+
+class LoggedOrgBackgroundWriteTests(TransactionTestCase):
+    """The fallback organization is stored from the background writer, on its own connection."""
+
+    def test_fallback_is_stored(self):
+        organization = create_organization('background')
+        user = User.objects.create_user(username='member', is_active=True)
+        OrganizationMembership.objects.create(organization=organization, user=user)
+
+        futures = []
+        submit = ThreadPoolService.submit_background_write
+
+        def record(service, fn, *args, **kwargs):
+            futures.append(submit(service, fn, *args, **kwargs))
+            return futures[-1]
+
+        with mock.patch.object(ThreadPoolService, 'submit_background_write', record):
+            self.assertEqual(User.objects.get(pk=user.pk).logged_org, organization)
+        self.assertEqual(len(futures), 1)
+        futures[0].result(timeout=10)
+        user.refresh_from_db()
+        self.assertEqual(user.legacy_logged_org, organization)
+
+
+class VersionedValueTests(SimpleTestCase):
+    """Rebuilds of a per-process `VersionedValue`."""
+
+    def setUp(self):
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return self.builds
+
+    def test_rebuilds_on_bump(self):
+        value = VersionedValue(f'tests.{self.id()}', self.build)
+        self.assertEqual(value.get(), 1)
+        self.assertEqual(value.get(), 1)
+        # Outside a transaction the bump happens right away
+        value.invalidate()
+        version, built = value.get_versioned()
+        self.assertEqual(built, 2)
+        self.assertEqual(value.get_versioned(), (version, 2))
+
+    def test_max_age(self):
+        value = VersionedValue(f'tests.{self.id()}', self.build, max_age=60)
+        self.assertEqual(value.get(), 1)
+        later = time_module.monotonic() + 60
+        with mock.patch('core.versioned_cache.time.monotonic', return_value=later):
+            self.assertEqual(value.get(), 2)
+            self.assertEqual(value.get(), 2)
+        self.assertEqual(VersionedValue(f'tests.{self.id()}.forever', self.build).get(), 3)
+
+
+class RestrictionSnapshotTests(TestCase):
+    """Cached place restrictions of a user and their invalidation."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            organization = create_organization('snapshot')
+            self.places = [create_place(organization, odoo_id) for odoo_id in (300, 100, 200)]
+            self.user = User.objects.create_user(username='restricted', is_active=True)
+            for place in reversed(self.places):
+                restrict(self.user, place)
+
+    def test_load(self):
+        snapshot = RestrictionSnapshot.load(self.user.pk)
+        self.assertEqual(snapshot.place_ids, {place.pk for place in self.places})
+        self.assertEqual(snapshot.address_ids, {place.address_id for place in self.places})
+        self.assertEqual(snapshot.odoo_address_ids, {100, 200, 300})
+
+    def test_user_lists_are_ordered(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.get_restricted_places_ids(), sorted(place.pk for place in self.places))
+        self.assertEqual(user.get_restricted_addresses_ids(), sorted(place.address_id for place in self.places))
+        self.assertEqual(user.get_restricted_odoo_addresses_ids(), [100, 200, 300])
+
+    def test_cache_hit(self):
+        RestrictionSnapshot.for_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(RestrictionSnapshot.for_user(self.user.pk).odoo_address_ids, {100, 200, 300})
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            user.get_restricted_places_ids()
+            user.get_restricted_odoo_addresses_ids()
+
+    def test_restriction_changes_invalidate(self):
+        RestrictionSnapshot.for_user(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            UserRestriction.objects.filter(user=self.user, object_id=self.places[0].pk).delete()
+        self.assertEqual(RestrictionSnapshot.for_user(self.user.pk).odoo_address_ids, {100, 200})
+        with self.captureOnCommitCallbacks(execute=True):
+            restrict(self.user, self.places[0])
+        self.assertEqual(RestrictionSnapshot.for_user(self.user.pk).odoo_address_ids, {100, 200, 300})
+
+    def test_place_address_changes_invalidate(self):
+        RestrictionSnapshot.for_user(self.user.pk)
+        place = self.places[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            place.address = Address.objects.create(country='PE', address_name='Moved', odoo_id=400)
+            place.save()
+        self.assertEqual(RestrictionSnapshot.for_user(self.user.pk).odoo_address_ids, {100, 200, 400})
+
+    def test_other_users_are_not_affected(self):
+        other = User.objects.create_user(username='free', is_active=True)
+        self.assertEqual(other.get_restricted_places_ids(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            UserRestriction.objects.filter(user=self.user).delete()
+        self.assertEqual(RestrictionSnapshot.for_user(self.user.pk).place_ids, frozenset())
+
+
+class VisibleToTests(TestCase):
+    """`visible_to` / `visible_to_many` hide the places (and their addresses) users are restricted from."""
+
+    @classmethod
+    def setUpTestData(cls):
+        organization = create_organization('visible')
+        cls.places = {odoo_id: create_place(organization, odoo_id) for odoo_id in (100, 200, 300)}
+        cls.first = User.objects.create_user(username='first', is_active=True)
+        cls.second = User.objects.create_user(username='second', is_active=True)
+        cls.free = User.objects.create_user(username='free', is_active=True)
+        restrict(cls.first, cls.places[100])
+        restrict(cls.second, cls.places[200])
+        # Restrictions on other models do not hide places with the same id
+        UserRestriction.objects.create(
+            user=cls.free, content_type=ContentType.objects.get_for_model(Organization),
+            object_id=cls.places[300].pk,
+        )
+
+    def test_places(self):
+        def odoo_ids(queryset):
+            return sorted(queryset.values_list('address__odoo_id', flat=True))
+
+        self.assertEqual(odoo_ids(Place.objects.visible_to(self.first)), [200, 300])
+        self.assertEqual(odoo_ids(Place.objects.visible_to(self.free.pk)), [100, 200, 300])
+        self.assertEqual(odoo_ids(Place.objects.visible_to_many([self.first, self.second.pk])), [300])
+        self.assertEqual(odoo_ids(Place.objects.visible_to_many([])), [100, 200, 300])
+
+    def test_addresses(self):
+        def odoo_ids(queryset):
+            return sorted(queryset.values_list('odoo_id', flat=True))
+
+        Address.objects.create(country='PE', address_name='Unused', odoo_id=400)
+        self.assertEqual(odoo_ids(Address.objects.visible_to(self.first)), [200, 300, 400])
+        self.assertEqual(odoo_ids(Address.objects.visible_to_many([self.first, self.second])), [300, 400])
+
+
+class SearchTests(TestCase):
+    """Ranking and paging of `core.search.search`, and how its entries are kept up to date."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.exact = cls.organization('Rosales', 'R-1')
+        # Only similar by trigrams, no word starts with "rosales"
+        cls.similar = cls.organization('Rosale Import', 'R-2')
+        cls.unrelated = cls.organization('Pardo', 'R-3')
+        # Same document length so every one of them ranks the same
+        cls.ties = [cls.organization('Ferreteria Norte', f'F-{number}') for number in range(5)]
+
+    @staticmethod
+    def organization(legal_name: str, orgcode: str) -> Organization:
+        return Organization.objects.create(
+            type=Organization.OrgType.BUSINESS,
+            orgcode=orgcode,
+            legal_name=legal_name,
+            country='PE',
+            document_type=Organization.DocumentType.RUC,
+            document_number=orgcode.replace('-', '0'),
+        )
+
+    def ids(self, query, **kwargs):
+        return [entry.object_id for entry in search(query, kinds=[SearchEntry.Kind.ORGANIZATION], **kwargs).entries]
+
+    def test_ranking(self):
+        self.assertEqual(self.ids('ROSALES'), [self.exact.pk, self.similar.pk])
+        self.assertEqual(self.ids('  '), [])
+
+    def test_cursor_crosses_equal_ranks(self):
+        first = search('ferreteria norte', kinds=[SearchEntry.Kind.ORGANIZATION], limit=10).entries
+        self.assertEqual(len({entry.rank for entry in first}), 1)
+
+        ids, cursor = [], None
+        while True:
+            page = search('ferreteria norte', kinds=[SearchEntry.Kind.ORGANIZATION], limit=2, cursor=cursor)
+            self.assertLessEqual(len(page.entries), 2)
+            ids.extend(entry.object_id for entry in page.entries)
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(ids, sorted((organization.pk for organization in self.ties), reverse=True))
+
+    def test_reindex_on_save(self):
+        self.unrelated.legal_name = 'Pardo Rosales'
+        self.unrelated.save()
+        self.assertIn(self.unrelated.pk, self.ids('rosales'))
+
+        # Saves touching no indexed field leave the entry alone
+        SearchEntry.objects.filter(kind=SearchEntry.Kind.ORGANIZATION, object_id=self.unrelated.pk).update(text='')
+        self.unrelated.save(update_fields=['country'])
+        self.assertNotIn(self.unrelated.pk, self.ids('rosales'))
+
+    def test_address_change_reindexes_places(self):
+        place = create_place(self.exact, 500)
+        place.address.address_name = 'Jiron Huallaga'
+        place.address.save()
+        entries = search('huallaga', kinds=[SearchEntry.Kind.PLACE]).entries
+        self.assertEqual([entry.object_id for entry in entries], [place.pk])
+
+    def test_deletion_removes_entry(self):
+        pk = self.unrelated.pk
+        self.unrelated.delete()
+        self.assertFalse(SearchEntry.objects.filter(kind=SearchEntry.Kind.ORGANIZATION, object_id=pk).exists())
+
+    def test_rebuild(self):
+        SearchEntry.objects.all().delete()
+        SearchEntry.objects.create(kind=SearchEntry.Kind.ORGANIZATION, object_id=10 ** 9, title='Gone', text='gone')
+
+        _, message = CronJob(type=REBUILD_INDEX).run()
+        self.assertIn('Search index rebuilt', message)
+        self.assertEqual(self.ids('rosales'), [self.exact.pk, self.similar.pk])
+        self.assertFalse(SearchEntry.objects.filter(object_id=10 ** 9).exists())
+        self.assertEqual(
+            SearchEntry.objects.filter(kind=SearchEntry.Kind.ORGANIZATION).count(), Organization.objects.count()
+        )
+
+    def test_rebuild_runs_once_at_a_time(self):
+        with mock.patch('core.search.cache') as search_cache:
+            search_cache.add.return_value = False
+            self.assertEqual(rebuild_search_index(), "Search index rebuild already running.")
+        search_cache.delete.assert_not_called()
+
+
+class BulkCreateWithOrgcodesTests(TestCase):
+    """`bulk_create_with_orgcodes` gives the same orgcodes and blocking reasons as `save()`."""
+
+    @staticmethod
+    def organization(orgcode=Organization.AUTOGENERATE_ORGCODE, **values) -> Organization:
+        return Organization(
+            type=Organization.OrgType.BUSINESS,
+            orgcode=orgcode,
+            legal_name=values.pop('legal_name', 'Bulk'),
+            country='PE',
+            document_type=Organization.DocumentType.RUC,
+            document_number=values.pop('document_number'),
+            **values,
+        )
+
+    def test_orgcodes_match_save(self):
+        saved = self.organization(document_number='B1', blocked=True)
+        with CaptureQueriesContext(connection) as queries:
+            saved.save()
+        # The orgcode goes in the INSERT, no follow-up UPDATE
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE "core_organization"')])
+
+        bulk = Organization.objects.bulk_create_with_orgcodes([
+            self.organization(document_number='B2', blocked=True),
+            self.organization('explicit', document_number='B3'),
+            self.organization(document_number='B4'),
+        ], batch_size=2)
+        after = self.organization(document_number='B5')
+        after.save()
+
+        organizations = [saved, *bulk, after]
+        ids = [organization.pk for organization in organizations]
+        self.assertEqual(ids, sorted(set(ids)))
+        expected = {
+            organization.pk: 'explicit' if organization.document_number == 'B3' else f'organization_{organization.pk}'
+            for organization in organizations
+        }
+        self.assertEqual(dict(Organization.objects.filter(pk__in=ids).values_list('pk', 'orgcode')), expected)
+        self.assertEqual(
+            dict(Organization.objects.filter(pk__in=ids).values_list('document_number', 'blocking_reason')),
+            {'B1': Organization.BlockReason.PAYMENT, 'B2': Organization.BlockReason.PAYMENT, 'B3': None, 'B4': None,
+             'B5': None},
+        )
+        self.assertEqual(
+            set(SearchEntry.objects.filter(kind=SearchEntry.Kind.ORGANIZATION).values_list('object_id', flat=True)),
+            set(ids),
+        )
+
+
+class ShippingAddressesTests(TestCase):
+    """`with_shipping_addresses` answers the shipping address helpers without queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = create_organization('shipping')
+        cls.dispatch = create_place(cls.organization, 600, dispatch_address=True)
+        cls.other = create_place(cls.organization, 601, dispatch_address=False)
+        cls.inactive = create_place(cls.organization, 602, dispatch_address=True, is_active=False)
+        cls.foreign = Address.objects.create(country='PE', address_name='Foreign', odoo_id=603)
+
+    def check(self, organization):
+        self.assertEqual(organization.dispatch_places(), [self.dispatch])
+        self.assertEqual(organization.get_shipping_addresses(), [self.dispatch.address])
+        self.assertEqual(organization.shipping_address_from_address_id(self.dispatch.address_id), self.dispatch.address)
+        with self.assertRaises(AttributeError):
+            organization.shipping_address_from_address_id(self.other.address_id)
+        self.assertTrue(organization.has_address(self.dispatch.address))
+        self.assertTrue(organization.has_address(self.other.address))
+        self.assertFalse(organization.has_address(self.inactive.address))
+        self.assertFalse(organization.has_address(self.foreign))
+
+    def test_prefetched(self):
+        organization = Organization.objects.with_shipping_addresses().get(pk=self.organization.pk)
+        with self.assertNumQueries(0):
+            self.check(organization)
+
+    def test_not_prefetched(self):
+        self.check(Organization.objects.get(pk=self.organization.pk))
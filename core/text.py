@@ -0,0 +1,16 @@
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(value: str) -> str:
+    """
+    Fold a free-text value into a comparable key: accents and case removed,
+    whitespace collapsed ("  ANCÓN " -> "ancon").
+    """
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', value)
+    folded = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _WHITESPACE.sub(' ', folded).strip().lower()
@@ -1,4 +1,7 @@
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from django.db import connection
 
 
 class ThreadPoolService:
@@ -9,10 +12,24 @@ class ThreadPoolService:
             cls._instance = super(ThreadPoolService, cls).__new__(cls)
             # The actual initialization is moved from __init__ to here
             cls._instance.notificationsExecutor = ThreadPoolExecutor(max_workers=2)
+            cls._instance.backgroundExecutor = ThreadPoolExecutor(max_workers=1)
         return cls._instance
 
     def get_notification_executor(self) -> ThreadPoolExecutor:
         return self.notificationsExecutor
 
+    def submit_background_write(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        Run a database write off the request path. The worker thread closes
+        its own connection once done.
+        """
+        def run():
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                connection.close()
+        return self.backgroundExecutor.submit(run)
+
     def clean(self):
         self.notificationsExecutor.shutdown(wait=True)
+        self.backgroundExecutor.shutdown(wait=True)
@@ -0,0 +1,122 @@
+import threading
+import time
+from functools import partial
+from typing import Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+from django.core.cache import cache
+from django.db import transaction
+
+T = TypeVar('T')
+
+VERSION_KEY_PREFIX = 'versioned_cache'
+
+# Seconds a VersionedValue trusts its value before asking the shared cache
+# again; bumps from other workers show up at most this late.
+VERSION_CHECK_INTERVAL = 5
+
+# Latest version this process bumped per namespace, seen without waiting
+# for the check interval
+_local_bumps: Dict[str, int] = {}
+
+
+def _version_key(namespace: str) -> str:
+    return f'{VERSION_KEY_PREFIX}:{namespace}'
+
+
+def get_version(namespace: str) -> int:
+    """
+    Get the shared version counter of a namespace.
+
+    The first value is time based, so a counter lost to a cache eviction
+    never collides with a version some worker already built against.
+    """
+    return cache.get_or_set(_version_key(namespace), time.time_ns, timeout=None)
+
+
+def _bump(namespace: str) -> None:
+    key = _version_key(namespace)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+    _local_bumps[namespace] = version
+
+
+def bump_version(namespace: str) -> None:
+    """
+    Move the shared version counter of a namespace, invalidating its values.
+
+    Inside a transaction the counter moves once it commits: bumping earlier
+    would let another worker rebuild from the rows still committed and keep
+    that stale value under the new version.
+    """
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(_bump, namespace))
+    else:
+        _bump(namespace)
+
+
+class VersionedValue(Generic[T]):
+    """
+    Per-process value that is rebuilt lazily whenever the shared version of
+    its namespace moves, so every worker picks up invalidations from the
+    others (the version counters need a cache shared by the workers, see
+    CACHES in settings).
+
+    The shared version is read at most every `check_interval` seconds, so
+    `get` usually costs no cache round trip; bumps made by this process are
+    seen right away. With `max_age`, the value is also rebuilt once it is
+    that many seconds old, bounding how long a missed invalidation lasts.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        builder: Callable[[], T],
+        check_interval: float = VERSION_CHECK_INTERVAL,
+        max_age: Optional[float] = None
+    ):
+        self.namespace = namespace
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._builder = builder
+        self._lock = threading.Lock()
+        # (version, value), replaced as a whole so readers never mix them up
+        self._entry: Optional[Tuple[int, T]] = None
+        self._built_at = 0.0
+        self._checked_at = 0.0
+
+    def _is_expired(self) -> bool:
+        return self.max_age is not None and time.monotonic() - self._built_at >= self.max_age
+
+    def _is_fresh(self) -> bool:
+        if self._entry is None or _local_bumps.get(self.namespace, 0) > self._entry[0] or self._is_expired():
+            return False
+        return time.monotonic() - self._checked_at < self.check_interval
+
+    def get(self) -> T:
+        return self.get_versioned()[1]
+
+    def get_versioned(self) -> Tuple[int, T]:
+        """
+        Get the value along with the version it was built from, which can
+        lag behind `get_version` by up to `check_interval` seconds (use it
+        rather than `get_version` for anything describing the value, such
+        as an ETag).
+        """
+        if self._is_fresh():
+            return self._entry
+        version = get_version(self.namespace)
+        if self._entry is None or self._entry[0] != version or self._is_expired():
+            with self._lock:
+                if self._entry is None or self._entry[0] != version or self._is_expired():
+                    # The version is read before building, so a bump that
+                    # happens meanwhile forces another rebuild on next check.
+                    self._entry = (version, self._builder())
+                    self._built_at = time.monotonic()
+        self._checked_at = time.monotonic()
+        return self._entry
+
+    def invalidate(self) -> None:
+        bump_version(self.namespace)
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.gis',
+    'django.contrib.postgres',
     'core',
     'shipping'
 ]
@@ -113,6 +114,24 @@ else:
         'default': database_settings,
     }
 
+# Cache
+# Shared by every worker: the versioned caches (core.versioned_cache) rely
+# on it to propagate invalidations between processes.
+
+if os.getenv('USE_MOCK_DB', 'False') == 'True':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -166,6 +185,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Odoo ERP (XML-RPC), see core.odoo
+ODOO_URL = os.getenv('ODOO_URL', '')
+ODOO_DB = os.getenv('ODOO_DB', '')
+ODOO_USERNAME = os.getenv('ODOO_USERNAME', '')
+ODOO_PASSWORD = os.getenv('ODOO_PASSWORD', '')
+
 if os.getenv('USE_NIXPACKS', 'False') == 'True':
     # GeoDjango settings
     GDAL_LIBRARY_PATH = os.getenv('GDAL_LIBRARY_PATH', '/usr/lib/libgdal.so.30')
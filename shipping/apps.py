@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ShippingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shipping'
+
+    def ready(self):
+        from shipping.shipping_calendar import connect_shipping_calendar_signals
+        connect_shipping_calendar_signals()
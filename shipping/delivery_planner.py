@@ -0,0 +1,165 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.utils import timezone
+
+from core.models import Address, Period
+from core.models.period import MINUTES_PER_DAY, minute_of_day, week_intervals
+from shipping.shipping_calendar import mask_allows, shipping_calendar
+
+# How far ahead the planner looks for feasible windows
+DEFAULT_MAX_DAYS = 14
+
+Interval = Tuple[int, int]  # [start, end) in minutes
+
+
+@dataclass(frozen=True)
+class DeliveryWindow:
+    start: datetime
+    end: datetime
+
+
+def _merge(intervals: Iterable[Interval]) -> List[Interval]:
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _intersect(a: List[Interval], b: List[Interval]) -> List[Interval]:
+    """Intersection of two sorted, merged interval lists."""
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start < end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+class DeliveryPlanner:
+    """
+    Next feasible delivery windows for many addresses at once.
+
+    Combines, for every address, the shipping days of its district, its own
+    receiving windows (`schedule_min_1` ... `schedule_max_2`) and the opening
+    periods of the places located at it. Data is loaded in two queries
+    (plus the shared shipping calendar) and addresses sharing the same
+    constraints are only planned once.
+
+    Missing constraints do not restrict anything: an address without
+    receiving windows accepts deliveries all day, and one without opening
+    periods is considered always open.
+
+    Windows are half-open [start, end), like `Address.delivery_window_1`;
+    windows touching across midnight (overnight opening periods) are
+    returned as a single window.
+    """
+
+    def __init__(self, address_ids: Iterable[int], max_days: int = DEFAULT_MAX_DAYS):
+        self.max_days = max_days
+        self._calendar = shipping_calendar.get()
+
+        # address id -> (district id, receiving windows in minutes of day)
+        self._addresses: Dict[int, Tuple[Optional[int], Tuple[Interval, ...]]] = {}
+        rows = Address.objects.filter(id__in=list(address_ids)).order_by().values_list(
+            'id', 'district_id',
+            'schedule_min_1', 'schedule_max_1', 'schedule_min_2', 'schedule_max_2',
+        )
+        for address_id, district_id, min_1, max_1, min_2, max_2 in rows:
+            windows = tuple(_merge(
+                (minute_of_day(start), minute_of_day(end))
+                for start, end in ((min_1, max_1), (min_2, max_2))
+                if start and end and start < end
+            ))
+            self._addresses[address_id] = (district_id, windows)
+
+        # address id -> minute-of-week opening intervals of its active places
+        opening: Dict[int, List[Interval]] = defaultdict(list)
+        periods = Period.objects.filter(
+            place__address_id__in=list(self._addresses),
+            place__is_active=True,
+        ).order_by().values_list('place__address_id', 'weekday', 'open_time', 'close_time')
+        for address_id, weekday, open_time, close_time in periods:
+            opening[address_id].extend(week_intervals(weekday, open_time, close_time))
+        self._opening = {address_id: tuple(_merge(intervals)) for address_id, intervals in opening.items()}
+
+    def next_windows(
+        self,
+        n: int = 3,
+        after: Optional[datetime] = None
+    ) -> Dict[int, List[DeliveryWindow]]:
+        """
+        Get up to `n` feasible delivery windows per address, starting at `after`
+        (now by default). Addresses with no feasible window within `max_days`
+        get an empty list.
+        """
+        after = timezone.localtime(after or timezone.now())
+        plans: Dict[tuple, List[DeliveryWindow]] = {}
+        result = {}
+        for address_id, (district_id, windows) in self._addresses.items():
+            signature = (self._calendar.mask_for(district_id), windows, self._opening.get(address_id))
+            if signature not in plans:
+                plans[signature] = self._plan(*signature, n=n, after=after)
+            result[address_id] = plans[signature]
+        return result
+
+    def _plan(
+        self,
+        mask: int,
+        windows: Tuple[Interval, ...],
+        opening: Optional[Tuple[Interval, ...]],
+        n: int,
+        after: datetime
+    ) -> List[DeliveryWindow]:
+        receiving = list(windows) or [(0, MINUTES_PER_DAY)]
+        start_minute = after.hour * 60 + after.minute + (1 if after.second or after.microsecond else 0)
+        planned = []
+        for offset in range(self.max_days):
+            day: date = after.date() + timedelta(days=offset)
+            if not mask_allows(mask, day):
+                continue
+
+            feasible = receiving
+            if opening is not None:
+                feasible = _intersect(feasible, self._opening_for_day(opening, day.weekday()))
+            if offset == 0:
+                feasible = _intersect(feasible, [(start_minute, MINUTES_PER_DAY)])
+
+            for start, end in feasible:
+                window = DeliveryWindow(
+                    start=self._at(day, start, after.tzinfo),
+                    end=self._at(day, end, after.tzinfo),
+                )
+                if planned and planned[-1].end == window.start:
+                    planned[-1] = DeliveryWindow(planned[-1].start, window.end)
+                    continue
+                # The last window is only complete once a later one starts
+                if len(planned) == n:
+                    return planned
+                planned.append(window)
+        return planned
+
+    @staticmethod
+    def _opening_for_day(opening: Tuple[Interval, ...], weekday: int) -> List[Interval]:
+        day_start = weekday * MINUTES_PER_DAY
+        day_end = day_start + MINUTES_PER_DAY
+        return [
+            (max(start, day_start) - day_start, min(end, day_end) - day_start)
+            for start, end in opening
+            if start < day_end and end > day_start
+        ]
+
+    @staticmethod
+    def _at(day: date, minute: int, tzinfo) -> datetime:
+        return datetime.combine(day, time(), tzinfo) + timedelta(minutes=minute)
@@ -0,0 +1,65 @@
+import random
+import time
+
+from django.contrib.gis.db.models import Extent
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand, CommandError
+
+from shipping.models import District
+from shipping.spatial_index import district_index
+
+
+class Command(BaseCommand):
+    help = "Compare the in-memory district index against the ST_Contains query path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=1000, help="Number of random points to locate")
+        parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible runs")
+
+    def handle(self, *args, **options):
+        extent = District.objects.aggregate(extent=Extent('geom'))['extent']
+        if extent is None:
+            raise CommandError("There are no districts to benchmark against.")
+
+        rng = random.Random(options['seed'])
+        min_lon, min_lat, max_lon, max_lat = extent
+        points = [
+            (rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat))
+            for _ in range(options['points'])
+        ]
+
+        started = time.perf_counter()
+        index = district_index.get()
+        build_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index_results = index.locate_many(points)
+        index_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        query_results = [
+            District.objects.filter(
+                geom__contains=Point(lon, lat, srid=4326)
+            ).values_list('pk', flat=True).first()
+            for lon, lat in points
+        ]
+        query_seconds = time.perf_counter() - started
+
+        mismatches = sum(1 for a, b in zip(index_results, query_results) if a != b)
+
+        self.stdout.write(f"districts indexed:   {len(index)}")
+        self.stdout.write(f"index build:         {build_seconds * 1000:.1f} ms")
+        self.stdout.write(self._report('in-memory index', len(points), index_seconds))
+        self.stdout.write(self._report('ST_Contains query', len(points), query_seconds))
+        if index_seconds:
+            self.stdout.write(f"speedup:             {query_seconds / index_seconds:.1f}x")
+
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f"{mismatches} points resolved differently"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Both paths agree on every point"))
+
+    @staticmethod
+    def _report(label: str, count: int, seconds: float) -> str:
+        per_lookup_us = seconds / count * 1_000_000 if count else 0
+        return f"{label + ':':<21}{seconds * 1000:.1f} ms ({per_lookup_us:.1f} us/lookup)"
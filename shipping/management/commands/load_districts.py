@@ -0,0 +1,170 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.contrib.gis.gdal import DataSource
+from django.contrib.gis.geos import GEOSGeometry, MultiPolygon
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from shipping.models import District, DistrictGeometry
+from shipping.models.district import district_mapping
+from core.text import normalize_text
+from shipping.name_matching import district_name_index
+from shipping.spatial_index import district_index
+from shipping.ubigeo import ubigeo_hierarchy
+
+# (attribute values keyed by model field, geometry WKB)
+RawFeature = Tuple[Dict[str, str], bytes]
+
+GEOMETRY_FIELD = 'geom'
+DERIVED_FIELDS = ['name_key', 'min_lon', 'min_lat', 'max_lon', 'max_lat']
+UPDATE_FIELDS = [field for field in district_mapping if field != 'ubigeo'] + DERIVED_FIELDS
+UBIGEO_LENGTH = 6
+
+
+def _text(value: Any) -> str:
+    """Attribute value as text; missing (null) values become ''."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _ubigeo(value: Any) -> Optional[str]:
+    """
+    The 6-digit ubigeo, restoring the leading zeros lost by numeric
+    attributes (040101 read as 40101); None when it is not valid.
+    """
+    text = _text(value)
+    if not text.isdigit() or len(text) > UBIGEO_LENGTH:
+        return None
+    return text.zfill(UBIGEO_LENGTH)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream districts from a shapefile/GeoJSON and upsert them on ubigeo in batches. "
+        "Safe to re-run: existing districts are updated in place."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Shapefile, GeoJSON or any other GDAL vector source")
+        parser.add_argument('--layer', default='0', help="Layer index or name (default: first layer)")
+        parser.add_argument('--srid', type=int, default=None, help="Source SRID when the layer does not declare one")
+        parser.add_argument('--batch-size', type=int, default=500, help="Features upserted per transaction")
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                            help="Batches parsed and written in parallel")
+
+    def handle(self, *args, **options):
+        try:
+            source = DataSource(options['path'])
+        except Exception as e:
+            raise CommandError(f"Could not open {options['path']}: {e}")
+
+        layer_key = options['layer']
+        layer = source[int(layer_key)] if layer_key.isdigit() else source[layer_key]
+        source_srid = options['srid'] or (layer.srs.srid if layer.srs else None) or 4326
+
+        missing = [
+            name for field, name in district_mapping.items()
+            if field != GEOMETRY_FIELD and name not in layer.fields
+        ]
+        if missing:
+            raise CommandError(f"Layer is missing the fields: {', '.join(missing)}")
+
+        batch_size = options['batch_size']
+        workers = max(1, options['workers'])
+        total = 0
+        started = time.perf_counter()
+
+        # Features are read sequentially (GDAL handles are not thread safe) and
+        # handed over in batches; at most two batches per worker are in flight.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for batch in self._batches(layer, batch_size):
+                pending.add(executor.submit(self._load_batch, batch, source_srid))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    total += self._collect(done, total, started)
+            total += self._collect(wait(pending).done, total, started)
+
+        district_index.invalidate()
+        district_name_index.invalidate()
+        ubigeo_hierarchy.invalidate()
+
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {total} districts in {elapsed:.1f}s ({rate:.0f} features/sec)"
+        ))
+
+    def _collect(self, futures, loaded: int, started: float) -> int:
+        count = 0
+        for future in futures:
+            count += future.result()  # Re-raises errors from the workers
+        if count:
+            loaded += count
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  {loaded} features ({loaded / elapsed:.0f} features/sec)")
+        return count
+
+    def _batches(self, layer, batch_size: int) -> Iterator[List[RawFeature]]:
+        """Raw features in batches; features without a valid ubigeo are reported and left out."""
+        def read():
+            for feature in layer:
+                attributes = {
+                    field: _text(feature.get(name))
+                    for field, name in district_mapping.items()
+                    if field not in (GEOMETRY_FIELD, 'ubigeo')
+                }
+                raw_ubigeo = feature.get(district_mapping['ubigeo'])
+                ubigeo = _ubigeo(raw_ubigeo)
+                if ubigeo is None:
+                    self.stderr.write(f"  Skipped feature {feature.fid}: invalid ubigeo {raw_ubigeo!r}")
+                    continue
+                yield {'ubigeo': ubigeo, **attributes}, bytes(feature.geom.wkb)
+
+        features = read()
+        while batch := list(islice(features, batch_size)):
+            yield batch
+
+    @staticmethod
+    def _parse_geometry(wkb: bytes, source_srid: int) -> Optional[MultiPolygon]:
+        geom = GEOSGeometry(memoryview(wkb), srid=source_srid)
+        if geom.srid != 4326:
+            geom.transform(4326)
+        if geom.geom_type == 'Polygon':
+            geom = MultiPolygon(geom, srid=4326)
+        return geom if geom.geom_type == 'MultiPolygon' else None
+
+    def _load_batch(self, batch: List[RawFeature], source_srid: int) -> int:
+        try:
+            districts = {}
+            for attributes, wkb in batch:
+                geom = self._parse_geometry(wkb, source_srid)
+                if geom is None:
+                    continue
+                district = District(geom=geom, name_key=normalize_text(attributes['name']), **attributes)
+                district.set_bbox()
+                # Last feature wins when a ubigeo is repeated within a batch
+                districts[attributes['ubigeo']] = district
+
+            if not districts:
+                return 0
+
+            with transaction.atomic():
+                loaded = District.objects.bulk_create(
+                    districts.values(),
+                    update_conflicts=True,
+                    unique_fields=['ubigeo'],
+                    update_fields=UPDATE_FIELDS,
+                )
+                DistrictGeometry.objects.rebuild(loaded)
+            return len(loaded)
+        finally:
+            # Every worker thread opens its own connection
+            connection.close()
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shipping.models import District, DistrictGeometry
+
+
+class Command(BaseCommand):
+    help = "Precompute the simplified geometry levels used by the district map endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help="Districts simplified per batch")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        total = 0
+        batch = []
+        for district in District.objects.with_geom().order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(district)
+            if len(batch) >= batch_size:
+                total += DistrictGeometry.objects.rebuild(batch)
+                batch = []
+        if batch:
+            total += DistrictGeometry.objects.rebuild(batch)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {total} simplified geometries in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:14
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistrictGeometry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.IntegerField(choices=[(0, 'low'), (1, 'medium'), (2, 'high')], db_index=True, verbose_name='level')),
+                ('geom', django.contrib.gis.db.models.fields.MultiPolygonField(srid=4326)),
+                ('geojson', models.TextField(help_text='Precomputed GeoJSON Feature of the simplified geometry', verbose_name='GeoJSON feature')),
+                ('district', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='simplified_geometries', to='shipping.district', verbose_name='district')),
+            ],
+            options={
+                'verbose_name': 'District geometry',
+                'verbose_name_plural': 'District geometries',
+                'ordering': ['district', 'level'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='districtgeometry',
+            constraint=models.UniqueConstraint(fields=('district', 'level'), name='unique_district_geometry_level'),
+        ),
+    ]
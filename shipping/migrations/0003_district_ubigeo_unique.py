@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:14
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0002_districtgeometry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='district',
+            name='ubigeo',
+            field=models.CharField(max_length=80, unique=True, validators=[django.core.validators.MinLengthValidator(6)]),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0003_district_ubigeo_unique'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='district',
+            options={'base_manager_name': 'objects', 'ordering': ['department', 'province', 'name'], 'verbose_name': 'District', 'verbose_name_plural': 'Districts'},
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='max_lat',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='max_lon',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='min_lat',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='min_lon',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            sql=(
+                'UPDATE shipping_district SET '
+                'min_lon = ST_XMin(geom), min_lat = ST_YMin(geom), '
+                'max_lon = ST_XMax(geom), max_lat = ST_YMax(geom)'
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='district',
+            index=models.Index(fields=['min_lon', 'max_lon', 'min_lat', 'max_lat'], name='shipping_di_min_lon_6053e1_idx'),
+        ),
+    ]
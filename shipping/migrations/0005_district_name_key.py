@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:17
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+from core.text import normalize_text
+
+
+def fill_name_keys(apps, schema_editor):
+    District = apps.get_model('shipping', 'District')
+    districts = list(District.objects.only('id', 'name'))
+    for district in districts:
+        district.name_key = normalize_text(district.name)
+    District.objects.bulk_update(districts, ['name_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0004_district_bbox'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='district',
+            name='name_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=80),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='district',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name_key'], name='shipping_district_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:46
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0005_district_name_key'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='districtgeometry',
+            options={'ordering': ['district_id', 'level'], 'verbose_name': 'District geometry', 'verbose_name_plural': 'District geometries'},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:46
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0006_districtgeometry_ordering'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='district',
+            name='shipping_di_ubigeo_597007_idx',
+        ),
+    ]
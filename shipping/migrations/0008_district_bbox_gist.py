@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:46
+
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0007_remove_district_ubigeo_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='district',
+            name='shipping_di_min_lon_6053e1_idx',
+        ),
+        migrations.AddIndex(
+            model_name='district',
+            index=django.contrib.postgres.indexes.GistIndex(models.Func(models.F('min_lon'), models.F('min_lat'), models.F('max_lon'), models.F('max_lat'), models.Value(4326), function='ST_MakeEnvelope', output_field=django.contrib.gis.db.models.fields.GeometryField(srid=4326)), name='shipping_district_bbox_gist'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from shipping.models.district import District
+from shipping.models.district_geometry import DistrictGeometry
 
 __all__ = [
     'District',
+    'DistrictGeometry',
 ]
@@ -1,16 +1,143 @@
 from datetime import date
-from functools import cached_property
-from itertools import chain
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
 from django.contrib.gis.db import models
+from django.contrib.gis.geos import GEOSGeometry
+from django.contrib.postgres.indexes import GinIndex, GistIndex
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinLengthValidator
 
+from core.text import normalize_text
+from shipping.name_matching import DEFAULT_MIN_SCORE, DistrictMatch, district_name_index
+from shipping.shipping_calendar import shipping_calendar
+from shipping.spatial_index import district_index
+from shipping.ubigeo import ubigeo_hierarchy
+
+
+def bbox_envelope() -> models.Func:
+    """Envelope of the stored bounding box columns, as indexed by shipping_district_bbox_gist."""
+    return models.Func(
+        models.F('min_lon'), models.F('min_lat'), models.F('max_lon'), models.F('max_lat'), models.Value(4326),
+        function='ST_MakeEnvelope',
+        output_field=models.GeometryField()
+    )
+
+
+class BoxContains(models.Func):
+    """`a ~ b`: the bounding box of `a` contains the one of `b` (GiST indexable)."""
+    arg_joiner = ' ~ '
+    template = '(%(expressions)s)'
+    output_field = models.BooleanField()
+
+
+class DistrictQuerySet(models.QuerySet):
+    def locate(self, lon: float, lat: float) -> Optional[int]:
+        """
+        Resolve the district containing a point without hitting the database.
+
+        Lookups are answered by the per-worker spatial index, so any filter
+        applied to the queryset is ignored.
+
+        Args:
+            lon: Longitude (SRID 4326)
+            lat: Latitude (SRID 4326)
+
+        Returns:
+            Optional[int]: The id of the containing district, or None
+        """
+        return district_index.get().locate(lon, lat)
+
+    def locate_many(self, points: Iterable[Tuple[float, float]]) -> List[Optional[int]]:
+        """
+        Bulk variant of `locate`.
+
+        Args:
+            points: Iterable of (lon, lat) pairs
+
+        Returns:
+            List[Optional[int]]: District ids in the same order as the points
+        """
+        return district_index.get().locate_many(points)
+
+    def match_names(
+        self,
+        records: Iterable[Mapping[str, Optional[str]]],
+        min_score: float = DEFAULT_MIN_SCORE
+    ) -> List[DistrictMatch]:
+        """
+        Match free-text district names (e.g. from Odoo) to districts in one pass.
+
+        Matching runs against the per-worker name index, so any filter
+        applied to the queryset is ignored.
+
+        Args:
+            records: Mappings with a 'name' and optional 'province'/'department'
+            min_score: Matches scoring below this get `district_id=None`
+
+        Returns:
+            List[DistrictMatch]: One match with its confidence per record, in order
+        """
+        return district_name_index.get().match_many(records, min_score=min_score)
+
+    def similar_names(self, name: str, threshold: float = 0.3) -> 'DistrictQuerySet':
+        """
+        Database-side fuzzy search on the normalized name through the trigram index.
+
+        Filters with the `%` operator, which the GIN trigram index serves and
+        which compares against `pg_trgm.similarity_threshold`; the setting is
+        changed for the current connection. The similarity annotation is only
+        used for ordering.
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, false)", [str(threshold)])
+        key = normalize_text(name)
+        return self.filter(
+            name_key__trigram_similar=key
+        ).annotate(
+            similarity=TrigramSimilarity('name_key', key)
+        ).order_by('-similarity')
+
+    def with_geom(self) -> 'DistrictQuerySet':
+        """Load the full-resolution `geom` column, which is deferred by default."""
+        return self.defer(None)
+
+    def listing(self) -> 'DistrictQuerySet':
+        """Only the columns needed for listings, dropdowns and name matching."""
+        return self.only('id', 'ubigeo', 'name', 'department', 'province')
+
+    def bbox_contains(self, lon: float, lat: float) -> 'DistrictQuerySet':
+        """
+        Cheap pre-filter on the stored bounding box columns.
+
+        Candidates still have to be confirmed against `geom` (or `locate`).
+        """
+        point = models.Func(
+            models.Func(models.Value(lon), models.Value(lat), function='ST_MakePoint'),
+            models.Value(4326),
+            function='ST_SetSRID',
+            output_field=models.GeometryField()
+        )
+        return self.filter(BoxContains(bbox_envelope(), point))
+
+
+class DistrictManager(models.Manager.from_queryset(DistrictQuerySet)):
+    """
+    Defers the heavy `geom` column unless it is explicitly requested
+    through `with_geom()`, `only()` or `values()`.
+    """
+
+    def get_queryset(self) -> DistrictQuerySet:
+        return super().get_queryset().defer('geom')
+
 
 class District(models.Model):
     ubigeo = models.CharField(
         max_length=80,
-        db_index=True,
+        unique=True,
         validators=[MinLengthValidator(6)]  # Standard UBIGEO length
     )
     name = models.CharField(
@@ -41,13 +168,36 @@ class District(models.Model):
         db_index=True
     )
 
+    # Accent/case-folded name for fuzzy matching (see core.text.normalize_text)
+    name_key = models.CharField(
+        max_length=80,
+        blank=True,
+        editable=False,
+        db_index=True
+    )
+
+    # Bounding box of `geom`, kept in sync on save for cheap pre-filtering
+    min_lon = models.FloatField(null=True, blank=True, editable=False)
+    min_lat = models.FloatField(null=True, blank=True, editable=False)
+    max_lon = models.FloatField(null=True, blank=True, editable=False)
+    max_lat = models.FloatField(null=True, blank=True, editable=False)
+
+    objects = DistrictManager()
+
     class Meta:
         verbose_name = _('District')
         verbose_name_plural = _('Districts')
         ordering = ['department', 'province', 'name']
+        # Related objects (e.g. address.district) also skip loading `geom`
+        base_manager_name = 'objects'
         indexes = [
             models.Index(fields=['department', 'province', 'name']),
-            models.Index(fields=['ubigeo']),
+            GistIndex(bbox_envelope(), name='shipping_district_bbox_gist'),
+            GinIndex(
+                fields=['name_key'],
+                name='shipping_district_name_trgm',
+                opclasses=['gin_trgm_ops']
+            ),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -56,9 +206,51 @@ class District(models.Model):
             )
         ]
 
+    # Fields whose loaded values are kept to tell what a save changed
+    TRACKED_FIELDS = ('geom', 'ubigeo', 'name', 'province', 'department')
+
     def __str__(self):
         return f"{self.department} - {self.province} - {self.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._track_loaded(field_names)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, fields)
+        # Also how deferred fields are loaded on first access
+        self._track_loaded(fields or [field.attname for field in self._meta.concrete_fields])
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._track_loaded(self.TRACKED_FIELDS)
+
+    def _track_loaded(self, field_names: Iterable[str]) -> None:
+        loaded: Dict[str, Any] = self.__dict__.setdefault('_loaded_values', {})
+        for name in set(field_names).intersection(self.TRACKED_FIELDS) - self.get_deferred_fields():
+            value = getattr(self, name)
+            # Geometries are mutable (e.g. `transform()`), keep a copy
+            loaded[name] = value.clone() if isinstance(value, GEOSGeometry) else value
+
+    def changed_fields(self, fields: Iterable[str]) -> Set[str]:
+        """
+        Get which of the given `TRACKED_FIELDS` changed since the instance
+        was loaded or last saved.
+
+        Deferred fields that were never loaded count as unchanged; on
+        instances not loaded from the database every field counts as changed.
+        """
+        loaded = self.__dict__.get('_loaded_values')
+        if loaded is None:
+            return set(fields)
+        deferred = self.get_deferred_fields()
+        return {
+            name for name in fields
+            if name not in deferred and (name not in loaded or loaded[name] != getattr(self, name))
+        }
+
     def displayable_name(self):
         """Returns the district name in Title Case format."""
         return ' '.join(word.capitalize() for word in self.name.split())
@@ -70,17 +262,13 @@ class District(models.Model):
     def get_absolute_url(self):
         return reverse('panel:district_detail', args=[self.pk])
 
-    @cached_property
+    @property
     def shipping_days(self) -> set[str]:
         """
-        Cache the shipping days for this district.
+        Get the shipping days for this district from the shipping calendar.
         Returns an empty set if no shipping days are defined.
         """
-        return set(
-            chain.from_iterable(
-                self.groups.values_list('shipping_days', flat=True).distinct()
-            )
-        )
+        return shipping_calendar.get().shipping_days(self.pk)
 
     def can_ship_in_day(self, shipping_date: date) -> bool:
         """
@@ -93,10 +281,42 @@ class District(models.Model):
             bool: True if shipping is possible, False otherwise.
             Returns True if no shipping days are defined for this district.
         """
-        if not self.shipping_days:
-            return True
+        return shipping_calendar.get().can_ship_in_day(self.pk, shipping_date)
+
+    def set_bbox(self) -> None:
+        """Copy the extent of `geom` into the bounding box columns."""
+        if self.geom:
+            self.min_lon, self.min_lat, self.max_lon, self.max_lat = self.geom.extent
+        else:
+            self.min_lon = self.min_lat = self.max_lon = self.max_lat = None
+
+
+@receiver(pre_save, sender=District)
+def pre_save_district(
+        sender: models.Model,
+        instance: District,
+        **kwargs
+) -> None:
+    """
+    Keep the name key and bounding box in sync; the box is skipped when
+    `geom` was not loaded (and so is not saved).
+    """
+    instance.name_key = normalize_text(instance.name)
+    if 'geom' not in instance.get_deferred_fields():
+        instance.set_bbox()
+
 
-        return shipping_date.strftime('%A').lower() in self.shipping_days
+@receiver(post_save, sender=District)
+@receiver(post_delete, sender=District)
+def invalidate_district_caches(
+        sender: models.Model,
+        instance: District,
+        **kwargs
+) -> None:
+    """Rebuild the per-worker district indexes on next use."""
+    district_index.invalidate()
+    district_name_index.invalidate()
+    ubigeo_hierarchy.invalidate()
 
 
 # LayerMapping configuration for GeoDjango
@@ -0,0 +1,189 @@
+import json
+from typing import Iterable
+
+from django.contrib.gis.db import models
+from django.contrib.gis.geos import GEOSGeometry, MultiPolygon
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+
+from core.versioned_cache import bump_version
+from shipping.models.district import District
+
+# Bumped whenever simplified geometries change; used to build ETags and cache keys
+GEOMETRY_VERSION_NAMESPACE = 'shipping.district_geometries'
+
+# Decimal places kept in the precomputed GeoJSON (~1 m at 5 decimals)
+GEOJSON_PRECISION = 5
+
+# District fields copied into the simplified geometries
+GEOJSON_SOURCE_FIELDS = {'geom', 'ubigeo', 'name', 'province', 'department'}
+
+
+def _round_coords(coords, precision: int):
+    if isinstance(coords[0], (int, float)):
+        return [round(value, precision) for value in coords]
+    return [_round_coords(part, precision) for part in coords]
+
+
+class DistrictGeometryQuerySet(models.QuerySet):
+    def rebuild(self, districts: Iterable[District]) -> int:
+        """
+        Precompute every simplification level for the given districts.
+
+        Args:
+            districts: District instances with their `geom` loaded
+
+        Returns:
+            int: Number of geometries written
+        """
+        rows = [
+            self.model.from_district(district, level)
+            for district in districts
+            for level in self.model.Level
+        ]
+        if rows:
+            self.bulk_create(
+                rows,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['district', 'level'],
+                update_fields=['geom', 'geojson'],
+            )
+            bump_version(GEOMETRY_VERSION_NAMESPACE)
+        return len(rows)
+
+
+class DistrictGeometry(models.Model):
+    """
+    Simplified copy of a district boundary for drawing coverage maps.
+
+    Each district gets one row per level, simplified with topology
+    preservation and serialized to GeoJSON once, so map endpoints never
+    process geometries per request.
+    """
+
+    class Level(models.IntegerChoices):
+        LOW = 0, _("low")
+        MEDIUM = 1, _("medium")
+        HIGH = 2, _("high")
+
+    # Simplification tolerance in degrees (SRID 4326) for every level
+    TOLERANCES = {
+        Level.LOW: 0.01,
+        Level.MEDIUM: 0.001,
+        Level.HIGH: 0.0001,
+    }
+
+    # Lowest map zoom at which every level is served
+    MIN_ZOOMS = {
+        Level.LOW: 0,
+        Level.MEDIUM: 9,
+        Level.HIGH: 13,
+    }
+
+    district = models.ForeignKey(
+        District,
+        on_delete=models.CASCADE,
+        verbose_name=_("district"),
+        related_name="simplified_geometries"
+    )
+
+    level = models.IntegerField(
+        choices=Level.choices,
+        verbose_name=_("level"),
+        db_index=True
+    )
+
+    geom = models.MultiPolygonField(
+        srid=4326,
+        spatial_index=True
+    )
+
+    geojson = models.TextField(
+        verbose_name=_("GeoJSON feature"),
+        help_text=_("Precomputed GeoJSON Feature of the simplified geometry")
+    )
+
+    objects = DistrictGeometryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('District geometry')
+        verbose_name_plural = _('District geometries')
+        ordering = ['district_id', 'level']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['district', 'level'],
+                name='unique_district_geometry_level'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.district} ({self.get_level_display()})"
+
+    @classmethod
+    def level_for_zoom(cls, zoom: int) -> 'DistrictGeometry.Level':
+        """Returns the most detailed level allowed for a map zoom."""
+        return max(
+            (level for level, min_zoom in cls.MIN_ZOOMS.items() if zoom >= min_zoom),
+            default=cls.Level.LOW
+        )
+
+    @classmethod
+    def from_district(cls, district: District, level: int) -> 'DistrictGeometry':
+        geom = district.geom.simplify(cls.TOLERANCES[level], preserve_topology=True)
+        if not isinstance(geom, MultiPolygon):
+            geom = MultiPolygon(geom) if geom.geom_type == 'Polygon' else GEOSGeometry(district.geom)
+        geom.srid = district.geom.srid
+
+        feature = {
+            'type': 'Feature',
+            'id': district.pk,
+            'properties': {
+                'ubigeo': district.ubigeo,
+                'name': district.name,
+                'province': district.province,
+                'department': district.department,
+            },
+            'geometry': {
+                'type': 'MultiPolygon',
+                'coordinates': _round_coords(geom.coords, GEOJSON_PRECISION),
+            },
+        }
+        return cls(
+            district=district,
+            level=level,
+            geom=geom,
+            geojson=json.dumps(feature, separators=(',', ':')),
+        )
+
+
+@receiver(post_save, sender=District)
+def post_save_district_geometry(
+        sender: models.Model,
+        instance: District,
+        update_fields=None,
+        **kwargs
+) -> None:
+    """
+    Keep the simplified geometries in sync with districts saved one by one.
+
+    Runs before `District.save` records the saved values, so only saves
+    that changed the boundary or the properties copied into the GeoJSON
+    rebuild (and bump the map version); a deferred `geom` is not loaded
+    for saves that only touch other fields.
+    """
+    fields = GEOJSON_SOURCE_FIELDS if update_fields is None else GEOJSON_SOURCE_FIELDS & set(update_fields)
+    if not instance.changed_fields(fields):
+        return
+    DistrictGeometry.objects.rebuild([instance])
+
+
+@receiver(post_delete, sender=District)
+def post_delete_district_geometry(
+        sender: models.Model,
+        instance: District,
+        **kwargs
+) -> None:
+    """Rows are removed by cascade; only the cached maps need refreshing."""
+    bump_version(GEOMETRY_VERSION_NAMESPACE)
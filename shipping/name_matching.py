@@ -0,0 +1,171 @@
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+from django.apps import apps
+
+from core.text import normalize_text
+from core.versioned_cache import VersionedValue
+
+# Weight of every field in the combined score; fields missing from a record
+# are left out and the remaining weights are rescaled.
+NAME_WEIGHT = 0.7
+PROVINCE_WEIGHT = 0.15
+DEPARTMENT_WEIGHT = 0.15
+
+DEFAULT_MIN_SCORE = 0.6
+
+# Candidates must share at least this fraction of the name trigrams
+CANDIDATE_MIN_OVERLAP = 0.3
+
+# (district id, name, province, department)
+DistrictRow = Tuple[int, str, str, str]
+
+
+def trigrams(value: str) -> FrozenSet[str]:
+    """Trigrams of a normalized value, padded per word like pg_trgm does."""
+    grams = set()
+    for word in value.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass(frozen=True)
+class DistrictMatch:
+    """Best district for a record; `district_id` is None when nothing scored high enough."""
+    district_id: Optional[int]
+    score: float
+
+
+class DistrictNameIndex:
+    """
+    Accent/case-insensitive district matcher.
+
+    Exact normalized keys are answered by dictionary lookups; anything else
+    goes through an inverted trigram index and is ranked by trigram
+    similarity of name, province and department.
+    """
+
+    def __init__(self, rows: Iterable[DistrictRow]):
+        self._ids: List[int] = []
+        self._names: List[FrozenSet[str]] = []
+        self._provinces: List[FrozenSet[str]] = []
+        self._departments: List[FrozenSet[str]] = []
+        self._exact: Dict[Tuple[str, str, str], int] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        # Province/department trigrams are shared by many districts; keeping
+        # the known ones keeps batch matching cheap. Only keys found in the
+        # rows are kept, so the index does not grow with the queries.
+        self._known_trigrams: Dict[str, FrozenSet[str]] = {}
+
+        for district_id, name, province, department in rows:
+            index = len(self._ids)
+            name_key = normalize_text(name)
+            province_key = normalize_text(province)
+            department_key = normalize_text(department)
+
+            self._ids.append(district_id)
+            self._names.append(trigrams(name_key))
+            self._provinces.append(self._known(province_key))
+            self._departments.append(self._known(department_key))
+            self._exact[(department_key, province_key, name_key)] = index
+            for gram in self._names[index]:
+                self._postings[gram].append(index)
+
+    def _known(self, key: str) -> FrozenSet[str]:
+        grams = self._known_trigrams.get(key)
+        if grams is None:
+            grams = self._known_trigrams[key] = trigrams(key)
+        return grams
+
+    def _trigrams(self, key: str) -> FrozenSet[str]:
+        grams = self._known_trigrams.get(key)
+        return grams if grams is not None else trigrams(key)
+
+    def match(
+        self,
+        name: str,
+        province: Optional[str] = None,
+        department: Optional[str] = None,
+        min_score: float = DEFAULT_MIN_SCORE
+    ) -> DistrictMatch:
+        name_key = normalize_text(name)
+        province_key = normalize_text(province or '')
+        department_key = normalize_text(department or '')
+        if not name_key:
+            return DistrictMatch(None, 0.0)
+
+        exact = self._exact.get((department_key, province_key, name_key))
+        if exact is not None:
+            return DistrictMatch(self._ids[exact], 1.0)
+
+        name_grams = trigrams(name_key)
+        overlap = Counter(
+            index for gram in name_grams for index in self._postings.get(gram, ())
+        )
+        min_overlap = len(name_grams) * CANDIDATE_MIN_OVERLAP
+
+        weights = [(NAME_WEIGHT, name_grams, self._names)]
+        if province_key:
+            weights.append((PROVINCE_WEIGHT, self._trigrams(province_key), self._provinces))
+        if department_key:
+            weights.append((DEPARTMENT_WEIGHT, self._trigrams(department_key), self._departments))
+        total_weight = sum(weight for weight, _, _ in weights)
+
+        best_index, best_score, runner_up_score = None, 0.0, 0.0
+        for index, shared in overlap.items():
+            if shared < min_overlap:
+                continue
+            score = sum(
+                weight * similarity(grams, field[index]) for weight, grams, field in weights
+            ) / total_weight
+            if score > best_score:
+                best_index, best_score, runner_up_score = index, score, best_score
+            elif score > runner_up_score:
+                runner_up_score = score
+
+        # A tie (e.g. "Miraflores" without province) is ambiguous
+        if runner_up_score == best_score:
+            best_score /= 2
+
+        if best_index is None or best_score < min_score:
+            return DistrictMatch(None, round(best_score, 4))
+        return DistrictMatch(self._ids[best_index], round(best_score, 4))
+
+    def match_many(
+        self,
+        records: Iterable[Mapping[str, Optional[str]]],
+        min_score: float = DEFAULT_MIN_SCORE
+    ) -> List[DistrictMatch]:
+        return [
+            self.match(
+                record.get('name') or '',
+                province=record.get('province'),
+                department=record.get('department'),
+                min_score=min_score,
+            )
+            for record in records
+        ]
+
+
+def _build_district_name_index() -> DistrictNameIndex:
+    District = apps.get_model('shipping', 'District')
+    return DistrictNameIndex(
+        District.objects.order_by().values_list(
+            'pk', 'name', 'province', 'department'
+        ).iterator()
+    )
+
+
+# Built once per worker from a single query; invalidated on District changes
+district_name_index: VersionedValue[DistrictNameIndex] = VersionedValue(
+    'shipping.district_name_index',
+    _build_district_name_index
+)
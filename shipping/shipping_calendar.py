@@ -0,0 +1,155 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from core.constants import WEEKDAYS
+from core.versioned_cache import VersionedValue
+
+ALL_DAYS_MASK = (1 << len(WEEKDAYS)) - 1
+WEEKDAY_BITS = {weekday: 1 << index for index, weekday in enumerate(WEEKDAYS)}
+
+
+def weekdays_to_mask(weekdays: Iterable[str]) -> int:
+    """Encode weekday names (see core.constants.WEEKDAYS) as a 7-bit mask, Monday first."""
+    mask = 0
+    for weekday in weekdays:
+        mask |= WEEKDAY_BITS.get(weekday.lower(), 0)
+    return mask
+
+
+def mask_to_weekdays(mask: int) -> Set[str]:
+    return {weekday for weekday, bit in WEEKDAY_BITS.items() if mask & bit}
+
+
+def mask_allows(mask: int, day: date) -> bool:
+    """An empty mask means the district has no restrictions and ships every day."""
+    return not mask or bool(mask >> day.weekday() & 1)
+
+
+class ShippingCalendar:
+    """
+    Shipping days of every district stored as weekday masks.
+
+    Districts without shipping days (or unknown to the calendar) can ship
+    any day, matching `District.can_ship_in_day`.
+    """
+
+    def __init__(self, masks: Dict[int, int]):
+        self._masks = masks
+
+    def mask_for(self, district_id: Optional[int]) -> int:
+        return self._masks.get(district_id, 0)
+
+    def shipping_days(self, district_id: int) -> Set[str]:
+        return mask_to_weekdays(self.mask_for(district_id))
+
+    def can_ship_in_day(self, district_id: int, shipping_date: date) -> bool:
+        return mask_allows(self.mask_for(district_id), shipping_date)
+
+    def can_ship(
+        self,
+        district_ids: Iterable[int],
+        dates: Iterable[date]
+    ) -> Dict[int, List[bool]]:
+        """
+        Check every district against every date.
+
+        Returns:
+            Dict mapping each district id to one flag per date, in input order.
+        """
+        dates = list(dates)
+        # Only the weekday matters, so each distinct mask is evaluated once
+        weekday_bits = [1 << day.weekday() for day in dates]
+        by_mask: Dict[int, List[bool]] = {}
+        result = {}
+        for district_id in district_ids:
+            mask = self.mask_for(district_id)
+            if mask not in by_mask:
+                by_mask[mask] = [not mask or bool(mask & bit) for bit in weekday_bits]
+            result[district_id] = by_mask[mask]
+        return result
+
+    def next_shipping_dates(
+        self,
+        district_ids: Iterable[int],
+        from_date: date,
+        n: int
+    ) -> Dict[int, List[date]]:
+        """
+        Get the next `n` shipping dates of every district, `from_date` included.
+
+        Returns:
+            Dict mapping each district id to its next shipping dates in order.
+        """
+        by_mask: Dict[int, List[date]] = {}
+        result = {}
+        for district_id in district_ids:
+            mask = self.mask_for(district_id) or ALL_DAYS_MASK
+            if mask not in by_mask:
+                by_mask[mask] = self._dates_for_mask(mask, from_date, n)
+            result[district_id] = by_mask[mask]
+        return result
+
+    @staticmethod
+    def _dates_for_mask(mask: int, from_date: date, n: int) -> List[date]:
+        # Shipping days repeat weekly: find the offsets within the first
+        # week and extend them week by week.
+        offsets = [
+            offset for offset in range(7)
+            if mask >> ((from_date.weekday() + offset) % 7) & 1
+        ]
+        return [
+            from_date + timedelta(days=7 * (i // len(offsets)) + offsets[i % len(offsets)])
+            for i in range(n)
+        ]
+
+
+def _build_shipping_calendar() -> ShippingCalendar:
+    District = apps.get_model('shipping', 'District')
+    try:
+        District._meta.get_field('groups')
+    except FieldDoesNotExist:
+        # No shipping groups installed: every district ships any day
+        return ShippingCalendar({})
+
+    masks: Dict[int, int] = defaultdict(int)
+    rows = District.objects.order_by().values_list('pk', 'groups__shipping_days')
+    for district_id, shipping_days in rows.iterator():
+        masks[district_id] |= weekdays_to_mask(shipping_days or ())
+    return ShippingCalendar(dict(masks))
+
+
+# Process-wide calendar, loaded in a single query on first use and after
+# any change to the shipping groups.
+shipping_calendar: VersionedValue[ShippingCalendar] = VersionedValue(
+    'shipping.shipping_calendar',
+    _build_shipping_calendar
+)
+
+
+def invalidate_shipping_calendar(sender, **kwargs) -> None:
+    shipping_calendar.invalidate()
+
+
+def connect_shipping_calendar_signals() -> None:
+    """
+    Invalidate the calendar when shipping groups, or their districts, change.
+
+    The groups model is resolved through the `District.groups` relation, so
+    nothing is connected when no such relation is installed.
+    """
+    District = apps.get_model('shipping', 'District')
+    try:
+        groups = District._meta.get_field('groups')
+    except FieldDoesNotExist:
+        return
+
+    dispatch_uid = 'shipping_calendar_invalidation'
+    post_save.connect(invalidate_shipping_calendar, sender=groups.related_model, dispatch_uid=dispatch_uid)
+    post_delete.connect(invalidate_shipping_calendar, sender=groups.related_model, dispatch_uid=dispatch_uid)
+    if getattr(groups, 'through', None) is not None:
+        m2m_changed.connect(invalidate_shipping_calendar, sender=groups.through, dispatch_uid=dispatch_uid)
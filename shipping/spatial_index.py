@@ -0,0 +1,132 @@
+import math
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from django.apps import apps
+from django.contrib.gis.geos import GEOSGeometry, Point
+
+from core.versioned_cache import VersionedValue
+
+BBox = Tuple[float, float, float, float]  # (min_x, min_y, max_x, max_y)
+LonLat = Tuple[float, float]
+
+NODE_CAPACITY = 10
+
+
+def _union(boxes: Iterable[BBox]) -> BBox:
+    min_xs, min_ys, max_xs, max_ys = zip(*boxes)
+    return min(min_xs), min(min_ys), max(max_xs), max(max_ys)
+
+
+def _contains(box: BBox, x: float, y: float) -> bool:
+    return box[0] <= x <= box[2] and box[1] <= y <= box[3]
+
+
+def _center(box: BBox) -> Tuple[float, float]:
+    return (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+
+
+class STRtree:
+    """
+    Read-only R-tree packed with the Sort-Tile-Recursive algorithm.
+
+    Items are identified by their position in the list of boxes given
+    on construction.
+    """
+
+    def __init__(self, boxes: Sequence[BBox], node_capacity: int = NODE_CAPACITY):
+        self._root: Optional[Tuple[BBox, list, bool]] = None
+        if not boxes:
+            return
+
+        # Every node is (bbox, children, is_leaf); leaf children are (bbox, item index)
+        nodes = self._pack([(box, index) for index, box in enumerate(boxes)], node_capacity, True)
+        while len(nodes) > 1:
+            nodes = self._pack([(node[0], node) for node in nodes], node_capacity, False)
+        self._root = nodes[0]
+
+    @staticmethod
+    def _pack(entries: list, capacity: int, is_leaf: bool) -> list:
+        slice_count = math.ceil(math.sqrt(math.ceil(len(entries) / capacity)))
+        slice_size = slice_count * capacity
+
+        entries.sort(key=lambda entry: _center(entry[0])[0])
+        nodes = []
+        for start in range(0, len(entries), slice_size):
+            vertical_slice = sorted(
+                entries[start:start + slice_size],
+                key=lambda entry: _center(entry[0])[1]
+            )
+            for node_start in range(0, len(vertical_slice), capacity):
+                group = vertical_slice[node_start:node_start + capacity]
+                nodes.append((
+                    _union(entry[0] for entry in group),
+                    group if is_leaf else [entry[1] for entry in group],
+                    is_leaf,
+                ))
+        return nodes
+
+    def query_point(self, x: float, y: float) -> Iterator[int]:
+        """Yield the indexes of the items whose box contains the given point."""
+        if self._root is None:
+            return
+        stack = [self._root]
+        while stack:
+            box, children, is_leaf = stack.pop()
+            if not _contains(box, x, y):
+                continue
+            if is_leaf:
+                yield from (index for item_box, index in children if _contains(item_box, x, y))
+            else:
+                stack.extend(children)
+
+
+class DistrictSpatialIndex:
+    """
+    In-memory point-in-district resolver.
+
+    Candidates are pre-filtered by bounding box through an STR-tree and then
+    confirmed against GEOS prepared polygons, which answers with the same
+    semantics as an ``ST_Contains`` query against ``District.geom``.
+    """
+
+    def __init__(self, districts: Iterable[Tuple[int, GEOSGeometry]]):
+        self._ids: List[int] = []
+        self._prepared = []
+        self._boxes: List[BBox] = []
+        for pk, geom in districts:
+            self._ids.append(pk)
+            self._prepared.append(geom.prepared)
+            self._boxes.append(geom.extent)
+        self._tree = STRtree(self._boxes)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def locate(self, lon: float, lat: float) -> Optional[int]:
+        """Returns the id of the district containing the point, or None."""
+        point = None
+        for index in self._tree.query_point(lon, lat):
+            if point is None:
+                point = Point(lon, lat, srid=4326)
+            if self._prepared[index].contains(point):
+                return self._ids[index]
+        return None
+
+    def locate_many(self, points: Iterable[LonLat]) -> List[Optional[int]]:
+        """Returns the district id for every (lon, lat) point, keeping input order."""
+        return [self.locate(lon, lat) for lon, lat in points]
+
+
+def _build_district_index() -> DistrictSpatialIndex:
+    District = apps.get_model('shipping', 'District')
+    return DistrictSpatialIndex(
+        District.objects.order_by().values_list('pk', 'geom').iterator()
+    )
+
+
+# One index per worker process, rebuilt on the first lookup after any
+# District change (see the District signal receivers).
+district_index: VersionedValue[DistrictSpatialIndex] = VersionedValue(
+    'shipping.district_index',
+    _build_district_index
+)
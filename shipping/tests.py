@@ -1,3 +1,578 @@
-from django.test import TestCase
+import json
+import math
+import os
+import random
+import tempfile
+from datetime import date, datetime, time
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.gis.gdal import DataSource
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.constants import WEEKDAY_FRIDAY, WEEKDAY_MONDAY, WEEKDAY_SUNDAY, WEEKDAY_WEDNESDAY
+from core.models.period import week_intervals
+from core.versioned_cache import _version_key, get_version
+from shipping.delivery_planner import DeliveryPlanner, DeliveryWindow, _merge
+from shipping.management.commands.load_districts import Command as LoadDistrictsCommand
+from shipping.models import District, DistrictGeometry
+from shipping.models.district_geometry import GEOMETRY_VERSION_NAMESPACE
+from shipping.name_matching import DistrictMatch, DistrictNameIndex
+from shipping.shipping_calendar import (
+    ALL_DAYS_MASK, ShippingCalendar, _build_shipping_calendar, mask_to_weekdays, weekdays_to_mask,
+)
+from shipping.spatial_index import DistrictSpatialIndex, STRtree, district_index
+from shipping.ubigeo import UbigeoHierarchy, ubigeo_hierarchy
+
+# 2024-01-01 is a Monday
+MONDAY = date(2024, 1, 1)
+
+
+class ShippingCalendarTests(SimpleTestCase):
+    """Weekday masks and the in-memory shipping calendar."""
+
+    def test_weekdays_to_mask(self):
+        self.assertEqual(weekdays_to_mask([]), 0)
+        self.assertEqual(weekdays_to_mask([WEEKDAY_MONDAY]), 0b1)
+        self.assertEqual(weekdays_to_mask([WEEKDAY_SUNDAY]), 0b1000000)
+        self.assertEqual(weekdays_to_mask(['Monday', 'FRIDAY', 'holiday']), 0b10001)
+        self.assertEqual(mask_to_weekdays(0b10001), {WEEKDAY_MONDAY, WEEKDAY_FRIDAY})
+
+    def test_dates_for_mask(self):
+        mask = weekdays_to_mask([WEEKDAY_MONDAY, WEEKDAY_FRIDAY])
+        self.assertEqual(
+            ShippingCalendar._dates_for_mask(mask, MONDAY, 4),
+            [date(2024, 1, 1), date(2024, 1, 5), date(2024, 1, 8), date(2024, 1, 12)]
+        )
+        # Starting mid-week wraps into the next week
+        self.assertEqual(
+            ShippingCalendar._dates_for_mask(mask, date(2024, 1, 6), 3),
+            [date(2024, 1, 8), date(2024, 1, 12), date(2024, 1, 15)]
+        )
+        self.assertEqual(
+            ShippingCalendar._dates_for_mask(ALL_DAYS_MASK, date(2024, 1, 6), 3),
+            [date(2024, 1, 6), date(2024, 1, 7), date(2024, 1, 8)]
+        )
+
+    def test_can_ship(self):
+        calendar = ShippingCalendar({1: weekdays_to_mask([WEEKDAY_WEDNESDAY]), 2: 0})
+        dates = [MONDAY, date(2024, 1, 3), date(2024, 1, 10)]
+        self.assertEqual(calendar.can_ship([1, 2, 3], dates), {
+            1: [False, True, True],
+            # No shipping days, or unknown to the calendar: any day
+            2: [True, True, True],
+            3: [True, True, True],
+        })
+        self.assertTrue(calendar.can_ship_in_day(1, date(2024, 1, 3)))
+        self.assertFalse(calendar.can_ship_in_day(1, MONDAY))
+
+    def test_next_shipping_dates(self):
+        calendar = ShippingCalendar({1: weekdays_to_mask([WEEKDAY_WEDNESDAY])})
+        self.assertEqual(calendar.next_shipping_dates([1, 2], MONDAY, 2), {
+            1: [date(2024, 1, 3), date(2024, 1, 10)],
+            2: [date(2024, 1, 1), date(2024, 1, 2)],
+        })
+
+    def test_builds_empty_calendar_without_shipping_groups(self):
+        # SimpleTestCase fails on any query
+        calendar = _build_shipping_calendar()
+        self.assertTrue(calendar.can_ship_in_day(1, MONDAY))
+
+
+class DistrictNameIndexTests(SimpleTestCase):
+    """Exact, fuzzy and ambiguous district name matches."""
+
+    def setUp(self):
+        self.index = DistrictNameIndex([
+            (1, 'MIRAFLORES', 'LIMA', 'LIMA'),
+            (2, 'MIRAFLORES', 'AREQUIPA', 'AREQUIPA'),
+            (3, 'SAN ISIDRO', 'LIMA', 'LIMA'),
+            (4, 'SAN JUAN DE LURIGANCHO', 'LIMA', 'LIMA'),
+        ])
+
+    def test_exact_match_ignores_case_and_accents(self):
+        self.assertEqual(self.index.match('Miraflóres', 'lima', 'Lima'), DistrictMatch(1, 1.0))
+
+    def test_fuzzy_match(self):
+        self.assertEqual(self.index.match('San Isidr', 'Lima', 'Lima'), DistrictMatch(3, 0.825))
+        match = self.index.match('Sn Jaun de Lurigancho', 'Lima')
+        self.assertEqual(match.district_id, 4)
+        self.assertLess(match.score, 1.0)
+
+    def test_province_breaks_ties(self):
+        self.assertEqual(self.index.match('Miraflores', 'Arequipa').district_id, 2)
+
+    def test_tie_halves_the_score(self):
+        self.assertEqual(self.index.match('Miraflores'), DistrictMatch(None, 0.5))
+        self.assertEqual(self.index.match('Miraflores', min_score=0.5), DistrictMatch(1, 0.5))
+
+    def test_no_match(self):
+        self.assertEqual(self.index.match('xyz'), DistrictMatch(None, 0.0))
+        self.assertEqual(self.index.match(''), DistrictMatch(None, 0.0))
+
+    def test_queries_do_not_grow_the_index(self):
+        known = len(self.index._known_trigrams)
+        self.index.match_many([{'name': f'District {i}', 'province': f'Province {i}'} for i in range(50)])
+        self.assertEqual(len(self.index._known_trigrams), known)
+
+
+def _at(day: int, hour: int, minute: int = 0) -> datetime:
+    """Aware local datetime on the given day of January 2024 (the 1st is a Monday)."""
+    return timezone.make_aware(datetime(2024, 1, day, hour, minute))
+
+
+def _minutes(hour: int, minute: int = 0) -> int:
+    return hour * 60 + minute
+
+
+class DeliveryPlannerTests(SimpleTestCase):
+    """Window planning from receiving windows, opening periods and shipping days."""
+
+    def plan(self, windows=(), periods=None, mask=0, after=None, n=3, max_days=7):
+        # No address ids: the planner loads nothing and only `_plan` is exercised
+        planner = DeliveryPlanner([], max_days=max_days)
+        opening = None
+        if periods is not None:
+            opening = tuple(_merge(
+                interval for weekday, open_time, close_time in periods
+                for interval in week_intervals(weekday, open_time, close_time)
+            ))
+        return planner._plan(mask, tuple(windows), opening, n=n, after=after or _at(1, 9))
+
+    def test_no_windows_and_no_periods_accept_any_time(self):
+        self.assertEqual(self.plan(max_days=2), [DeliveryWindow(_at(1, 9), _at(3, 0))])
+
+    def test_receiving_windows(self):
+        windows = [(_minutes(8), _minutes(12)), (_minutes(14), _minutes(18))]
+        self.assertEqual(self.plan(windows, after=_at(1, 10, 30)), [
+            DeliveryWindow(_at(1, 10, 30), _at(1, 12)),
+            DeliveryWindow(_at(1, 14), _at(1, 18)),
+            DeliveryWindow(_at(2, 8), _at(2, 12)),
+        ])
+
+    def test_same_day_cutoff(self):
+        windows = [(_minutes(8), _minutes(12)), (_minutes(14), _minutes(18))]
+        # Windows are half-open: nothing is left of 08:00-12:00 at 12:00
+        self.assertEqual(self.plan(windows, after=_at(1, 12), n=1), [DeliveryWindow(_at(1, 14), _at(1, 18))])
+        # Seconds round up to the next minute
+        after = timezone.make_aware(datetime(2024, 1, 1, 17, 59, 30))
+        self.assertEqual(self.plan(windows, after=after, n=1), [DeliveryWindow(_at(2, 8), _at(2, 12))])
+
+    def test_overnight_period_is_one_window(self):
+        friday_night = (4, time(20), time(2))
+        self.assertEqual(self.plan(periods=[friday_night], n=1), [DeliveryWindow(_at(5, 20), _at(6, 2))])
+
+    def test_sunday_night_wraps_to_monday(self):
+        sunday_night = (6, time(22), time(3))
+        self.assertEqual(self.plan(periods=[sunday_night], after=_at(7, 10), n=2, max_days=9), [
+            DeliveryWindow(_at(7, 22), _at(8, 3)),
+            DeliveryWindow(_at(14, 22), _at(15, 3)),
+        ])
+
+    def test_shipping_days_cut_overnight_windows(self):
+        friday_night = (4, time(20), time(2))
+        mask = weekdays_to_mask([WEEKDAY_FRIDAY])
+        self.assertEqual(self.plan(periods=[friday_night], mask=mask), [DeliveryWindow(_at(5, 20), _at(6, 0))])
+
+    def test_no_feasible_window(self):
+        windows = [(_minutes(8), _minutes(12))]
+        self.assertEqual(self.plan(windows, periods=[(4, time(20), time(2))]), [])
+
+
+def _square(min_x: float, min_y: float, size: float) -> MultiPolygon:
+    return MultiPolygon(Polygon.from_bbox((min_x, min_y, min_x + size, min_y + size)), srid=4326)
+
+
+class SpatialIndexTests(SimpleTestCase):
+    """STR-tree point queries and point-in-district lookups."""
+
+    def test_query_point_matches_brute_force(self):
+        rng = random.Random(3)
+        boxes = []
+        for _ in range(500):
+            x, y = rng.uniform(-80, -70), rng.uniform(-18, -2)
+            boxes.append((x, y, x + rng.uniform(0, 1), y + rng.uniform(0, 1)))
+        tree = STRtree(boxes, node_capacity=4)
+        for _ in range(300):
+            x, y = rng.uniform(-81, -69), rng.uniform(-19, -1)
+            expected = {i for i, box in enumerate(boxes) if box[0] <= x <= box[2] and box[1] <= y <= box[3]}
+            self.assertEqual(set(tree.query_point(x, y)), expected)
+
+    def test_query_point_checks_each_item_box(self):
+        # One leaf with both boxes: only the one containing the point is a candidate
+        tree = STRtree([(0, 0, 1, 1), (2, 2, 3, 3)])
+        self.assertEqual(list(tree.query_point(0.5, 0.5)), [0])
+        self.assertEqual(list(tree.query_point(1.5, 1.5)), [])
+
+    def test_empty_tree(self):
+        self.assertEqual(list(STRtree([]).query_point(0, 0)), [])
+
+    def test_locate(self):
+        index = DistrictSpatialIndex([
+            (10, _square(-77.05, -12.13, 0.04)),
+            (20, _square(-77.01, -12.13, 0.04)),
+            # Inside the first district's box but not inside its polygon
+            (30, MultiPolygon(Polygon(((-77.2, -12.3), (-77.0, -12.3), (-77.2, -12.14), (-77.2, -12.3))), srid=4326)),
+        ])
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.locate(-77.03, -12.11), 10)
+        self.assertEqual(index.locate(-76.99, -12.11), 20)
+        self.assertEqual(index.locate(-77.15, -12.25), 30)
+        self.assertIsNone(index.locate(-77.05, -12.2))
+        self.assertIsNone(index.locate(0, 0))
+
+    def test_locate_many_keeps_order(self):
+        index = DistrictSpatialIndex([(10, _square(0, 0, 1)), (20, _square(1, 0, 1))])
+        self.assertEqual(index.locate_many([(1.5, 0.5), (5, 5), (0.5, 0.5)]), [20, None, 10])
+        self.assertEqual(DistrictSpatialIndex([]).locate_many([(0, 0)]), [None])
+
+
+def _circle(lon: float, lat: float, radius: float, points: int = 400) -> MultiPolygon:
+    ring = [
+        (lon + radius * math.cos(2 * math.pi * i / points), lat + radius * math.sin(2 * math.pi * i / points))
+        for i in range(points)
+    ]
+    return MultiPolygon(Polygon(ring + ring[:1]), srid=4326)
+
+
+def _loaded_district(**values) -> District:
+    """A District as loaded by the default manager (`geom` deferred), without a query."""
+    defaults = {'id': 1, 'ubigeo': '150122', 'name': 'MIRAFLORES', 'capital': 'MIRAFLORES',
+                'department': 'LIMA', 'province': 'LIMA', 'odoo_id': None, 'name_key': 'miraflores',
+                'min_lon': None, 'min_lat': None, 'max_lon': None, 'max_lat': None}
+    defaults.update(values)
+    return District.from_db('default', list(defaults), list(defaults.values()))
+
+
+class DistrictGeometryTests(SimpleTestCase):
+    """Simplification levels and change tracking of the map geometries."""
+
+    def test_levels_simplify_progressively(self):
+        district = District(pk=7, ubigeo='150122', name='MIRAFLORES', province='LIMA', department='LIMA',
+                            geom=_circle(-77.03, -12.12, 0.05))
+        geometries = [DistrictGeometry.from_district(district, level) for level in DistrictGeometry.Level]
+        counts = [geometry.geom.num_coords for geometry in geometries]
+        self.assertEqual(counts, sorted(counts))
+        self.assertLess(counts[0], counts[-1])
+        self.assertLessEqual(counts[-1], district.geom.num_coords)
+
+        feature = json.loads(geometries[0].geojson)
+        self.assertEqual(feature['id'], 7)
+        self.assertEqual(feature['properties'], {
+            'ubigeo': '150122', 'name': 'MIRAFLORES', 'province': 'LIMA', 'department': 'LIMA',
+        })
+        self.assertEqual(feature['geometry']['type'], 'MultiPolygon')
+        lon, lat = feature['geometry']['coordinates'][0][0][0]
+        self.assertEqual((lon, lat), (round(lon, 5), round(lat, 5)))
+        self.assertEqual(geometries[0].geom.srid, 4326)
+
+    def test_level_for_zoom(self):
+        self.assertEqual(DistrictGeometry.level_for_zoom(0), DistrictGeometry.Level.LOW)
+        self.assertEqual(DistrictGeometry.level_for_zoom(9), DistrictGeometry.Level.MEDIUM)
+        self.assertEqual(DistrictGeometry.level_for_zoom(20), DistrictGeometry.Level.HIGH)
+
+    def test_changed_fields(self):
+        district = _loaded_district()
+        self.assertEqual(district.get_deferred_fields(), {'geom'})
+        # A deferred geom is neither loaded nor reported
+        self.assertEqual(district.changed_fields(District.TRACKED_FIELDS), set())
+        district.odoo_id = 4
+        self.assertEqual(district.changed_fields(District.TRACKED_FIELDS), set())
+        district.name = 'MIRAFLORES 2'
+        district.geom = _circle(0, 0, 1)
+        self.assertEqual(district.changed_fields(District.TRACKED_FIELDS), {'name', 'geom'})
+        self.assertEqual(District(name='NEW').changed_fields(['geom']), {'geom'})
+
+
+class DistrictMapTests(TestCase):
+    """Simplified geometries kept in sync with districts, and the map endpoints."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.district = District.objects.create(
+                ubigeo='150122', name='MIRAFLORES', capital='MIRAFLORES', department='LIMA', province='LIMA',
+                geom=_circle(-77.03, -12.12, 0.05),
+            )
+
+    def test_create_builds_every_level(self):
+        self.assertEqual(
+            list(self.district.simplified_geometries.values_list('level', flat=True)),
+            list(DistrictGeometry.Level)
+        )
+
+    def test_saves_without_geojson_changes_do_not_rebuild(self):
+        version = get_version(GEOMETRY_VERSION_NAMESPACE)
+        district = District.objects.get(pk=self.district.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            district.odoo_id = 42
+            district.save()
+        self.assertIn('geom', district.get_deferred_fields())
+        self.assertEqual(get_version(GEOMETRY_VERSION_NAMESPACE), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            district.name = 'MIRAFLORES NORTE'
+            district.save()
+        self.assertNotEqual(get_version(GEOMETRY_VERSION_NAMESPACE), version)
+        feature = json.loads(DistrictGeometry.objects.filter(district=district).first().geojson)
+        self.assertEqual(feature['properties']['name'], 'MIRAFLORES NORTE')
+
+    def test_geom_change_rebuilds(self):
+        district = District.objects.with_geom().get(pk=self.district.pk)
+        version = get_version(GEOMETRY_VERSION_NAMESPACE)
+        with self.captureOnCommitCallbacks(execute=True):
+            district.save()
+        self.assertEqual(get_version(GEOMETRY_VERSION_NAMESPACE), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            district.geom = _circle(-77.03, -12.12, 0.06)
+            district.save()
+        self.assertNotEqual(get_version(GEOMETRY_VERSION_NAMESPACE), version)
+
+    def test_districts_geojson(self):
+        url = reverse('shipping:districts_geojson')
+        response = self.client.get(url, {'zoom': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/geo+json')
+        body = json.loads(response.content)
+        self.assertEqual([feature['id'] for feature in body['features']], [self.district.pk])
+        expected = DistrictGeometry.objects.get(district=self.district, level=DistrictGeometry.Level.MEDIUM)
+        self.assertEqual(body['features'][0], json.loads(expected.geojson))
+
+        response = self.client.get(url, {'zoom': 10}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url, {'zoom': 'far'}).status_code, 400)
+
+    def test_district_tile(self):
+        # Tile z=10 covering Miraflores
+        x = int((-77.03 + 180) / 360 * 2 ** 10)
+        lat = math.radians(-12.12)
+        y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * 2 ** 10)
+        response = self.client.get(reverse('shipping:district_tile', args=[10, x, y]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        self.assertTrue(response.content)
+        self.assertEqual(self.client.get(reverse('shipping:district_tile', args=[2, 4, 0])).status_code, 400)
+
+
+def _feature(ubigeo, name, geom: MultiPolygon, **properties) -> dict:
+    return {
+        'type': 'Feature',
+        'properties': {
+            'ubigeo': ubigeo, 'name': name, 'capital': name,
+            'department': 'AMAZONAS', 'province': 'CHACHAPOYAS', **properties,
+        },
+        'geometry': json.loads(geom.json),
+    }
+
+
+class LoadDistrictsTestMixin:
+    def write_source(self, features) -> str:
+        handle, path = tempfile.mkstemp(suffix='.geojson')
+        with os.fdopen(handle, 'w') as source:
+            json.dump({'type': 'FeatureCollection', 'features': features}, source)
+        self.addCleanup(os.remove, path)
+        return path
+
+
+class LoadDistrictsParsingTests(LoadDistrictsTestMixin, SimpleTestCase):
+    """Attribute parsing of `load_districts`."""
+
+    def test_ubigeo_and_missing_attributes(self):
+        path = self.write_source([
+            _feature(40101, 'CHACHAPOYAS', _square(0, 0, 1)),
+            _feature(' 010102 ', None, _square(1, 0, 1)),
+            _feature('ABC', 'BAD', _square(2, 0, 1)),
+            _feature(1234567, 'TOO LONG', _square(3, 0, 1)),
+            _feature(None, 'MISSING', _square(4, 0, 1)),
+        ])
+        command = LoadDistrictsCommand(stdout=StringIO(), stderr=StringIO())
+        batches = list(command._batches(DataSource(path)[0], batch_size=1))
+
+        attributes = [attributes for batch in batches for attributes, wkb in batch]
+        self.assertEqual([row['ubigeo'] for row in attributes], ['040101', '010102'])
+        self.assertEqual(attributes[1]['name'], '')
+        self.assertEqual(attributes[0]['department'], 'AMAZONAS')
+        self.assertEqual(command.stderr.getvalue().count('Skipped feature'), 3)
+
+
+class LoadDistrictsTests(LoadDistrictsTestMixin, TransactionTestCase):
+    """`load_districts` writes from worker threads, on their own connections."""
+
+    def test_loads_and_reloads_in_place(self):
+        path = self.write_source([
+            _feature('010101', 'CHACHAPOYAS', _square(-77.9, -6.3, 0.1)),
+            _feature('010102', 'ASUNCION', _square(-77.8, -6.3, 0.1)),
+        ])
+        call_command('load_districts', path, workers=2, batch_size=1, stdout=StringIO())
+
+        district = District.objects.with_geom().get(ubigeo='010101')
+        self.assertEqual(district.name_key, 'chachapoyas')
+        self.assertEqual(district.max_lon, district.geom.extent[2])
+        self.assertEqual(DistrictGeometry.objects.filter(district=district).count(), len(DistrictGeometry.Level))
+        self.assertEqual(District.objects.locate(-77.75, -6.25), District.objects.get(ubigeo='010102').pk)
+
+        path = self.write_source([_feature('010101', 'CHACHAPOYAS NUEVO', _square(-77.9, -6.3, 0.1))])
+        call_command('load_districts', path, workers=1, stdout=StringIO())
+        self.assertEqual(District.objects.count(), 2)
+        self.assertEqual(District.objects.get(pk=district.pk).name, 'CHACHAPOYAS NUEVO')
+
+
+def _columns(sql: str) -> set:
+    """Column names selected by a District query."""
+    select = sql[len('SELECT '):sql.index(' FROM ')]
+    return {part.split('.')[-1].split('::')[0].strip('"') for part in select.split(', ')}
+
+
+class DistrictColumnsTests(SimpleTestCase):
+    """The heavy `geom` column is only loaded where it is needed."""
+
+    def test_default_manager_defers_geom(self):
+        columns = _columns(str(District.objects.all().query))
+        self.assertNotIn('geom', columns)
+        self.assertIn('name_key', columns)
+        self.assertNotIn('geom', _columns(str(District._base_manager.all().query)))
+
+    def test_listing(self):
+        self.assertEqual(
+            _columns(str(District.objects.listing().query)),
+            {'id', 'ubigeo', 'name', 'department', 'province'}
+        )
+
+    def test_with_geom(self):
+        self.assertEqual(
+            _columns(str(District.objects.with_geom().query)),
+            {field.column for field in District._meta.concrete_fields}
+        )
+
+
+class DistrictLocateTests(TestCase):
+    """`District.objects.locate` loads the boundaries once, then answers from memory."""
+
+    def test_locate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            district = District.objects.create(
+                ubigeo='150122', name='MIRAFLORES', capital='MIRAFLORES', department='LIMA', province='LIMA',
+                geom=_square(-77.05, -12.13, 0.04),
+            )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(District.objects.locate(-77.03, -12.11), district.pk)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(_columns(queries[0]['sql']), {'id', 'geom'})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(District.objects.locate_many([(0, 0), (-77.02, -12.1)]), [None, district.pk])
+        self.assertEqual(len(district_index.get()), 1)
+
+
+UBIGEO_ROWS = [
+    (1, '150101', 'LIMA', 'LIMA', 'LIMA'),
+    (2, '150122', 'LIMA', 'LIMA', 'MIRAFLORES'),
+    (3, '150131', 'LIMA', 'LIMA', 'SAN ISIDRO'),
+    (4, '040101', 'AREQUIPA', 'AREQUIPA', 'AREQUIPA'),
+    (5, '040103', 'AREQUIPA', 'AREQUIPA', 'CAYMA'),
+    (6, '0401', 'AREQUIPA', 'AREQUIPA', 'TOO SHORT'),
+]
+
+
+class UbigeoHierarchyTests(SimpleTestCase):
+    """Cascading children and prefix search of the ubigeo hierarchy."""
+
+    def setUp(self):
+        self.hierarchy = UbigeoHierarchy(UBIGEO_ROWS)
+
+    def test_children(self):
+        self.assertEqual([node['code'] for node in self.hierarchy.children()], ['04', '15'])
+        self.assertEqual(self.hierarchy.children('15'), [{'code': '1501', 'name': 'LIMA', 'level': 'province'}])
+        self.assertEqual(
+            self.hierarchy.children('1501'),
+            [
+                {'code': '150101', 'name': 'LIMA', 'level': 'district', 'district_id': 1},
+                {'code': '150122', 'name': 'MIRAFLORES', 'level': 'district', 'district_id': 2},
+                {'code': '150131', 'name': 'SAN ISIDRO', 'level': 'district', 'district_id': 3},
+            ]
+        )
+        self.assertEqual(self.hierarchy.children('99'), [])
+
+    def test_search_by_code(self):
+        self.assertEqual([node['code'] for node in self.hierarchy.search('0401')], ['0401', '040101', '040103'])
+        self.assertEqual([node['code'] for node in self.hierarchy.search('1501', limit=2)], ['1501', '150101'])
+
+    def test_search_by_name(self):
+        self.assertEqual([node['code'] for node in self.hierarchy.search(' cáy')], ['040103'])
+        self.assertEqual(
+            [node['code'] for node in self.hierarchy.search('lima', level='district')],
+            ['150101']
+        )
+        self.assertEqual([node['code'] for node in self.hierarchy.search('ar')], ['04', '0401', '040101'])
+        self.assertEqual(self.hierarchy.search('lima', limit=0), [])
+        self.assertEqual(self.hierarchy.search('  '), [])
+
+
+class UbigeoViewTests(TestCase):
+    """The ubigeo endpoint and its ETag."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for district_id, ubigeo, department, province, name in UBIGEO_ROWS[:5]:
+                District.objects.create(
+                    ubigeo=ubigeo, name=name, capital=name, department=department, province=province,
+                    geom=_square(district_id, 0, 1),
+                )
+        self.url = reverse('shipping:ubigeo')
+
+    def test_children_and_search(self):
+        response = self.client.get(self.url, {'prefix': '04'})
+        self.assertEqual(response.json()['results'], [{'code': '0401', 'name': 'AREQUIPA', 'level': 'province'}])
+        self.assertEqual(self.client.get(self.url, {'prefix': '99'}).status_code, 404)
+
+        response = self.client.get(self.url, {'q': 'mira', 'level': 'district'})
+        self.assertEqual([node['code'] for node in response.json()['results']], ['150122'])
+        for params in [{'q': 'a', 'level': 'country'}, {'q': 'a', 'limit': 'x'}, {'q': 'a', 'limit': 0}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_etag_follows_the_served_hierarchy(self):
+        response = self.client.get(self.url)
+        version = ubigeo_hierarchy.get_versioned()[0]
+        self.assertEqual(response['ETag'], f'"ubigeo-{version}"')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # Another worker bumped the shared version: this one keeps serving
+        # (and tagging) its hierarchy until its next version check
+        cache.incr(_version_key(ubigeo_hierarchy.namespace))
+        self.assertEqual(self.client.get(self.url)['ETag'], f'"ubigeo-{version}"')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            District.objects.filter(ubigeo='150122').get().delete()
+        response = self.client.get(self.url, {'prefix': '1501'}, HTTP_IF_NONE_MATCH=f'"ubigeo-{version}"')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], f'"ubigeo-{version}"')
+        self.assertEqual([node['code'] for node in response.json()['results']], ['150101', '150131'])
+
+
+class DistrictSimilarNamesTests(TestCase):
+    """Database-side fuzzy name search."""
+
+    def setUp(self):
+        for number, name in enumerate(['MIRAFLORES', 'SAN ISIDRO', 'SAN MIGUEL']):
+            District.objects.create(
+                ubigeo=f'15010{number}', name=name, capital=name, department='LIMA', province='LIMA',
+                geom=_square(number, 0, 1),
+            )
+
+    def test_similar_names(self):
+        queryset = District.objects.similar_names('San Isidr')
+        self.assertIn('"name_key" %', str(queryset.query))
+        # 'san isidr' scores 0.75 against SAN ISIDRO and 0.24 against SAN MIGUEL
+        self.assertEqual([district.name for district in queryset], ['SAN ISIDRO'])
+        self.assertEqual(
+            [district.name for district in District.objects.similar_names('San Isidr', threshold=0.2)],
+            ['SAN ISIDRO', 'SAN MIGUEL']
+        )
+        self.assertFalse(District.objects.similar_names('San Isidr', threshold=0.8).exists())
+        self.assertFalse(District.objects.similar_names('Arequipa').exists())
@@ -0,0 +1,116 @@
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.apps import apps
+
+from core.text import normalize_text
+from core.versioned_cache import VersionedValue
+
+# Ubigeo codes are DDPPdd: two digits per department, province and district
+DEPARTMENT_LENGTH = 2
+PROVINCE_LENGTH = 4
+DISTRICT_LENGTH = 6
+
+LEVELS = {
+    DEPARTMENT_LENGTH: 'department',
+    PROVINCE_LENGTH: 'province',
+    DISTRICT_LENGTH: 'district',
+}
+
+# (district id, ubigeo, department, province, name)
+DistrictRow = Tuple[int, str, str, str, str]
+
+
+class UbigeoHierarchy:
+    """
+    Department -> province -> district tree keyed by ubigeo prefix.
+
+    Every node is a plain dict ready to be serialized:
+    `{'code': ..., 'name': ..., 'level': ...}` plus `district_id` on districts.
+    """
+
+    def __init__(self, rows: Iterable[DistrictRow]):
+        self._nodes: Dict[str, dict] = {}
+        self._children: Dict[str, List[dict]] = {}
+
+        for district_id, ubigeo, department, province, name in rows:
+            if len(ubigeo) < DISTRICT_LENGTH:
+                continue
+            for length, node_name in (
+                (DEPARTMENT_LENGTH, department),
+                (PROVINCE_LENGTH, province),
+                (DISTRICT_LENGTH, name),
+            ):
+                code = ubigeo[:length]
+                if code in self._nodes:
+                    continue
+                node = {'code': code, 'name': node_name, 'level': LEVELS[length]}
+                if length == DISTRICT_LENGTH:
+                    node['district_id'] = district_id
+                self._nodes[code] = node
+                parent = code[:length - 2]
+                self._children.setdefault(parent, []).append(node)
+
+        for children in self._children.values():
+            children.sort(key=lambda node: normalize_text(node['name']))
+
+        # Sorted codes and (normalized name, code) pairs answer prefix searches with a bisect
+        self._codes = sorted(self._nodes)
+        self._names = sorted(
+            (normalize_text(node['name']), code) for code, node in self._nodes.items()
+        )
+
+    def get(self, code: str) -> Optional[dict]:
+        return self._nodes.get(code)
+
+    def children(self, prefix: str = '') -> List[dict]:
+        """Departments for an empty prefix, provinces of a department, districts of a province."""
+        return self._children.get(prefix, [])
+
+    def search(self, query: str, limit: int = 20, level: Optional[str] = None) -> List[dict]:
+        """
+        Autocomplete by ubigeo prefix (digits) or by accent-insensitive name prefix.
+        """
+        query = query.strip()
+        results = []
+        if limit < 1:
+            return results
+        for node in self._search(query):
+            if level is None or node['level'] == level:
+                results.append(node)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def _search(self, query: str) -> Iterator[dict]:
+        if query.isdigit():
+            for code in self._codes[bisect_left(self._codes, query):]:
+                if not code.startswith(query):
+                    return
+                yield self._nodes[code]
+            return
+
+        key = normalize_text(query)
+        if not key:
+            return
+        for name, code in self._names[bisect_left(self._names, (key, '')):]:
+            # Names are sorted, so the first one without the prefix ends the range
+            if not name.startswith(key):
+                return
+            yield self._nodes[code]
+
+
+def _build_ubigeo_hierarchy() -> UbigeoHierarchy:
+    District = apps.get_model('shipping', 'District')
+    return UbigeoHierarchy(
+        District.objects.order_by().values_list(
+            'pk', 'ubigeo', 'department', 'province', 'name'
+        ).iterator()
+    )
+
+
+# Built once per worker from a single query; invalidated on District changes
+ubigeo_hierarchy: VersionedValue[UbigeoHierarchy] = VersionedValue(
+    'shipping.ubigeo_hierarchy',
+    _build_ubigeo_hierarchy
+)
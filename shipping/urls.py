@@ -0,0 +1,11 @@
+from django.urls import path
+
+from shipping import views
+
+app_name = 'shipping'
+
+urlpatterns = [
+    path('districts.geojson', views.districts_geojson, name='districts_geojson'),
+    path('ubigeo/', views.ubigeo, name='ubigeo'),
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', views.district_tile, name='district_tile'),
+]
@@ -1,3 +1,161 @@
-from django.shortcuts import render
+from typing import Optional
 
-# Create your views here.
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+
+from core.versioned_cache import get_version
+from shipping.models import DistrictGeometry
+from shipping.models.district_geometry import GEOMETRY_VERSION_NAMESPACE
+from shipping.ubigeo import LEVELS, ubigeo_hierarchy
+
+MAP_CACHE_TIMEOUT = 60 * 60 * 24
+MAP_MAX_AGE = 60 * 60
+MAX_ZOOM = 22
+
+MVT_LAYER_NAME = 'districts'
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+
+UBIGEO_MAX_AGE = 60 * 60
+UBIGEO_SEARCH_LIMIT = 20
+UBIGEO_MAX_SEARCH_LIMIT = 100
+
+
+def _parse_zoom(value) -> int:
+    zoom = int(value)
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(zoom)
+    return zoom
+
+
+def _districts_geojson_etag(request: HttpRequest) -> Optional[str]:
+    try:
+        level = DistrictGeometry.level_for_zoom(_parse_zoom(request.GET.get('zoom', 0)))
+    except ValueError:
+        return None
+    return f'districts-{int(level)}-{get_version(GEOMETRY_VERSION_NAMESPACE)}'
+
+
+def _district_tile_etag(request: HttpRequest, z: int, x: int, y: int) -> str:
+    return f'tile-{z}-{x}-{y}-{get_version(GEOMETRY_VERSION_NAMESPACE)}'
+
+
+@require_GET
+@cache_control(public=True, max_age=MAP_MAX_AGE)
+@condition(etag_func=_districts_geojson_etag)
+def districts_geojson(request: HttpRequest) -> HttpResponse:
+    """
+    District coverage as a GeoJSON FeatureCollection for the `zoom` query param.
+
+    The body is stitched from the precomputed features of the matching
+    simplification level and cached until the geometries change.
+    """
+    try:
+        level = DistrictGeometry.level_for_zoom(_parse_zoom(request.GET.get('zoom', 0)))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid zoom")
+
+    cache_key = f'shipping:districts_geojson:{int(level)}:{get_version(GEOMETRY_VERSION_NAMESPACE)}'
+    body = cache.get(cache_key)
+    if body is None:
+        features = DistrictGeometry.objects.filter(level=level).values_list('geojson', flat=True)
+        body = '{"type":"FeatureCollection","features":[' + ','.join(features) + ']}'
+        cache.set(cache_key, body, MAP_CACHE_TIMEOUT)
+
+    return HttpResponse(body, content_type='application/geo+json')
+
+
+@require_GET
+@cache_control(public=True, max_age=MAP_MAX_AGE)
+@condition(etag_func=_district_tile_etag)
+def district_tile(request: HttpRequest, z: int, x: int, y: int) -> HttpResponse:
+    """
+    District coverage as a Mapbox Vector Tile.
+
+    Tiles are encoded by PostGIS from the simplification level matching the
+    zoom, and cached until the geometries change.
+    """
+    if z > MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        return HttpResponseBadRequest("Invalid tile")
+
+    cache_key = f'shipping:district_tile:{z}:{x}:{y}:{get_version(GEOMETRY_VERSION_NAMESPACE)}'
+    tile = cache.get(cache_key)
+    if tile is None:
+        tile = _render_tile(z, x, y)
+        cache.set(cache_key, tile, MAP_CACHE_TIMEOUT)
+
+    return HttpResponse(tile, content_type='application/vnd.mapbox-vector-tile')
+
+
+def _render_tile(z: int, x: int, y: int) -> bytes:
+    geometry_table = DistrictGeometry._meta.db_table
+    district_table = DistrictGeometry._meta.get_field('district').related_model._meta.db_table
+    sql = f"""
+        WITH bounds AS (SELECT ST_TileEnvelope(%s, %s, %s) AS geom)
+        SELECT ST_AsMVT(tile, %s, %s, 'geom')
+        FROM (
+            SELECT d.id, d.ubigeo, d.name, d.province, d.department,
+                   ST_AsMVTGeom(ST_Transform(g.geom, 3857), bounds.geom, %s, %s, true) AS geom
+            FROM {geometry_table} g
+            JOIN {district_table} d ON d.id = g.district_id
+            CROSS JOIN bounds
+            WHERE g.level = %s
+              AND g.geom && ST_Transform(bounds.geom, 4326)
+        ) AS tile
+    """
+    level = DistrictGeometry.level_for_zoom(z)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            z, x, y,
+            MVT_LAYER_NAME, MVT_EXTENT,
+            MVT_EXTENT, MVT_BUFFER,
+            int(level),
+        ])
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] else b''
+
+
+def _ubigeo_etag(request: HttpRequest) -> str:
+    # Version of this worker's hierarchy, not the shared one, which may be
+    # ahead of it; the view reads the hierarchy afterwards, so the body is
+    # never older than its ETag.
+    return f'ubigeo-{ubigeo_hierarchy.get_versioned()[0]}'
+
+
+@require_GET
+@cache_control(public=True, max_age=UBIGEO_MAX_AGE)
+@condition(etag_func=_ubigeo_etag)
+def ubigeo(request: HttpRequest) -> JsonResponse:
+    """
+    Cascading department -> province -> district selects, answered from memory.
+
+    Query params:
+        prefix: Ubigeo prefix whose children are listed ('' for departments)
+        q: Autocomplete by ubigeo prefix or name prefix, instead of `prefix`
+        level: Restrict `q` results to 'department', 'province' or 'district'
+        limit: Maximum number of `q` results
+    """
+    hierarchy = ubigeo_hierarchy.get()
+
+    query = request.GET.get('q')
+    if query is None:
+        prefix = request.GET.get('prefix', '')
+        if prefix and hierarchy.get(prefix) is None:
+            return JsonResponse({'error': 'Unknown prefix'}, status=404)
+        return JsonResponse({'prefix': prefix, 'results': hierarchy.children(prefix)})
+
+    level = request.GET.get('level') or None
+    if level is not None and level not in LEVELS.values():
+        return JsonResponse({'error': 'Invalid level'}, status=400)
+    try:
+        limit = int(request.GET.get('limit', UBIGEO_SEARCH_LIMIT))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    limit = min(limit, UBIGEO_MAX_SEARCH_LIMIT)
+
+    return JsonResponse({'q': query, 'results': hierarchy.search(query, limit=limit, level=level)})